@@ -13,6 +13,9 @@ API_SETTINGS = {
     'rate_limit_per_second': 30,      # Yahoo Finance 每秒請求限制
     'safe_rate_per_second': 20,       # 安全的每秒請求數 (留有緩衝)
     'batch_size': 10,                 # 每批處理的股票數量
+    'yfinance_cache_ttl': 3600,       # yfinance 資訊與歷史價格快取時間 (秒)
+    'yfinance_cache_size': 512,       # yfinance 記憶體快取筆數
+    'persist_yfinance_cache': True,   # 是否將股票資訊快取寫入 data/cache 供下次執行使用
 }
 
 # Gemini 設定
@@ -21,19 +24,34 @@ GEMINI_SETTINGS = {
     'max_tokens': 2048,
     'temperature': 0.3,
     'rate_limit_delay': 3,  # API 請求間隔 (秒)
+    'requests_per_minute': 20,  # 分析器 Gemini 呼叫每分鐘上限（翻譯、新聞情緒、新聞搜尋共用）
+    'request_burst': 3,         # 閒置後可立即連續送出的 Gemini 請求數
     'max_retries': 2,       # 減少重試次數以節省配額
+    'response_cache_size': 1000,     # Gemini 回應記憶體快取筆數（相同提示詞直接重用）
+    'response_cache_ttl': 6 * 3600,  # 回應快取有效時間（秒）
+    'persist_response_cache': True,  # 是否將回應快取寫入 data/cache 供下次執行使用
+    'sentiment_batch_size': 5,       # 批量分析時每次合併分析新聞情緒的股票數（1 表示逐檔分析）
 }
 
 # 多代理人辯論系統設定
 MULTI_AGENT_SETTINGS = {
     'use_openai': False,          # 是否使用 OpenAI API (備選 Gemini)
     'debate_rounds': 2,           # 辯論輪數
+    'early_stop': True,           # 專家意見收斂時提前結束辯論
     'max_agents': 5,              # 最大代理人數量
-    'consensus_threshold': 0.7,   # 共識閾值
+    'consensus_threshold': 0.7,   # 共識閾值（最多票建議佔全體專家比例達此值視為已達共識）
     'debate_timeout': 300,        # 辯論超時時間（秒）
     'enable_debate': True,        # 是否啟用多代理人辯論
     'max_concurrent_analysis': 5, # 最大並發分析數（Agent 並發）
     'enable_concurrent': True,    # 是否啟用並發分析
+    'use_asyncio': True,          # 並發分析改以單一事件迴圈驅動（否則使用執行緒池）
+    'enable_prompt_cache': True,  # 單次分析中相同提示詞沿用先前回應
+    'stream_responses': True,     # 串流接收代理人回應，收到完整 JSON 即停止等待
+    'gemini_qpm': 60,             # 代理人 Gemini 呼叫每分鐘上限（所有代理人共用，0 表示不限制）
+    'agent_batch_size': 5,        # analyze_stocks_batch 每次合併進同一提示詞的股票數
+    'persist_agent_cache': True,  # 將代理人回應寫入 data/cache，同日相同提示詞（含股價）直接重用
+    'agent_cache_size': 500,      # 代理人回應記憶體快取筆數
+    'agent_cache_ttl': 24 * 3600, # 代理人回應快取有效時間（秒）
 }
 
 # 新聞和情緒分析設定
@@ -57,9 +75,27 @@ NEWS_SETTINGS = {
     'random_delay_range': [1, 3], # 隨機延遲範圍（秒）
     'rotate_user_agents': True,   # 輪換 User-Agent
     'use_session': True,          # 使用 session 保持連接
+    'http_pool_connections': 32,  # 連線池快取的主機數
+    'http_pool_maxsize': 64,      # 每個主機保留的最大連線數
+    'connect_retries': 2,         # 連線建立失敗時於連線池層級立即重試的次數
     'translate_titles': True,     # 自動翻譯新聞標題為中文
     'filter_by_relevance': True,  # 根據相關性過濾新聞
     'short_term_focus': True,     # 專注短線分析
+    'parse_in_subprocess': True,  # 在子行程中並行解析 HTML（CPU 密集工作）
+    'parse_workers': None,        # 解析行程數（None 表示使用 CPU 核心數）
+    'use_newspaper': True,        # 已安裝 newspaper3k 時，網站特定選擇器未命中後先以其擷取內文，再退回通用選擇器
+    'async_scraping': True,       # 以 asyncio + aiohttp 並行下載多篇新聞（未安裝 aiohttp 時逐篇下載）
+    'scrape_concurrency': 8,      # 並行下載新聞的最大同時連線數
+    'max_html_bytes': 1024 * 1024,  # 單篇新聞頁面最多讀取的位元組數（超過即截斷，None 表示不限制）
+    'ticker_concurrency': 4,      # 多檔股票同時抓取新聞的最大數量
+    'persist_content_cache': True,   # 將爬取的新聞內文寫入 data/cache 供下次執行使用
+    'content_cache_size': 1000,      # 新聞內文記憶體快取筆數
+    'content_cache_ttl': 12 * 3600,  # 新聞內文快取有效時間（秒）
+    'yahoo_news_cache_ttl': 1800,    # Yahoo Finance 新聞列表快取有效時間（秒）
+    'translation_batch_size': 50,    # 合併翻譯時每次 Gemini 呼叫的標題數上限
+    'persist_translation_cache': True,  # 將標題翻譯寫入 data/cache 供下次執行使用
+    'translation_cache_size': 5000,  # 標題翻譯記憶體快取筆數
+    'translation_cache_ttl': 30 * 24 * 3600,  # 標題翻譯快取有效時間（秒）
 }
 
 # 綜合分析設定
@@ -69,6 +105,8 @@ ANALYSIS_SETTINGS = {
     'news_weight': 0.3,           # 新聞面權重 (30%)
     'enable_ai_analysis': True,   # 是否啟用AI分析
     'max_concurrent_analysis': 3, # 最大並發分析數
+    'prefetch_yahoo_data': True,  # 批量分析前以 yf.Tickers 並行預取基本資訊與新聞
+    'prefetch_workers': 8,        # 預取 Yahoo Finance 資料的最大執行緒數
 }
 
 # 輸出設定
@@ -76,6 +114,8 @@ OUTPUT_SETTINGS = {
     'max_stocks_to_analyze': 500,   # 最多分析股票數量（提高以支援完整SP500分析）
     'output_directory': 'data/output',
     'save_format': ['csv', 'json'], # 輸出格式
+    'background_writes': True,      # 報告檔案交由背景執行緒寫入
+    'write_queue_size': 8,          # 背景寫檔佇列上限（滿時儲存呼叫會等待）
 }
 
 # 數據來源設定
@@ -84,7 +84,7 @@ def main():
         # 建立篩選摘要
         screening_summary = screener.screening_results
         with open(f"{output_dir}/screening_summary.json", 'w', encoding='utf-8') as f:
-            json.dump(screening_summary, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
+            f.write(json.dumps(screening_summary, ensure_ascii=False, indent=2, cls=DateTimeEncoder))
         
         logger.info(f"價值投資排名完成，獲得前 {len(screened_data)} 支被低估股票")
         
@@ -119,6 +119,10 @@ def main():
             
             # 保存分析結果
             analyzer.save_analysis_results(analysis_results, f"{output_dir}/enhanced_analysis")
+            try:
+                analyzer.flush()
+            except Exception as write_error:
+                logger.error(f"分析結果寫入失敗: {write_error}")
             
             # 顯示分析摘要
             successful_count = analysis_results.get('successful_analyses', 0)
@@ -328,6 +328,6 @@ class GeminiAnalyzer:
         # JSON 格式（保持結構）
         with open(f"{base_path}.json", 'w', encoding='utf-8') as f:
             from src.utils import DateTimeEncoder
-            json.dump(analysis_results, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
+            f.write(json.dumps(analysis_results, ensure_ascii=False, indent=2, cls=DateTimeEncoder))
         
         logging.info(f"分析結果已保存到: {base_path}.csv 和 {base_path}.json")
@@ -4,18 +4,79 @@
 
 import google.generativeai as genai
 import pandas as pd
+import numpy as np
 import logging
+import os
+import re
+import random
 import time
+import io
+import copy
+import hashlib
 import json
+import asyncio
+import queue
+import atexit
+import tarfile
 import requests
-from typing import Dict, List, Any, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, List, Any, Optional, Tuple, Union
+from types import MappingProxyType
+from dataclasses import dataclass
+from enum import IntEnum
 from datetime import datetime, timedelta
 import yfinance as yf
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from bs4 import BeautifulSoup, FeatureNotFound, UnicodeDammit
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import threading
-from config.settings import GEMINI_SETTINGS, API_SETTINGS, NEWS_SETTINGS, MULTI_AGENT_SETTINGS
-from src.utils import load_env_variables, retry_on_failure
+import heapq
+from functools import lru_cache
+from operator import itemgetter
+from collections import Counter
+from itertools import chain, islice
+from bisect import bisect_right
+from config.settings import GEMINI_SETTINGS, API_SETTINGS, NEWS_SETTINGS, MULTI_AGENT_SETTINGS, ANALYSIS_SETTINGS, OUTPUT_SETTINGS
+from src.utils import load_env_variables, retry_on_failure, PersistentLRUCache, get_cache_path, DateTimeEncoder
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import bottleneck as bn
+except ImportError:
+    bn = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    from newspaper import Article as NewspaperArticle, Config as NewspaperConfig
+except ImportError:
+    NewspaperArticle = None
+    NewspaperConfig = None
 
 try:
     from .gemini_news_search import GeminiNewsSearcher
@@ -31,14 +92,922 @@ except ImportError:
     logging.warning("無法導入 GeminiNewsSearcher 或 Key 管理器，Gemini 新聞搜尋功能將不可用")
 
 
+# 各新聞網站的內文選擇器（以主機網域為鍵，解析時只查詢對應網站的選擇器）
+DOMAIN_SELECTORS_BY_HOST = MappingProxyType({
+    'yahoo.com': ('.caas-body', '[data-module="ArticleBody"]', '.article-wrap'),
+    'reuters.com': ('[data-testid^="paragraph-"]', '.article-body__content__17Yit', '.PaywallBarrier-body', '.StandardArticleBody_body'),
+    'marketwatch.com': ('.article__body', '.column--primary'),
+    'bloomberg.com': ('.body-copy-v2', '.fence-body'),
+    'cnbc.com': ('.ArticleBody-articleBody', '.InlineContent'),
+    'wsj.com': ('.article-content', '.wsj-article-body'),
+    'fool.com': ('.article-body', '.tailwind-article-body'),
+    'seekingalpha.com': ('.article-content', '[data-module="Body"]')
+})
+
+# 通用選擇器（按優先級排序）
+GENERIC_SELECTORS = (
+    'article',
+    '.article-body',
+    '.article-content', 
+    '.story-body',
+    '.entry-content',
+    '.post-content',
+    '.content-body',
+    '.main-content',
+    '.article-text',
+    '.body-content',
+    '[data-module="ArticleBody"]',
+    '.caas-body',
+    '.article-wrap'
+)
+
+
+# 各新聞網站請求時附帶的 Referer（以主機網域為鍵）
+NEWS_REFERERS_BY_HOST = MappingProxyType({
+    'yahoo.com': 'https://finance.yahoo.com/',
+    'reuters.com': 'https://www.reuters.com/',
+    'marketwatch.com': 'https://www.marketwatch.com/',
+    'cnbc.com': 'https://www.cnbc.com/',
+    'bloomberg.com': 'https://www.bloomberg.com/'
+})
+
+
+def _host_domain(url: str) -> str:
+    """取得網址的主網域（如 finance.yahoo.com → yahoo.com），無法解析時回傳空字串"""
+    host = urlsplit(url).hostname  # urlsplit 已將主機名稱轉為小寫
+    if not host:
+        return ''
+    return '.'.join(host.rsplit('.', 2)[-2:])
+
+
+def _selectors_for_host(url: str) -> Tuple[str, ...]:
+    """依網址主機名稱取得網站特定選擇器（以主網域查表，如 finance.yahoo.com → yahoo.com）"""
+    return DOMAIN_SELECTORS_BY_HOST.get(_host_domain(url), ())
+
+
+def _make_soup(html) -> BeautifulSoup:
+    """建立 BeautifulSoup 物件，優先使用 lxml 解析器"""
+    try:
+        return BeautifulSoup(html, 'lxml')
+    except FeatureNotFound:
+        return BeautifulSoup(html, 'html.parser')
+
+
+def _extract_text_by_selectors(select_texts, url: str, fallback=None) -> str:
+    """依選擇器順序提取文章內容；select_texts(selector) 回傳各符合節點的純文字
+    
+    fallback 為網站特定選擇器未命中時、通用選擇器掃描前嘗試的擷取函式（如 newspaper）
+    """
+    content = ""
+    
+    # 嘗試域名特定選擇器
+    for selector in _selectors_for_host(url):
+        texts = select_texts(selector)
+        if texts:
+            content = ' '.join(texts)
+            if len(content) > 100:  # 確保內容有意義
+                return content
+    
+    if fallback is not None:
+        extracted = fallback()
+        if len(extracted) >= NEWS_SETTINGS.get('min_content_length', 50):
+            return extracted
+    
+    # 嘗試通用選擇器
+    for selector in GENERIC_SELECTORS:
+        texts = select_texts(selector)
+        if texts:
+            content = ' '.join(texts)
+            if len(content) > 100:
+                return content
+    
+    # 最後嘗試：提取所有段落
+    paragraphs = select_texts('p')
+    if paragraphs:
+        content = ' '.join([text for text in paragraphs if len(text) > 30])
+    
+    return content
+
+
+def _extract_article_text(soup: BeautifulSoup, url: str, fallback=None) -> str:
+    """智能提取文章內容（BeautifulSoup 版本）"""
+    return _extract_text_by_selectors(
+        lambda selector: [elem.get_text(strip=True) for elem in soup.select(selector)], url, fallback
+    )
+
+
+def _extract_article_text_lexbor(tree, url: str, fallback=None) -> str:
+    """智能提取文章內容（selectolax / Lexbor 版本）"""
+    return _extract_text_by_selectors(
+        lambda selector: [node.text(strip=True) for node in tree.css(selector)], url, fallback
+    )
+
+
+# 中日韓統一表意文字（判斷標題是否已是中文）
+_HAN_RE = re.compile(r'[\u4e00-\u9fff]')
+
+
+def _needs_translation(title: str) -> bool:
+    """標題非空且不含中文時才需要翻譯"""
+    return bool(title and title.strip()) and _HAN_RE.search(title) is None
+
+
+# 標題正規化：移除空白與標點
+_NON_WORD_RE = re.compile(r'\W+')
+
+
+def _normalize_title(title: str) -> str:
+    """正規化新聞標題（忽略大小寫、空白與標點），用於跨來源去重"""
+    return _NON_WORD_RE.sub('', title.casefold()) if title else ''
+
+
+# ISO 格式以外的新聞時間格式（依序嘗試）
+_TIME_FORMATS = (
+    '%Y/%m/%d',
+    '%Y/%m/%d %H:%M:%S',
+    '%m/%d/%Y',
+    '%d/%m/%Y'
+)
+
+
+# 新聞相關性判斷：排除不相關的新聞類型
+NEWS_EXCLUDE_KEYWORDS = (
+    'weather', 'sports', 'entertainment', 'celebrity',
+    '天氣', '體育', '娛樂', '明星', '電影', '音樂',
+    'horoscope', '星座', 'recipe', '食譜'
+)
+
+# 新聞相關性判斷：財經相關關鍵詞
+NEWS_FINANCE_KEYWORDS = (
+    'stock', 'shares', 'earnings', 'revenue', 'profit', 'financial',
+    'market', 'trading', 'investment', 'analysis', 'forecast',
+    '股票', '股價', '股份', '營收', '獲利', '財報', '市場', '交易',
+    '投資', '分析', '預測', '財務', '業績'
+)
+
+# 文章內容中常見的垃圾文字
+GARBAGE_PHRASES = (
+    'Subscribe to our newsletter',
+    'Sign up for our newsletter',
+    'Follow us on',
+    'Share this article',
+    'Related articles',
+    'Advertisement',
+    'Sponsored content',
+    'Cookie Policy',
+    'Privacy Policy',
+    'Terms of Service',
+    'Read more:',
+    'Continue reading',
+    'Click here',
+    'Learn more'
+)
+
+
+def _build_keyword_matcher(keywords: Tuple[str, ...]):
+    """將關鍵詞清單編譯為單次掃描的比對函式（優先使用 Aho-Corasick，否則退回正規表達式）"""
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for keyword in keywords:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        return lambda text: next(automaton.iter(text), None) is not None
+    
+    return re.compile('|'.join(map(re.escape, keywords))).search
+
+
+_has_exclude_keyword = _build_keyword_matcher(NEWS_EXCLUDE_KEYWORDS)
+_has_finance_keyword = _build_keyword_matcher(NEWS_FINANCE_KEYWORDS)
+_GARBAGE_PHRASES_RE = re.compile('|'.join(map(re.escape, GARBAGE_PHRASES)))
+
+# 句子切分：於句尾標點後的空白處切開
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+_MIN_SENTENCE_LENGTH = 20
+
+
+def _clean_article_text(content: str) -> str:
+    """清理文章內容"""
+    if not content:
+        return ""
+    
+    # 移除多餘的空白字符
+    content = ' '.join(content.split())
+    
+    # 移除常見的垃圾文字
+    content = _GARBAGE_PHRASES_RE.sub('', content).strip()
+    
+    # 移除過短的句子（可能是導航或垃圾文字）；句尾標點保留在句子內，小數點不會被切開
+    return ' '.join(
+        sentence for sentence in _SENTENCE_SPLIT_RE.split(content)
+        if len(sentence) > _MIN_SENTENCE_LENGTH
+    )
+
+
+# 解析前移除的非內文標籤與區塊（廣告、側欄、留言等）
+_UNWANTED_TAGS = ('script', 'style', 'nav', 'header', 'footer', 'aside')
+_UNWANTED_BLOCKS_SELECTOR = (
+    '.advertisement, .ad, .ads, .sidebar, .menu, .social-share, .comments, .related-articles'
+)
+
+
+_newspaper_config = None
+
+
+def _extract_with_newspaper(html_bytes: bytes, url: str) -> str:
+    """以 newspaper 的文章擷取演算法取得內文（未安裝或失敗時回傳空字串）"""
+    global _newspaper_config
+    if NewspaperArticle is None or not NEWS_SETTINGS.get('use_newspaper', True):
+        return ""
+    try:
+        if _newspaper_config is None:
+            config = NewspaperConfig()
+            config.fetch_images = False
+            config.memoize_articles = False
+            _newspaper_config = config
+        article = NewspaperArticle(url, config=_newspaper_config)
+        # 依頁面宣告的字元集（或內容偵測）解碼，避免非 UTF-8 頁面變成亂碼
+        article.download(input_html=UnicodeDammit(html_bytes, is_html=True).unicode_markup)
+        article.parse()
+        return article.text or ""
+    except Exception as e:
+        logging.debug(f"newspaper 擷取失敗，改用選擇器解析: {e}")
+        return ""
+
+
+def _parse_worker(html_bytes: bytes, url: str) -> str:
+    """解析新聞 HTML 並回傳清理後的內文（模組層級函式，可於子行程中執行）
+    
+    擷取順序：網站特定選擇器 → newspaper → 通用選擇器 → 段落
+    """
+    newspaper_text = []  # newspaper 擷取結果（延遲計算，兩種解析路徑共用）
+    
+    def newspaper_fallback() -> str:
+        if not newspaper_text:
+            newspaper_text.append(_extract_with_newspaper(html_bytes, url))
+        return newspaper_text[0]
+    
+    content = None
+    
+    # 優先使用 selectolax（Lexbor）解析，失敗時才退回 BeautifulSoup
+    if LexborHTMLParser is not None:
+        try:
+            tree = LexborHTMLParser(html_bytes)
+            tree.strip_tags(list(_UNWANTED_TAGS))
+            for node in tree.css(_UNWANTED_BLOCKS_SELECTOR):
+                node.decompose()
+            content = _extract_article_text_lexbor(tree, url, newspaper_fallback)
+        except Exception as e:
+            logging.debug(f"selectolax 解析失敗，改用 BeautifulSoup: {e}")
+            content = None
+    
+    if content is None:
+        # 使用 BeautifulSoup 解析 HTML（lxml 解析器）
+        soup = _make_soup(html_bytes)
+        
+        # 移除不需要的標籤與區塊（類別選擇器需透過 select 比對，不能當成標籤名稱）
+        for unwanted in soup(_UNWANTED_TAGS):
+            unwanted.decompose()
+        for unwanted in soup.select(_UNWANTED_BLOCKS_SELECTOR):
+            unwanted.decompose()
+        
+        content = _extract_article_text(soup, url, newspaper_fallback)
+    
+    # 清理和格式化內容
+    content = _clean_article_text(content)
+    
+    # 限制內容長度
+    max_length = NEWS_SETTINGS.get('max_content_length', 3000)
+    if len(content) > max_length:
+        content = content[:max_length] + "..."
+    
+    return content
+
+
+# 新聞數量達到此門檻才使用 Numba 編譯版本，少量資料時直譯器開銷較低
+_NEWS_JIT_MIN_ITEMS = 50
+
+
+def _classify_news_timestamps_loop(timestamps, week_ago, priority_ago):
+    """逐筆判斷新聞是否在一週內及是否為優先時段新聞（缺少時間的新聞保留但不列為優先）"""
+    n = timestamps.shape[0]
+    keep_mask = np.empty(n, dtype=np.bool_)
+    recent_mask = np.empty(n, dtype=np.bool_)
+    for i in range(n):
+        ts = timestamps[i]
+        if np.isnan(ts):
+            keep_mask[i] = True
+            recent_mask[i] = False
+        else:
+            keep_mask[i] = ts >= week_ago
+            recent_mask[i] = ts >= priority_ago
+    return keep_mask, recent_mask
+
+
+_classify_news_timestamps_jit = njit(cache=True)(_classify_news_timestamps_loop) if njit else None
+
+
+def _classify_news_timestamps(timestamps: np.ndarray, week_ago: float, priority_ago: float):
+    """依 unix 時間戳（缺值為 NaN）回傳 (保留遮罩, 優先時段遮罩)"""
+    if _classify_news_timestamps_jit is not None and len(timestamps) >= _NEWS_JIT_MIN_ITEMS:
+        return _classify_news_timestamps_jit(timestamps, week_ago, priority_ago)
+    
+    missing = np.isnan(timestamps)
+    return missing | (timestamps >= week_ago), ~missing & (timestamps >= priority_ago)
+
+
+
+def _compute_indicators_loop(close, volume):
+    """單趟計算市場情緒技術指標
+
+    回傳 (SMA20, SMA50, RSI14, 年化波動率%, 1日漲跌%, 5日漲跌%, 20日漲跌%, 量比)；
+    資料不足的指標為 NaN。RSI 沿用 14 日簡單平均漲跌幅的算法。
+    """
+    n = close.shape[0]
+    last = close[n - 1]
+    
+    # 移動平均
+    sma20 = np.nan
+    if n >= 20:
+        total = 0.0
+        for i in range(n - 20, n):
+            total += close[i]
+        sma20 = total / 20
+    
+    sma50 = np.nan
+    if n >= 50:
+        total = 0.0
+        for i in range(n - 50, n):
+            total += close[i]
+        sma50 = total / 50
+    
+    # 成交量分析：最近5天平均成交量 / 整段平均成交量
+    total_volume = 0.0
+    for i in range(n):
+        total_volume += volume[i]
+    avg_volume = total_volume / n
+    recent_days = min(5, n)
+    recent_volume = 0.0
+    for i in range(n - recent_days, n):
+        recent_volume += volume[i]
+    recent_volume /= recent_days
+    volume_ratio = recent_volume / avg_volume if avg_volume > 0 else 1.0
+    
+    # 價格動能
+    change_1d = (last - close[n - 2]) / close[n - 2] * 100 if n >= 2 else 0.0
+    change_5d = (last - close[n - 6]) / close[n - 6] * 100 if n >= 6 else 0.0
+    change_20d = (last - close[n - 21]) / close[n - 21] * 100 if n >= 21 else 0.0
+    
+    # 年化波動率（日報酬樣本標準差）
+    volatility = np.nan
+    m = n - 1
+    if m >= 2:
+        mean_return = 0.0
+        for i in range(1, n):
+            mean_return += close[i] / close[i - 1] - 1.0
+        mean_return /= m
+        sq_dev = 0.0
+        for i in range(1, n):
+            d = close[i] / close[i - 1] - 1.0 - mean_return
+            sq_dev += d * d
+        volatility = np.sqrt(sq_dev / (m - 1)) * np.sqrt(252.0) * 100
+    
+    # RSI：最近14日平均漲幅 / 平均跌幅（剛好14筆時第一天沒有漲跌，視為 0）
+    rsi = np.nan
+    if n >= 14:
+        gain = 0.0
+        loss = 0.0
+        for i in range(max(1, n - 14), n):
+            delta = close[i] - close[i - 1]
+            if delta > 0:
+                gain += delta
+            elif delta < 0:
+                loss -= delta
+        if loss > 0:
+            rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+        elif gain > 0:
+            rsi = 100.0
+    
+    return sma20, sma50, rsi, volatility, change_1d, change_5d, change_20d, volume_ratio
+
+
+_compute_indicators_jit = (
+    njit(cache=True, error_model='numpy')(_compute_indicators_loop) if njit else None
+)
+
+
+def _window_mean(values: np.ndarray) -> float:
+    """陣列平均值（有 bottleneck 時使用其 C 實作）"""
+    return bn.nanmean(values) if bn is not None else values.mean()
+
+
+def _compute_indicators_numpy(close: np.ndarray, volume: np.ndarray) -> tuple:
+    """以 numpy/bottleneck 陣列運算計算技術指標（未安裝 Numba 時使用，結果與迴圈版本相同）"""
+    n = len(close)
+    last = close[-1]
+    
+    # 移動平均
+    sma20 = _window_mean(close[-20:]) if n >= 20 else np.nan
+    sma50 = _window_mean(close[-50:]) if n >= 50 else np.nan
+    
+    # 成交量分析
+    avg_volume = _window_mean(volume)
+    recent_volume = _window_mean(volume[-5:])
+    volume_ratio = recent_volume / avg_volume if avg_volume > 0 else 1.0
+    
+    # 價格動能
+    change_1d = (last - close[-2]) / close[-2] * 100 if n >= 2 else 0.0
+    change_5d = (last - close[-6]) / close[-6] * 100 if n >= 6 else 0.0
+    change_20d = (last - close[-21]) / close[-21] * 100 if n >= 21 else 0.0
+    
+    # 年化波動率
+    volatility = np.nan
+    if n >= 3:
+        returns = close[1:] / close[:-1] - 1.0
+        std = bn.nanstd(returns, ddof=1) if bn is not None else returns.std(ddof=1)
+        volatility = std * np.sqrt(252.0) * 100
+    
+    # RSI：最近14日平均漲幅 / 平均跌幅（剛好14筆時第一天沒有漲跌，視為 0）
+    rsi = np.nan
+    if n >= 14:
+        delta = np.diff(close[-15:])
+        gain = delta[delta > 0].sum()
+        loss = -delta[delta < 0].sum()
+        if loss > 0:
+            rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+        elif gain > 0:
+            rsi = 100.0
+    
+    return sma20, sma50, rsi, volatility, change_1d, change_5d, change_20d, volume_ratio
+
+
+def _compute_indicators(close: np.ndarray, volume: np.ndarray) -> tuple:
+    """計算技術指標，有安裝 Numba 時使用編譯版本，否則使用 numpy/bottleneck 陣列運算"""
+    if _compute_indicators_jit is not None:
+        return _compute_indicators_jit(close, volume)
+    return _compute_indicators_numpy(close, volume)
+
+
+# LLM 常以 ```json ... ``` 包住 JSON 回應
+_JSON_FENCE_RE = re.compile(r'```(?:json)?\s*\n?(.*?)\n?```', re.S)
+
+
+def _fast_json_loads(text: str) -> Any:
+    """以 orjson（可用時）解析 JSON，失敗時引發 json.JSONDecodeError"""
+    if orjson is not None:
+        # orjson.JSONDecodeError 為 json.JSONDecodeError 的子類別
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+# 括號配對掃描只需停在這些字元上，其餘內容由 re 在 C 層略過
+_JSON_TOKEN_RE = re.compile(r'[{}"\\]')
+
+
+def _iter_json_objects(text: str):
+    """逐一產生文本中最外層括號配對完整的 {...} 片段（忽略字串內的括號）"""
+    depth = 0
+    start = -1
+    in_string = False
+    escape_end = -1
+    for match in _JSON_TOKEN_RE.finditer(text):
+        pos = match.start()
+        if pos < escape_end:
+            continue
+        char = match.group()
+        if in_string:
+            if char == '\\':
+                escape_end = pos + 2
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = depth > 0
+        elif char == '{':
+            if depth == 0:
+                start = pos
+            depth += 1
+        elif char == '}' and depth:
+            depth -= 1
+            if depth == 0:
+                yield text[start:pos + 1]
+
+
+def _largest_json_object(text: str) -> Optional[Dict]:
+    """回傳文本中可解析的最大 JSON 物件，找不到時回傳 None"""
+    for block in sorted(_iter_json_objects(text), key=len, reverse=True):
+        try:
+            result = _fast_json_loads(block)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(result, dict):
+            return result
+    return None
+
+
+def _feed_stream_chunk(parts: List[str], chunk) -> Optional[Dict]:
+    """累積串流回應片段；已收到含投資建議的完整 JSON 物件時回傳該物件"""
+    try:
+        text = chunk.text
+    except ValueError:  # 片段沒有文字內容（例如只有結束原因）
+        return None
+    parts.append(text)
+    if '}' not in text:
+        return None
+    result = _largest_json_object("".join(parts))
+    if result is not None and 'recommendation' in result:
+        return result
+    return None
+
+
+def _joined_stream_text(parts: List[str]) -> str:
+    text = "".join(parts)
+    if not text:
+        raise ValueError("Gemini 串流回應沒有任何文字內容")
+    return text
+
+
+def _loads_llm_json_array(text: str) -> List[Dict]:
+    """解析 LLM 回傳的 JSON 陣列，只保留其中的物件元素"""
+    start = text.find('[')
+    end = text.rfind(']')
+    if start == -1 or end < start:
+        raise json.JSONDecodeError("回應中找不到 JSON 陣列", text, 0)
+    items = _fast_json_loads(text[start:end + 1])
+    if not isinstance(items, list):
+        raise json.JSONDecodeError("回應不是 JSON 陣列", text, start)
+    return [item for item in items if isinstance(item, dict)]
+
+
+def _loads_llm_json(text: str) -> Any:
+    """解析 LLM 回傳的 JSON（先移除 Markdown 程式碼區塊），失敗時引發 json.JSONDecodeError"""
+    text = text.strip()
+    match = _JSON_FENCE_RE.search(text)
+    if match:
+        text = match.group(1).strip()
+    
+    return _fast_json_loads(text)
+
+
+def _above(x: float) -> float:
+    """回傳大於 x 的最小浮點數，讓「x 以下（含）」的區間可用 bisect_right 分段"""
+    return float(np.nextafter(x, np.inf))
+
+
+# 基本面評分規則：(欄位, 分段邊界, 各區間加減分)，以 bisect_right 查詢所在區間
+_FUNDAMENTAL_RULES = tuple(
+    (key, edges, deltas, np.asarray(deltas))
+    for key, edges, deltas in (
+        # P/E：0-15 +15、15-25 +10、>=30 -10
+        ('trailing_pe', (0, 15, 25, 30), (0, 15, 10, 0, -10)),
+        # P/B：0-1.5 +15、1.5-3 +10、>=5 -10
+        ('price_to_book', (0, 1.5, 3, 5), (0, 15, 10, 0, -10)),
+        # ROE：>15% +10、>10% +5、<5% -10
+        ('return_on_equity', (0.05, _above(0.10), _above(0.15)), (-10, 0, 5, 10)),
+        # 債務比：<0.3 +10、<0.6 +5、>1.5 -15
+        ('debt_to_equity', (0.3, 0.6, _above(1.5)), (10, 5, 0, -15)),
+        # 毛利率：>20% +10、>10% +5、<5% -10
+        ('profit_margins', (0.05, _above(0.10), _above(0.20)), (-10, 0, 5, 10)),
+    )
+)
+
+
+def _fundamental_scores_vectorized(stocks: pd.DataFrame) -> np.ndarray:
+    """一次計算多檔股票的基本面評分 (0-100)"""
+    scores = np.full(len(stocks), 50.0)
+    for key, edges, _, deltas in _FUNDAMENTAL_RULES:
+        if key not in stocks:
+            continue
+        values = pd.to_numeric(stocks[key], errors='coerce').to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values) & (values != 0)
+        idx = np.searchsorted(edges, np.where(valid, values, 0.0), side='right')
+        scores += np.where(valid, deltas[idx], 0)
+    return np.clip(scores, 0, 100)
+
+
+# 重試等待時間上限（秒）
+_MAX_RETRY_WAIT = 30
+
+
+def _retry_wait_time(response: Optional[requests.Response], attempt: int, base: float) -> float:
+    """計算重試等待時間：優先採用伺服器的 Retry-After，否則使用 full-jitter 指數退避"""
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return min(_MAX_RETRY_WAIT, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return min(_MAX_RETRY_WAIT, max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds()))
+            except (TypeError, ValueError):
+                pass
+    
+    # 隨機化等待時間，避免多個並行請求同步重試
+    return random.uniform(0, min(_MAX_RETRY_WAIT, base * 2 ** attempt))
+
+# HTML 解析行程池（延遲建立，跨分析器實例共用）
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def _get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """取得 HTML 解析用的行程池，未啟用時回傳 None"""
+    global _parse_pool
+    if not NEWS_SETTINGS.get('parse_in_subprocess', True):
+        return None
+    
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            max_workers = NEWS_SETTINGS.get('parse_workers') or os.cpu_count() or 1
+            _parse_pool = ProcessPoolExecutor(max_workers=max_workers)
+        return _parse_pool
+
+
+def _reset_parse_pool() -> None:
+    """關閉已損壞的行程池，下次使用時重新建立"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
+
+
+# Markdown 報告固定區段模板（多行一次格式化）
+_REPORT_HEADER_TPL = """# 🤖 AI股票分析報告
+
+**股票代碼:** {ticker}
+**公司名稱:** {company_name}
+**分析時間:** {analysis_date}
+**綜合評分:** {overall_score}/100
+**投資建議:** {investment_recommendation}
+
+---
+"""
+
+_REPORT_CONCLUSION_TPL = """---
+
+## 📝 結論
+
+基於綜合分析，{company_name} ({ticker}) 獲得 **{overall_score}/100** 的評分，
+投資建議為：**{investment_recommendation}**
+
+⚠️ **免責聲明:** 本報告僅供參考，不構成投資建議。投資有風險，請謹慎決策。
+
+*報告生成時間: {analysis_date}*"""
+
+_PORTFOLIO_HEADER_TPL = """# 📊 投資組合分析摘要報告
+
+**投資組合:** {portfolio_name}
+**分析時間:** {now_str}
+
+---
+"""
+
+_PORTFOLIO_STATS_TPL = """## 📈 分析統計
+
+| 項目 | 數量 |
+|------|------|
+| 總股票數 | {total_stocks} |
+| 成功分析 | {successful_analyses} |
+| 分析失敗 | {failed_analyses} |
+| 成功率 | {success_rate:.1f}% |
+"""
+
+_TOP_RANK_ROW_FMT = "| %d | %s | %.1f | %s | %s |"
+
+_PORTFOLIO_FOOTER_TPL = """- 📈 **建議關注高評分股票，逐步建立倉位**
+- ⚠️ **注意風險控制，避免過度集中在單一股票**
+- 📊 **定期檢視投資組合表現，適時調整配置**
+
+---
+
+⚠️ **免責聲明:** 本報告僅供參考，不構成投資建議。投資有風險，請根據個人風險承受能力謹慎決策。
+
+*報告生成時間: {now_str}*"""
+
+
+def _rsi_status_row(rsi: float) -> str:
+    status = "超買" if rsi > 70 else "超賣" if rsi < 30 else "正常"
+    return f"| RSI ({rsi:.1f}) | {status} |"
+
+
+# 報告指標表格列定義：(欄位, 列模板或格式化函式)；值為空時略過該列
+_KEY_METRIC_ROWS = (
+    ('current_price', "| 當前股價 | ${:.2f} |"),
+    ('market_cap', lambda v: f"| 市值 | ${v / 1e9:.1f}B |"),
+    ('pe_ratio', "| 本益比 (P/E) | {:.2f} |"),
+    ('pb_ratio', "| 股價淨值比 (P/B) | {:.2f} |"),
+    ('rsi', "| RSI | {:.1f} |"),
+    ('52w_position', "| 52週高點位置 | {:.1%} |"),
+)
+
+_FUNDAMENTAL_METRIC_ROWS = (
+    ('pe_ratio', "| 本益比 | {:.2f} |"),
+    ('pb_ratio', "| 股價淨值比 | {:.2f} |"),
+    ('debt_ratio', "| 負債比率 | {:.2f} |"),
+    ('roe', "| 股東權益報酬率 (ROE) | {:.2%} |"),
+    ('profit_margin', "| 利潤率 | {:.2%} |"),
+)
+
+_TECHNICAL_METRIC_ROWS = (
+    ('trend', "| 趨勢方向 | {} |"),
+    ('rsi', _rsi_status_row),
+    ('volume_signal', "| 成交量訊號 | {} |"),
+    ('price_momentum', "| 價格動能 (20日) | {:.2%} |"),
+    ('volatility', "| 波動度 | {:.2%} |"),
+)
+
+_RISK_METRIC_ROWS = (
+    ('volatility_risk', "| 波動風險 | {} |"),
+    ('valuation_risk', "| 估值風險 | {} |"),
+    ('news_risk', "| 新聞風險 | {} |"),
+    ('overall_risk', "| **整體風險** | **{}** |"),
+)
+
+
+def _iter_metric_rows(values: Dict, rows: Tuple):
+    """依列定義逐列產生表格內容，略過缺少或為空的欄位"""
+    get = values.get
+    for key, fmt in rows:
+        value = get(key)
+        if not value:
+            continue
+        yield fmt(value) if callable(fmt) else fmt.format(value)
+
+
+def _render_lines(lines) -> str:
+    """將逐行產生的內容以換行串接寫入單一字串緩衝區，不需先建立完整的行列表"""
+    buf = io.StringIO()
+    write = buf.write
+    it = iter(lines)
+    for first in it:
+        write(first)
+        break
+    for line in it:
+        write("\n")
+        write(line)
+    return buf.getvalue()
+
+
+def _json_default(obj: Any) -> Any:
+    """orjson 無法直接序列化的物件（日期時間、numpy 純量）轉換方式"""
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"無法序列化 {type(obj).__name__} 物件")
+
+
+def _dumps_json(obj: Any, indent: bool = False) -> bytes:
+    """將分析結果序列化為 UTF-8 JSON bytes（優先使用 orjson）"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_json_default, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None,
+                      cls=DateTimeEncoder).encode('utf-8')
+
+
+
+def _atomic_write(filepath: str, data: bytes) -> None:
+    """先寫入暫存檔再以 os.replace 取代目標檔，讀取端不會看到寫到一半的檔案"""
+    tmp_path = f"{filepath}.tmp"
+    try:
+        with open(tmp_path, 'wb', buffering=0) as f:
+            view = memoryview(data)
+            while view:
+                view = view[f.write(view):]
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# 背景寫檔佇列與執行緒（行程內共用，首次排入寫檔時建立）
+_writer_q = None
+_writer_q_lock = threading.Lock()
+
+
+def _writer_loop(writer_q: queue.Queue) -> None:
+    """背景寫檔執行緒：逐一取出 (路徑, 位元組, Future, 失敗回呼) 並原子寫入，結果回報至 Future"""
+    while True:
+        filepath, data, future, on_error = writer_q.get()
+        try:
+            _atomic_write(filepath, data)
+        except Exception as e:
+            logging.error("背景寫入檔案失敗 %s: %s", filepath, e)
+            # 先執行失敗回呼再設定例外，等待 Future 的一方看到的已是更新後的狀態
+            if on_error is not None:
+                try:
+                    on_error(e)
+                except Exception:
+                    pass
+            future.set_exception(e)
+        else:
+            future.set_result(filepath)
+        finally:
+            writer_q.task_done()
+
+
+def _get_writer_queue() -> queue.Queue:
+    """取得共用的背景寫檔佇列，第一次呼叫時啟動寫檔執行緒"""
+    global _writer_q
+    with _writer_q_lock:
+        if _writer_q is None:
+            writer_q = queue.Queue(maxsize=OUTPUT_SETTINGS.get('write_queue_size', 8))
+            threading.Thread(
+                target=_writer_loop, args=(writer_q,), name='report-writer', daemon=True
+            ).start()
+            # 確保程式結束前寫完佇列中的檔案
+            atexit.register(writer_q.join)
+            _writer_q = writer_q
+    return _writer_q
+
+@dataclass
+class StockScore:
+    """單一股票的精簡評分紀錄（完整分析結果另存於磁碟）"""
+    overall: float
+    fundamental: float
+    technical: float
+    news: float
+    timestamp: str
+
+
 class EnhancedStockAnalyzer:
     """增強版股票分析器 - 整合技術面、基本面、新聞面和情緒面"""
     
+    # 常見台股代碼 -> 中文名稱（命中時不需查詢 yfinance）
+    _TW_NAMES = MappingProxyType({
+        '2330.TW': '台積電',
+        '2317.TW': '鴻海',
+        '2454.TW': '聯發科',
+        '2881.TW': '富邦金',
+        '6505.TW': '台塑化',
+        '2412.TW': '中華電',
+        '2303.TW': '聯電',
+        '3008.TW': '大立光',
+        '2002.TW': '中鋼',
+        '1301.TW': '台塑'
+    })
+    
     def __init__(self):
         self.env_vars = load_env_variables()
         self._setup_gemini()
         self.news_cache = {}
-        self.analysis_results = {}
+        self._scores = {}        # {股票代碼: StockScore}
+        self._report_paths = {}  # {股票代碼: 完整分析結果 JSON 檔路徑}
+        self._thread_state = threading.local()  # 每個分析執行緒各自的暫存資料
+        self._sentiment_cache = PersistentLRUCache(
+            max_size=GEMINI_SETTINGS.get('response_cache_size', 1000),
+            db_path=get_cache_path('gemini_sentiment.db') if GEMINI_SETTINGS.get('persist_response_cache', True) else None,
+            ttl=GEMINI_SETTINGS.get('response_cache_ttl')
+        )
+        persist_yf_cache = API_SETTINGS.get('persist_yfinance_cache', True)
+        self._yf_info_cache = PersistentLRUCache(
+            max_size=API_SETTINGS.get('yfinance_cache_size', 512),
+            db_path=get_cache_path('yfinance_info.db') if persist_yf_cache else None,
+            ttl=API_SETTINGS.get('yfinance_cache_ttl', 3600)
+        )
+        self._yf_history_cache = PersistentLRUCache(  # DataFrame 僅快取於記憶體
+            max_size=API_SETTINGS.get('yfinance_cache_size', 512),
+            ttl=API_SETTINGS.get('yfinance_cache_ttl', 3600)
+        )
+        self._http_session = None  # 新聞爬取共用的連線池（延遲建立）
+        self._news_content_cache = PersistentLRUCache(  # 已爬取並清理的新聞內文（以網址的 make_key 雜湊為鍵）
+            max_size=NEWS_SETTINGS.get('content_cache_size', 1000),
+            db_path=get_cache_path('news_content.db') if NEWS_SETTINGS.get('persist_content_cache', True) else None,
+            ttl=NEWS_SETTINGS.get('content_cache_ttl', 12 * 3600)
+        )
+        self._translation_cache = PersistentLRUCache(  # 新聞標題翻譯（跨股票、跨執行重複使用）
+            max_size=NEWS_SETTINGS.get('translation_cache_size', 5000),
+            db_path=get_cache_path('title_translations.db') if NEWS_SETTINGS.get('persist_translation_cache', True) else None,
+            ttl=NEWS_SETTINGS.get('translation_cache_ttl', 30 * 24 * 3600)
+        )
+        self._yahoo_news_cache = PersistentLRUCache(  # yfinance 新聞列表（短期快取，同次執行不重複下載）
+            max_size=API_SETTINGS.get('yfinance_cache_size', 512),
+            ttl=NEWS_SETTINGS.get('yahoo_news_cache_ttl', 1800)
+        )
+        self._prefetched_news = {}  # 批量分析預先取得的 {股票代碼: (新聞, 新聞情緒)}
+        self._http_session_lock = threading.Lock()
+        self._pending_writes = []  # 本實例排入背景寫檔、尚未 flush 的 Future
+        self._pending_writes_lock = threading.Lock()
+    
+    @property
+    def _current_stock_data(self) -> Dict:
+        """目前執行緒正在分析的股票資料（未設定時引發 AttributeError）"""
+        return self._thread_state.stock_data
+    
+    @_current_stock_data.setter
+    def _current_stock_data(self, stock_data: Dict) -> None:
+        self._thread_state.stock_data = stock_data
+    
+    @_current_stock_data.deleter
+    def _current_stock_data(self) -> None:
+        del self._thread_state.stock_data
         
     def _setup_gemini(self) -> None:
         """設置 Gemini API"""
@@ -64,6 +1033,11 @@ class EnhancedStockAnalyzer:
                 report_gemini_error(f"Gemini AI 初始化失敗: {e}")
             self.model = None
 
+    def _generate_content(self, prompt: str):
+        """經由共用節流器呼叫 Gemini，主動分散請求而非等到 429 才退避"""
+        _GEMINI_PACER.wait()
+        return self.model.generate_content(prompt)
+
     def translate_to_chinese(self, text: str) -> str:
         """使用 Gemini AI 將英文翻譯成繁體中文"""
         if not text or not self.model:
@@ -71,7 +1045,7 @@ class EnhancedStockAnalyzer:
             
         try:
             # 如果已經包含中文字符，直接返回
-            if any('\u4e00' <= char <= '\u9fff' for char in text):
+            if _HAN_RE.search(text):
                 return text
                 
             prompt = f"""
@@ -86,7 +1060,7 @@ class EnhancedStockAnalyzer:
             4. 直接返回翻譯結果，不要加任何說明
             """
             
-            response = self.model.generate_content(prompt)
+            response = self._generate_content(prompt)
             translated_text = response.text.strip()
             
             # 報告成功使用 API
@@ -112,7 +1086,7 @@ class EnhancedStockAnalyzer:
                 self._setup_gemini()
                 logging.info("已切換到新的 API Key，重新嘗試翻譯")
                 if self.model:
-                    response = self.model.generate_content(prompt)
+                    response = self._generate_content(prompt)
                     if report_gemini_success:
                         report_gemini_success()
                     translated_text = response.text.strip()
@@ -135,8 +1109,8 @@ class EnhancedStockAnalyzer:
             return titles
             
         try:
-            # 過濾掉空標題
-            non_empty_titles = [title for title in titles if title and title.strip()]
+            # 過濾掉空標題與已是中文的標題
+            non_empty_titles = [title for title in titles if _needs_translation(title)]
             if not non_empty_titles:
                 return titles
                 
@@ -156,7 +1130,7 @@ class EnhancedStockAnalyzer:
             5. 每行一個翻譯，格式：1. 翻譯結果
             """
             
-            response = self.model.generate_content(prompt)
+            response = self._generate_content(prompt)
             translated_lines = response.text.strip().split('\n')
             
             # 解析翻譯結果
@@ -179,7 +1153,7 @@ class EnhancedStockAnalyzer:
                 result = []
                 translated_index = 0
                 for original_title in titles:
-                    if original_title and original_title.strip():
+                    if _needs_translation(original_title):
                         result.append(translated_titles[translated_index])
                         translated_index += 1
                     else:
@@ -194,22 +1168,142 @@ class EnhancedStockAnalyzer:
             logging.warning(f"批量翻譯失敗: {e}, 回退到單個翻譯")
             return [self.translate_to_chinese(title) for title in titles]
 
-    def get_stock_news(self, ticker: str, days: int = 7) -> List[Dict]:
-        """獲取股票相關新聞（支持多種來源，確保至少5條成功爬取內容的新聞）"""
+    def translate_titles_multi(self, titles_by_ticker: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """合併多檔股票的新聞標題一起翻譯：相同標題只翻譯一次，已快取的標題不呼叫 Gemini，
+        其餘每 translation_batch_size 個標題一次 Gemini 呼叫；回傳與輸入相同結構的翻譯結果"""
+        translated = {}
+        pending = []
+        for titles in titles_by_ticker.values():
+            for title in titles:
+                if title in translated or not _needs_translation(title):
+                    continue
+                cached = self._translation_cache.get(PersistentLRUCache.make_key(title))
+                translated[title] = cached
+                if cached is None:
+                    pending.append(title)
+        
+        if pending:
+            batch_size = max(1, NEWS_SETTINGS.get('translation_batch_size', 50))
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                for title, result in zip(chunk, self.batch_translate_titles(chunk)):
+                    translated[title] = result
+                    if result and result != title:
+                        self._translation_cache.set(PersistentLRUCache.make_key(title), result)
+        
+        return {
+            ticker: [translated.get(title) or title for title in titles]
+            for ticker, titles in titles_by_ticker.items()
+        }
+    
+    def _translate_news_titles(self, news_by_ticker: Dict[str, List[Dict]]) -> None:
+        """翻譯各股票新聞標題（原標題保存於 original_title）"""
+        titles_by_ticker = {
+            ticker: [news.get('title', '') for news in news_list]
+            for ticker, news_list in news_by_ticker.items()
+        }
+        translated_by_ticker = self.translate_titles_multi(titles_by_ticker)
+        for ticker, news_list in news_by_ticker.items():
+            for news, translated_title in zip(news_list, translated_by_ticker[ticker]):
+                news['original_title'] = news.get('title', '')  # 保存原始英文標題
+                news['title'] = translated_title  # 使用翻譯後的中文標題
+    
+    def _get_ticker_info(self, ticker: str) -> Dict:
+        """取得 yfinance 股票基本資訊（TTL 快取，避免重複下載）"""
+        info = self._yf_info_cache.get(ticker)
+        if info is None:
+            info = yf.Ticker(ticker).info or {}
+            if info:
+                self._yf_info_cache.set(ticker, info)
+        return info
+    
+    def prefetch_yahoo_data(self, tickers: List[str], max_workers: int = 8) -> None:
+        """以單一 yf.Tickers 物件並行預取多檔股票的基本資訊與新聞，寫入既有的 TTL 快取
+        
+        之後 _get_ticker_info 與 _get_yahoo_news 直接命中快取，不再逐檔序列下載
+        """
+        use_news_cache = NEWS_SETTINGS.get('cache_news', True)
+        pending = [
+            ticker for ticker in dict.fromkeys(tickers)
+            if ticker and (self._yf_info_cache.get(ticker) is None
+                           or (use_news_cache and self._yahoo_news_cache.get(ticker) is None))
+        ]
+        if not pending:
+            return
+        
+        bundle = yf.Tickers(' '.join(pending))
+        
+        def warm(ticker: str) -> None:
+            stock = bundle.tickers.get(ticker.upper()) or yf.Ticker(ticker)
+            try:
+                if self._yf_info_cache.get(ticker) is None:
+                    info = stock.info or {}
+                    if info:
+                        self._yf_info_cache.set(ticker, info)
+                if use_news_cache and self._yahoo_news_cache.get(ticker) is None:
+                    news = self._fetch_yahoo_news(ticker, stock)
+                    if news:
+                        self._yahoo_news_cache.set(ticker, news)
+            except Exception as e:
+                logging.warning(f"預取 {ticker} 的 Yahoo Finance 資料失敗: {e}")
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+            list(executor.map(warm, pending))
+        logging.info(f"已預取 {len(pending)} 檔股票的 Yahoo Finance 基本資訊與新聞")
+    
+    def _get_ticker_history(self, ticker: str, period: str = "3mo") -> pd.DataFrame:
+        """取得 yfinance 歷史價格（TTL 快取，避免重複下載）"""
+        cache_key = f"{ticker}:{period}"
+        hist = self._yf_history_cache.get(cache_key)
+        if hist is None:
+            hist = yf.Ticker(ticker).history(period=period)
+            if not hist.empty:
+                self._yf_history_cache.set(cache_key, hist)
+        return hist
+    
+    def get_stock_news(self, ticker: str, days: int = 7, translate_titles: bool = True) -> List[Dict]:
+        """獲取股票相關新聞（支持多種來源，確保至少5條成功爬取內容的新聞）
+        
+        translate_titles 為 False 時不翻譯標題，供批量流程之後合併多檔股票一起翻譯
+        """
         try:
-            # 主要來源：yfinance
-            news_list = self._get_yahoo_news(ticker)
+            # 主要來源：yfinance（同時建立去重用的正規化標題與 URL 集合，整個重試流程共用）
+            news_list = []
+            seen_titles = set()
+            seen_urls = set()
+            
+            def add_news(news_item: Dict) -> bool:
+                """加入未重複的新聞（正規化標題或有效 URL 相同皆視為重複）"""
+                title_key = _normalize_title(news_item.get('title', ''))
+                url = news_item.get('url', '')
+                if title_key and title_key in seen_titles:
+                    return False
+                if url and url != '#' and url in seen_urls:
+                    return False
+                news_list.append(news_item)
+                seen_titles.add(title_key)
+                seen_urls.add(url)
+                return True
+            
+            for news_item in self._get_yahoo_news(ticker):
+                add_news(news_item)
             
             # 設定目標：至少5條成功爬取內容的新聞
             target_successful_news = 5
             max_attempts = 3
             attempt = 0
+            min_content_length = NEWS_SETTINGS.get('min_content_length', 50)
+            
+            # 已取得有效內容的新聞（以 URL 為鍵），重試時保留，不再重新爬取
+            keep = {}
+            # 已處理過的新聞數量，重試時只處理新補充的項目
+            processed = 0
             
             while attempt < max_attempts:
                 attempt += 1
                 
-                # 如果需要更多新聞，使用 Gemini 補充
-                if not news_list or len(news_list) < 10:  # 確保有足夠的候選新聞
+                # 如果需要更多新聞，使用 Gemini 補充（重試時一律補充新候選）
+                if attempt > 1 or len(news_list) < 10:  # 確保有足夠的候選新聞
                     if not news_list:
                         logging.warning(f"未找到 {ticker} 的新聞，嘗試使用 Gemini 備用搜尋...")
                     else:
@@ -217,14 +1311,9 @@ class EnhancedStockAnalyzer:
                     
                     gemini_news = self._get_gemini_news(ticker, days, max_results=10)
                     if gemini_news:
-                        if not news_list:
-                            news_list = gemini_news
-                        else:
-                            # 合併新聞，避免重複
-                            existing_titles = {news.get('title', '') for news in news_list}
-                            for new_news in gemini_news:
-                                if new_news.get('title', '') not in existing_titles:
-                                    news_list.append(new_news)
+                        # 合併新聞，避免重複
+                        for new_news in gemini_news:
+                            add_news(new_news)
                         
                         logging.info(f"✅ Gemini 搜尋到 {len(gemini_news)} 條新聞，總計 {len(news_list)} 條")
                 
@@ -232,66 +1321,60 @@ class EnhancedStockAnalyzer:
                     logging.warning(f"❌ 第 {attempt} 次嘗試未找到 {ticker} 的新聞")
                     continue
                 
-                # 爬取新聞內容並計算成功數量
-                successful_scrapes = 0
-                failed_scrapes = 0
-                
                 if NEWS_SETTINGS.get('scrape_full_content', True):
-                    for i, news_item in enumerate(news_list):
-                        try:
-                            url = news_item.get('url', '')
-                            
-                            # 檢查 URL 有效性
-                            if not url or url in ['#', ''] or not url.startswith(('http://', 'https://')):
-                                logging.info(f"跳過第 {i+1} 條新聞：無效的 URL ({url})")
-                                news_item['content'] = news_item.get('summary', '')
-                                # 如果摘要足夠長，也算作成功
-                                if len(news_item.get('summary', '')) > 50:
-                                    successful_scrapes += 1
-                                else:
-                                    failed_scrapes += 1
-                                continue
-                            
-                            logging.info(f"正在爬取第 {i+1}/{len(news_list)} 條新聞內容...")
-                            content = self._scrape_news_content(url)
-                            
-                            if content and len(content) > NEWS_SETTINGS.get('min_content_length', 50):
-                                news_item['content'] = content
-                                successful_scrapes += 1
-                                logging.info(f"✅ 成功爬取新聞內容 ({len(content)} 字元)")
-                            else:
-                                news_item['content'] = news_item.get('summary', '')
-                                # 如果摘要足夠長，也算作成功
-                                if len(news_item.get('summary', '')) > 50:
-                                    successful_scrapes += 1
-                                else:
-                                    failed_scrapes += 1
-                                logging.warning(f"❌ 新聞內容爬取失敗，使用摘要代替")
-                                
-                        except Exception as e:
+                    new_items = news_list[processed:]
+                    processed = len(news_list)
+                    if not new_items:
+                        logging.warning(f"⚠️ 第 {attempt} 次嘗試沒有新的候選新聞")
+                        continue
+                    
+                    failed_scrapes = 0
+                    scrape_targets = []
+                    for i, news_item in enumerate(new_items):
+                        url = news_item.get('url', '')
+                        
+                        # 檢查 URL 有效性
+                        if not url or url in ['#', ''] or not url.startswith(('http://', 'https://')):
+                            logging.info(f"跳過新聞「{news_item.get('title', '')[:30]}」：無效的 URL ({url})")
                             news_item['content'] = news_item.get('summary', '')
+                            # 如果摘要足夠長，也算作成功
                             if len(news_item.get('summary', '')) > 50:
-                                successful_scrapes += 1
+                                keep[url or news_item.get('title', '')] = news_item
                             else:
                                 failed_scrapes += 1
-                            logging.warning(f"❌ 爬取新聞內容時發生錯誤: {e}")
                             continue
+                        
+                        scrape_targets.append(news_item)
                     
-                    logging.info(f"新聞內容處理完成: 成功 {successful_scrapes} 條，失敗 {failed_scrapes} 條")
+                    # 批量爬取（下載與 HTML 解析並行），只爬取尚未處理的 URL
+                    contents = self._scrape_news_contents([item['url'] for item in scrape_targets])
+                    
+                    for news_item, content in zip(scrape_targets, contents):
+                        if content and len(content) > min_content_length:
+                            news_item['content'] = content
+                            keep[news_item['url']] = news_item
+                            logging.info(f"✅ 成功爬取新聞內容 ({len(content)} 字元)")
+                        else:
+                            news_item['content'] = news_item.get('summary', '')
+                            # 如果摘要足夠長，也算作成功
+                            if len(news_item.get('summary', '')) > 50:
+                                keep[news_item['url']] = news_item
+                            else:
+                                failed_scrapes += 1
+                            logging.warning(f"❌ 新聞內容爬取失敗，使用摘要代替")
+                    
+                    logging.info(f"新聞內容處理完成: 累計成功 {len(keep)} 條，本輪失敗 {failed_scrapes} 條")
                     
                     # 檢查是否達到目標
-                    if successful_scrapes >= target_successful_news:
-                        logging.info(f"✅ 已獲得 {successful_scrapes} 條有效新聞，達到目標！")
+                    if len(keep) >= target_successful_news:
+                        logging.info(f"✅ 已獲得 {len(keep)} 條有效新聞，達到目標！")
                         break
                     elif attempt < max_attempts:
-                        logging.warning(f"⚠️ 只有 {successful_scrapes} 條有效新聞，需要 {target_successful_news} 條，嘗試第 {attempt + 1} 次搜尋...")
-                        # 清空現有新聞列表，重新搜尋
-                        news_list = []
+                        logging.warning(f"⚠️ 只有 {len(keep)} 條有效新聞，需要 {target_successful_news} 條，嘗試第 {attempt + 1} 次搜尋...")
                 else:
                     # 如果不爬取內容，直接使用摘要
                     for news_item in news_list:
                         news_item['content'] = news_item.get('summary', '')
-                    successful_scrapes = len(news_list)
                     break
             
             if not news_list:
@@ -299,22 +1382,11 @@ class EnhancedStockAnalyzer:
                 return []
             
             # 翻譯新聞標題
-            if NEWS_SETTINGS.get('translate_titles', True) and news_list:
+            if translate_titles and NEWS_SETTINGS.get('translate_titles', True) and news_list:
                 logging.info("正在翻譯新聞標題...")
                 try:
-                    # 提取所有標題
-                    titles = [news.get('title', '') for news in news_list]
-                    
-                    # 批量翻譯
-                    translated_titles = self.batch_translate_titles(titles)
-                    
-                    # 更新新聞項目的標題
-                    for i, news in enumerate(news_list):
-                        if i < len(translated_titles):
-                            news['original_title'] = news.get('title', '')  # 保存原始英文標題
-                            news['title'] = translated_titles[i]  # 使用翻譯後的中文標題
-                    
-                    logging.info(f"成功翻譯 {len(translated_titles)} 個新聞標題")
+                    self._translate_news_titles({ticker: news_list})
+                    logging.info(f"成功翻譯 {len(news_list)} 個新聞標題")
                     
                 except Exception as e:
                     logging.warning(f"翻譯新聞標題失敗: {e}")
@@ -326,17 +1398,64 @@ class EnhancedStockAnalyzer:
         except Exception as e:
             logging.error(f"獲取 {ticker} 新聞時發生錯誤: {e}")
             return []
-            logging.info(f"成功獲取 {ticker} 的 {len(news_list)} 條新聞")
-            return news_list
-            
-        except Exception as e:
-            logging.error(f"獲取 {ticker} 新聞失敗: {e}")
+    
+    def get_stock_news_many(self, stock_list: List[Union[str, Dict]], days: int = 7,
+                            translate_titles: bool = True) -> List[List[Dict]]:
+        """並行獲取多檔股票的新聞，回傳與 stock_list 順序對應的新聞列表
+        
+        stock_list 元素可為股票代碼，或含 symbol/ticker 的股票資料（提供公司名稱給 Gemini 搜尋）；
+        同時處理的股票數由 NEWS_SETTINGS['ticker_concurrency'] 限制，標題於全部完成後合併翻譯
+        """
+        def fetch_news(stock: Union[str, Dict]) -> List[Dict]:
+            if isinstance(stock, str):
+                return self.get_stock_news(stock, days, translate_titles=False)
+            ticker = stock.get('symbol') or stock.get('ticker')
+            if not ticker:
+                return []
+            self._current_stock_data = stock
+            try:
+                return self.get_stock_news(ticker, days, translate_titles=False)
+            finally:
+                del self._current_stock_data
+        
+        if not stock_list:
             return []
+        
+        max_workers = max(1, min(NEWS_SETTINGS.get('ticker_concurrency', 4), len(stock_list)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            news_lists = list(executor.map(fetch_news, stock_list))
+        
+        # 所有股票的新聞標題合併翻譯（取代每檔股票各一次 Gemini 呼叫）
+        if translate_titles and NEWS_SETTINGS.get('translate_titles', True):
+            # 以清單位置為鍵，同一股票重複出現時各自的新聞列表都會翻譯
+            news_by_position = {i: news_list for i, news_list in enumerate(news_lists) if news_list}
+            if news_by_position:
+                try:
+                    self._translate_news_titles(news_by_position)
+                except Exception as e:
+                    logging.warning(f"翻譯新聞標題失敗: {e}")
+        
+        return news_lists
     
     def _get_yahoo_news(self, ticker: str) -> List[Dict]:
-        """從 Yahoo Finance 獲取新聞，專注於一週內的短線投資新聞"""
+        """從 Yahoo Finance 獲取新聞，專注於一週內的短線投資新聞（短期快取，快取值為副本）"""
+        use_cache = NEWS_SETTINGS.get('cache_news', True)
+        if use_cache:
+            cached = self._yahoo_news_cache.get(ticker)
+            if cached is not None:
+                logging.info(f"使用快取的 {ticker} Yahoo Finance 新聞列表")
+                return cached
+        
+        news = self._fetch_yahoo_news(ticker)
+        if news and use_cache:
+            self._yahoo_news_cache.set(ticker, news)
+        return news
+    
+    def _fetch_yahoo_news(self, ticker: str, stock=None) -> List[Dict]:
+        """下載並篩選 Yahoo Finance 新聞（stock 可傳入預先建立的 yf.Ticker）"""
         try:
-            stock = yf.Ticker(ticker)
+            if stock is None:
+                stock = yf.Ticker(ticker)
             news = stock.news
             
             if not news:
@@ -349,8 +1468,9 @@ class EnhancedStockAnalyzer:
             one_week_ago = now - timedelta(days=NEWS_SETTINGS.get('news_days_back', 7))
             priority_hours_ago = now - timedelta(hours=NEWS_SETTINGS.get('priority_recent_hours', 24))
             
-            processed_news = []
-            priority_news = []  # 24小時內的優先新聞
+            processed_news = []  # (排序鍵, 新聞)
+            priority_count = 0  # 24小時內的優先新聞數
+            candidates = []  # (title, summary, publisher, publish_time, publish_timestamp, url)
             
             for item in news[:NEWS_SETTINGS.get('max_news_per_stock', 8) * 2]:  # 多獲取一些，然後篩選
                 try:
@@ -411,48 +1531,56 @@ class EnhancedStockAnalyzer:
                         else:
                             publish_time = ''
                     
-                    # 時間過濾：只保留一週內的新聞
-                    if publish_timestamp:
-                        if publish_timestamp < one_week_ago:
-                            continue  # 跳過超過一週的新聞
-                    
-                    # 檢查新聞相關性（基本過濾）
-                    if not self._is_news_relevant(title, summary, ticker):
-                        continue
-                    
-                    news_item = {
-                        'title': title,
-                        'summary': summary,
-                        'publisher': publisher,
-                        'publish_time': publish_time,
-                        'publish_timestamp': publish_timestamp.isoformat() if publish_timestamp else None,  # 轉換為 ISO 字符串
-                        'url': url,
-                        'source': 'Yahoo Finance',
-                        'content': '',  # 將在後續填充
-                        'is_recent': publish_timestamp and publish_timestamp >= priority_hours_ago if publish_timestamp else False
-                    }
-                    
-                    if title and url:  # 確保有標題和URL
-                        if news_item['is_recent']:
-                            priority_news.append(news_item)
-                        else:
-                            processed_news.append(news_item)
+                    candidates.append((title, summary, publisher, publish_time, publish_timestamp, url))
                     
                 except Exception as e:
                     logging.warning(f"處理新聞項目時出錯: {e}")
                     continue
             
-            # 組合新聞：優先顯示最近24小時的新聞，然後是一週內的其他新聞
-            final_news = priority_news + processed_news
+            # 時間過濾與 24 小時內分類：一次處理整批時間戳
+            timestamps = np.fromiter(
+                (ts.timestamp() if ts else np.nan for _, _, _, _, ts, _ in candidates),
+                dtype=np.float64, count=len(candidates)
+            )
+            keep_mask, recent_mask = _classify_news_timestamps(
+                timestamps, one_week_ago.timestamp(), priority_hours_ago.timestamp()
+            )
             
-            # 限制新聞數量
-            max_news = NEWS_SETTINGS.get('max_news_per_stock', 8)
-            final_news = final_news[:max_news]
+            # 排序鍵：unix 時間戳，缺少時間的新聞排在最後
+            sort_keys = np.nan_to_num(timestamps, nan=-np.inf)
             
-            # 按時間排序（最新的在前）
-            final_news.sort(key=lambda x: x.get('publish_timestamp') or datetime.min.replace(tzinfo=timezone.utc), reverse=True)
+            for (title, summary, publisher, publish_time, publish_timestamp, url), keep, is_recent, sort_key in zip(
+                    candidates, keep_mask, recent_mask, sort_keys):
+                # 時間過濾：只保留一週內的新聞
+                if not keep:
+                    continue  # 跳過超過一週的新聞
+                
+                # 檢查新聞相關性（基本過濾）
+                if not self._is_news_relevant(title, summary, ticker):
+                    continue
+                
+                news_item = {
+                    'title': title,
+                    'summary': summary,
+                    'publisher': publisher,
+                    'publish_time': publish_time,
+                    'publish_timestamp': publish_timestamp.isoformat() if publish_timestamp else None,  # 轉換為 ISO 字符串
+                    'url': url,
+                    'source': 'Yahoo Finance',
+                    'content': '',  # 將在後續填充
+                    'is_recent': bool(is_recent)
+                }
+                
+                if title and url:  # 確保有標題和URL
+                    processed_news.append((sort_key, news_item))
+                    if news_item['is_recent']:
+                        priority_count += 1
             
-            logging.info(f"獲取到 {ticker} 的 {len(final_news)} 條一週內新聞（其中 {len(priority_news)} 條為24小時內）")
+            # 取最新的 max_news 條（最新的在前，24小時內的新聞自然排在前面），不需排序整個列表
+            max_news = NEWS_SETTINGS.get('max_news_per_stock', 8)
+            final_news = [news_item for _, news_item in heapq.nlargest(max_news, processed_news, key=itemgetter(0))]
+            
+            logging.info(f"獲取到 {ticker} 的 {len(final_news)} 條一週內新聞（其中 {priority_count} 條為24小時內）")
             return final_news
             
         except Exception as e:
@@ -476,7 +1604,8 @@ class EnhancedStockAnalyzer:
             # 獲取公司名稱用於搜尋
             company_name = self._get_company_name(ticker)
             
-            # 使用 Gemini 搜尋新聞
+            # 使用 Gemini 搜尋新聞（與其他 Gemini 呼叫共用節流器）
+            _GEMINI_PACER.wait()
             news_results = gemini_searcher.search_stock_news(
                 ticker=ticker,
                 company_name=company_name,
@@ -530,30 +1659,18 @@ class EnhancedStockAnalyzer:
                 if company_name and company_name != ticker:
                     return company_name
             
-            # 嘗試從 yfinance 獲取公司名稱
-            stock = yf.Ticker(ticker)
-            info = stock.info
+            # 常見台股直接使用中文名稱映射，不需網路請求
+            company_name = self._TW_NAMES.get(ticker)
+            if company_name:
+                return company_name
+            
+            # 嘗試從 yfinance 獲取公司名稱（基本資訊已有 TTL 快取）
+            info = self._get_ticker_info(ticker)
             company_name = info.get('longName') or info.get('shortName')
             
             if company_name:
                 return company_name
                 
-            # 對於台股，提供一些常見的中文名稱映射
-            if ticker.endswith('.TW'):
-                common_names = {
-                    '2330.TW': '台積電',
-                    '2317.TW': '鴻海',
-                    '2454.TW': '聯發科',
-                    '2881.TW': '富邦金',
-                    '6505.TW': '台塑化',
-                    '2412.TW': '中華電',
-                    '2303.TW': '聯電',
-                    '3008.TW': '大立光',
-                    '2002.TW': '中鋼',
-                    '1301.TW': '台塑'
-                }
-                return common_names.get(ticker)
-                
         except Exception as e:
             logging.warning(f"無法獲取 {ticker} 的公司名稱: {e}")
             
@@ -565,17 +1682,14 @@ class EnhancedStockAnalyzer:
             return None
             
         try:
-            # 嘗試不同的時間格式
-            formats = [
-                '%Y-%m-%d',
-                '%Y-%m-%d %H:%M:%S',
-                '%Y/%m/%d',
-                '%Y/%m/%d %H:%M:%S',
-                '%m/%d/%Y',
-                '%d/%m/%Y'
-            ]
-            
-            for fmt in formats:
+            # 優先以 ISO 8601 解析（涵蓋 %Y-%m-%d 與 %Y-%m-%d %H:%M:%S，遠快於 strptime）
+            try:
+                return datetime.fromisoformat(time_str)
+            except ValueError:
+                pass
+            
+            # 嘗試其他時間格式
+            for fmt in _TIME_FORMATS:
                 try:
                     return datetime.strptime(time_str, fmt)
                 except ValueError:
@@ -592,7 +1706,131 @@ class EnhancedStockAnalyzer:
         """使用 requests + BeautifulSoup4 智能爬取新聞內容，加強反反爬蟲機制"""
         if not url:
             return ""
+        
+        cached = self._news_content_cache.get(PersistentLRUCache.make_key(url))
+        if cached is not None:
+            return cached
+        
+        html = self._fetch_news_html(url)
+        if not html:
+            return ""
+        
+        try:
+            content = _parse_worker(html, url)
+        except Exception as e:
+            logging.warning(f"爬取新聞內容失敗 {url}: {e}")
+            return ""
+        self._cache_news_content(url, content)
+        return content
+    
+    def _cache_news_content(self, url: str, content: str) -> None:
+        """記錄成功爬取的內文（過短的內容可能是暫時失敗，不快取）"""
+        if content and len(content) > NEWS_SETTINGS.get('min_content_length', 50):
+            self._news_content_cache.set(PersistentLRUCache.make_key(url), content)
+    
+    def _scrape_news_contents(self, urls: List[str]) -> List[str]:
+        """批量爬取新聞內容：已快取的網址直接沿用，其餘才下載與解析"""
+        contents = [self._news_content_cache.get(PersistentLRUCache.make_key(url)) for url in urls]
+        missing = [i for i, content in enumerate(contents) if content is None]
+        if len(missing) < len(urls):
+            logging.info(f"{len(urls) - len(missing)} 條新聞內容使用快取")
+        if missing:
+            scraped = self._download_news_contents([urls[i] for i in missing])
+            for i, content in zip(missing, scraped):
+                contents[i] = content
+                self._cache_news_content(urls[i], content)
+        return contents
+    
+    def _download_news_contents(self, urls: List[str]) -> List[str]:
+        """下載並解析新聞內容：下載以 aiohttp 並行（或主執行緒逐篇下載），HTML 解析交由行程池並行處理"""
+        if len(urls) > 1 and aiohttp is not None and NEWS_SETTINGS.get('async_scraping', True):
+            logging.info(f"正在並行爬取 {len(urls)} 條新聞內容...")
+            htmls = asyncio.run_coroutine_threadsafe(
+                self._fetch_news_html_batch(urls), _get_agent_loop()
+            ).result()
+            parse_pool = _get_parse_pool()
+            return self._collect_parsed_contents([
+                (url, html, self._submit_parse(parse_pool, url, html)) for url, html in zip(urls, htmls)
+            ])
+        
+        parse_pool = _get_parse_pool() if len(urls) > 1 else None
+        if parse_pool is None:
+            contents = []
+            for i, url in enumerate(urls):
+                logging.info(f"正在爬取第 {i+1}/{len(urls)} 條新聞內容...")
+                html = self._fetch_news_html(url)
+                contents.extend(self._collect_parsed_contents([(url, html, None)]))
+            return contents
+        
+        # 下載與解析重疊進行：提交解析任務後立即下載下一篇
+        pending = []
+        for i, url in enumerate(urls):
+            logging.info(f"正在爬取第 {i+1}/{len(urls)} 條新聞內容...")
+            html = self._fetch_news_html(url)
+            pending.append((url, html, self._submit_parse(parse_pool, url, html)))
+        
+        return self._collect_parsed_contents(pending)
+    
+    @staticmethod
+    def _submit_parse(parse_pool: Optional[ProcessPoolExecutor], url: str, html: bytes) -> Optional[Future]:
+        """將 HTML 解析提交至行程池，無內容或提交失敗時回傳 None（改為直接解析）"""
+        if not html or parse_pool is None:
+            return None
+        try:
+            return parse_pool.submit(_parse_worker, html, url)
+        except Exception as e:
+            logging.warning(f"提交解析任務失敗，改為直接解析: {e}")
+            return None
+    
+    @staticmethod
+    def _collect_parsed_contents(pending: List[Tuple[str, bytes, Optional[Future]]]) -> List[str]:
+        """依序取得解析結果；行程池失效或未提交的任務改於本執行緒解析"""
+        contents = []
+        for url, html, future in pending:
+            if not html:
+                contents.append("")
+                continue
+            try:
+                if future is not None:
+                    contents.append(future.result())
+                    continue
+            except BrokenProcessPool as e:
+                logging.warning(f"解析行程池已失效，改為直接解析: {e}")
+                _reset_parse_pool()
+            except Exception as e:
+                logging.warning(f"爬取新聞內容失敗 {url}: {e}")
+                contents.append("")
+                continue
             
+            try:
+                contents.append(_parse_worker(html, url))
+            except Exception as e:
+                logging.warning(f"爬取新聞內容失敗 {url}: {e}")
+                contents.append("")
+        
+        return contents
+    
+    def _get_http_session(self) -> requests.Session:
+        """取得共用的 requests.Session，重複使用 TCP/TLS 連線"""
+        with self._http_session_lock:
+            if self._http_session is None:
+                session = requests.Session()
+                # 連線建立失敗（DNS、連線被拒）於傳輸層快速重試；HTTP 狀態碼重試仍由 _fetch_news_html 依 Retry-After 處理
+                connect_retries = NEWS_SETTINGS.get('connect_retries', 2)
+                adapter = HTTPAdapter(
+                    pool_connections=NEWS_SETTINGS.get('http_pool_connections', 32),
+                    pool_maxsize=NEWS_SETTINGS.get('http_pool_maxsize', 64),
+                    max_retries=Retry(total=connect_retries, connect=connect_retries, read=0, status=0,
+                                      backoff_factor=0.3)
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._http_session = session
+            return self._http_session
+    
+    @staticmethod
+    def _news_request_headers(url: str) -> Dict[str, str]:
+        """組合新聞頁面請求的 headers（輪換 User-Agent，特定網站加入 Referer）"""
         # 多個 User-Agent 輪換
         user_agents = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -603,7 +1841,6 @@ class EnhancedStockAnalyzer:
             'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         ]
         
-        import random
         selected_ua = random.choice(user_agents)
         
         # 加強版 headers
@@ -623,17 +1860,19 @@ class EnhancedStockAnalyzer:
             'Pragma': 'no-cache'
         }
         
-        # 如果是特定網站，加入 Referer
-        if 'yahoo.com' in url:
-            headers['Referer'] = 'https://finance.yahoo.com/'
-        elif 'reuters.com' in url:
-            headers['Referer'] = 'https://www.reuters.com/'
-        elif 'marketwatch.com' in url:
-            headers['Referer'] = 'https://www.marketwatch.com/'
-        elif 'cnbc.com' in url:
-            headers['Referer'] = 'https://www.cnbc.com/'
-        elif 'bloomberg.com' in url:
-            headers['Referer'] = 'https://www.bloomberg.com/'
+        # 如果是特定網站，加入 Referer（與內文選擇器共用主網域查表）
+        referer = NEWS_REFERERS_BY_HOST.get(_host_domain(url))
+        if referer:
+            headers['Referer'] = referer
+        
+        return headers
+    
+    def _fetch_news_html(self, url: str) -> bytes:
+        """下載新聞頁面原始 HTML，失敗時回傳空 bytes"""
+        if not url:
+            return b""
+            
+        headers = self._news_request_headers(url)
         
         # 重試機制
         max_retries = NEWS_SETTINGS.get('max_retries', 3)
@@ -644,76 +1883,129 @@ class EnhancedStockAnalyzer:
         
         for attempt in range(max_retries):
             try:
-                # 隨機延遲 (如果啟用)
-                if use_random_delay:
+                # 隨機延遲 (如果啟用)，重試前已做過退避等待，只在首次請求時延遲
+                if use_random_delay and attempt == 0:
                     delay = random.uniform(random_delay_range[0], random_delay_range[1])
                     time.sleep(delay)
                 
-                # 使用 session 來保持連接
-                session = requests.Session()
-                session.headers.update(headers)
+                # 使用共用 session 來保持連接（每次請求仍帶入各自的 headers）
+                http = self._get_http_session() if NEWS_SETTINGS.get('use_session', True) else requests
                 
-                response = session.get(
+                # 串流讀取，超過 max_html_bytes 即停止，限制單篇頁面的記憶體與解析成本
+                response = http.get(
                     url, 
+                    headers=headers,
                     timeout=NEWS_SETTINGS.get('request_timeout', 15),
                     allow_redirects=True,
-                    verify=True
+                    verify=True,
+                    stream=True
                 )
-                response.raise_for_status()
-                
-                # 使用 BeautifulSoup 解析 HTML
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # 移除不需要的標籤
-                for unwanted in soup(['script', 'style', 'nav', 'header', 'footer', 'aside', 
-                                     '.advertisement', '.ad', '.ads', '.sidebar', '.menu',
-                                     '.social-share', '.comments', '.related-articles']):
-                    if hasattr(unwanted, 'decompose'):
-                        unwanted.decompose()
-                    else:
-                        for elem in soup.find_all(unwanted):
-                            elem.decompose()
-                
-                content = self._extract_article_content(soup, url)
-                
-                # 清理和格式化內容
-                content = self._clean_content(content)
-                
-                # 限制內容長度
-                max_length = NEWS_SETTINGS.get('max_content_length', 3000)
-                if len(content) > max_length:
-                    content = content[:max_length] + "..."
-                
-                session.close()
-                return content
+                with response:
+                    response.raise_for_status()
+                    
+                    max_html_bytes = NEWS_SETTINGS.get('max_html_bytes')
+                    if not max_html_bytes:
+                        return response.content
+                    
+                    buf = bytearray()
+                    for chunk in response.iter_content(chunk_size=65536):
+                        buf += chunk
+                        if len(buf) >= max_html_bytes:
+                            logging.info(f"新聞頁面超過 {max_html_bytes} 位元組，截斷讀取: {url}")
+                            break
+                    return bytes(buf[:max_html_bytes])
                 
             except requests.exceptions.HTTPError as e:
-                if e.response.status_code in [403, 401, 429]:
-                    # 被封鎖，增加延遲後重試
+                if e.response.status_code in [403, 401, 429, 500, 502, 503, 504]:
+                    # 被封鎖或伺服器暫時錯誤，依 Retry-After 或隨機指數退避後重試
                     if attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * retry_delay_base  # 使用配置的重試延遲
-                        logging.warning(f"收到 {e.response.status_code} 錯誤，等待 {wait_time} 秒後重試... (嘗試 {attempt + 1}/{max_retries})")
+                        wait_time = _retry_wait_time(e.response, attempt, retry_delay_base)
+                        logging.warning(f"收到 {e.response.status_code} 錯誤，等待 {wait_time:.1f} 秒後重試... (嘗試 {attempt + 1}/{max_retries})")
                         time.sleep(wait_time)
                         continue
                     else:
                         logging.warning(f"多次重試後仍失敗 {url}: {e}")
-                        return ""
+                        return b""
                 else:
                     logging.warning(f"HTTP 錯誤 {url}: {e}")
-                    return ""
+                    return b""
             except requests.exceptions.RequestException as e:
                 if attempt < max_retries - 1:
                     logging.warning(f"網路請求失敗，重試中... (嘗試 {attempt + 1}/{max_retries}): {e}")
-                    time.sleep(2)
+                    time.sleep(_retry_wait_time(e.response, attempt, 1))
                     continue
                 else:
                     logging.warning(f"網路請求失敗 {url}: {e}")
-                    return ""
+                    return b""
             except Exception as e:
                 logging.warning(f"爬取新聞內容失敗 {url}: {e}")
-                return ""
+                return b""
         
-        return ""
+        return b""
+
+    async def _fetch_news_html_async(self, session, semaphore: asyncio.Semaphore, url: str) -> bytes:
+        """_fetch_news_html 的協程版本（aiohttp），由 semaphore 限制同時連線數"""
+        max_retries = NEWS_SETTINGS.get('max_retries', 3)
+        retry_delay_base = NEWS_SETTINGS.get('retry_delay', 5)
+        use_random_delay = NEWS_SETTINGS.get('use_random_delay', True)
+        random_delay_range = NEWS_SETTINGS.get('random_delay_range', [1, 3])
+        
+        for attempt in range(max_retries):
+            try:
+                # 隨機延遲 (如果啟用)，不佔用連線名額；重試前已做過退避等待，只在首次請求時延遲
+                if use_random_delay and attempt == 0:
+                    await asyncio.sleep(random.uniform(random_delay_range[0], random_delay_range[1]))
+                
+                # aiohttp 需額外安裝 brotli 才能解壓 br，僅宣告 gzip/deflate
+                headers = self._news_request_headers(url)
+                headers['Accept-Encoding'] = 'gzip, deflate'
+                async with semaphore:
+                    async with session.get(url, headers=headers, allow_redirects=True) as response:
+                        if response.status < 400:
+                            max_html_bytes = NEWS_SETTINGS.get('max_html_bytes')
+                            if not max_html_bytes:
+                                return await response.read()
+                            
+                            # 串流讀取，超過 max_html_bytes 即停止
+                            buf = bytearray()
+                            async for chunk in response.content.iter_chunked(65536):
+                                buf += chunk
+                                if len(buf) >= max_html_bytes:
+                                    logging.info(f"新聞頁面超過 {max_html_bytes} 位元組，截斷讀取: {url}")
+                                    break
+                            return bytes(buf[:max_html_bytes])
+                        
+                        if response.status in (403, 401, 429, 500, 502, 503, 504) and attempt < max_retries - 1:
+                            # 被封鎖或伺服器暫時錯誤，依 Retry-After 或隨機指數退避後重試
+                            wait_time = _retry_wait_time(response, attempt, retry_delay_base)
+                            logging.warning(f"收到 {response.status} 錯誤，等待 {wait_time:.1f} 秒後重試... (嘗試 {attempt + 1}/{max_retries})")
+                        else:
+                            logging.warning(f"HTTP 錯誤 {url}: {response.status}")
+                            return b""
+                await asyncio.sleep(wait_time)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt < max_retries - 1:
+                    logging.warning(f"網路請求失敗，重試中... (嘗試 {attempt + 1}/{max_retries}): {e}")
+                    await asyncio.sleep(_retry_wait_time(None, attempt, 1))
+                else:
+                    logging.warning(f"網路請求失敗 {url}: {e}")
+                    return b""
+            except Exception as e:
+                logging.warning(f"爬取新聞內容失敗 {url}: {e}")
+                return b""
+        
+        return b""
+    
+    async def _fetch_news_html_batch(self, urls: List[str]) -> List[bytes]:
+        """以單一 aiohttp 連線池同時下載多篇新聞，回傳順序與輸入一致"""
+        concurrency = max(1, NEWS_SETTINGS.get('scrape_concurrency', 8))
+        semaphore = asyncio.Semaphore(concurrency)
+        connector = aiohttp.TCPConnector(limit=concurrency * 2, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=NEWS_SETTINGS.get('request_timeout', 15))
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            return await asyncio.gather(*(
+                self._fetch_news_html_async(session, semaphore, url) for url in urls
+            ))
 
     def _is_news_relevant(self, title: str, summary: str, ticker: str) -> bool:
         """檢查新聞是否與股票相關且適合短線投資分析"""
@@ -724,15 +2016,8 @@ class EnhancedStockAnalyzer:
         text = f"{title} {summary}".lower()
         
         # 排除不相關的新聞類型
-        exclude_keywords = [
-            'weather', 'sports', 'entertainment', 'celebrity',
-            '天氣', '體育', '娛樂', '明星', '電影', '音樂',
-            'horoscope', '星座', 'recipe', '食譜'
-        ]
-        
-        for keyword in exclude_keywords:
-            if keyword in text:
-                return False
+        if _has_exclude_keyword(text):
+            return False
         
         # 檢查是否包含股票代碼或公司相關詞語
         ticker_lower = ticker.lower()
@@ -740,227 +2025,141 @@ class EnhancedStockAnalyzer:
             return True
         
         # 檢查是否包含財經相關關鍵詞
-        finance_keywords = [
-            'stock', 'shares', 'earnings', 'revenue', 'profit', 'financial',
-            'market', 'trading', 'investment', 'analysis', 'forecast',
-            '股票', '股價', '股份', '營收', '獲利', '財報', '市場', '交易',
-            '投資', '分析', '預測', '財務', '業績'
-        ]
-        
-        for keyword in finance_keywords:
-            if keyword in text:
-                return True
-        
-        return False
+        return bool(_has_finance_keyword(text))
     
     def _extract_article_content(self, soup: BeautifulSoup, url: str) -> str:
         """智能提取文章內容"""
-        content = ""
-        
-        # 根據不同網站域名使用特定選擇器
-        domain_selectors = {
-            'yahoo.com': ['.caas-body', '[data-module="ArticleBody"]', '.article-wrap'],
-            'reuters.com': ['.article-body__content__17Yit', '.PaywallBarrier-body', '.StandardArticleBody_body'],
-            'marketwatch.com': ['.article__body', '.column--primary'],
-            'bloomberg.com': ['.body-copy-v2', '.fence-body'],
-            'cnbc.com': ['.ArticleBody-articleBody', '.InlineContent'],
-            'wsj.com': ['.article-content', '.wsj-article-body'],
-            'fool.com': ['.article-body', '.tailwind-article-body'],
-            'seekingalpha.com': ['.article-content', '[data-module="Body"]']
-        }
-        
-        # 通用選擇器（按優先級排序）
-        generic_selectors = [
-            'article',
-            '.article-body',
-            '.article-content', 
-            '.story-body',
-            '.entry-content',
-            '.post-content',
-            '.content-body',
-            '.main-content',
-            '.article-text',
-            '.body-content',
-            '[data-module="ArticleBody"]',
-            '.caas-body',
-            '.article-wrap'
-        ]
-        
-        # 嘗試域名特定選擇器
-        for domain, selectors in domain_selectors.items():
-            if domain in url.lower():
-                for selector in selectors:
-                    elements = soup.select(selector)
-                    if elements:
-                        content = ' '.join([elem.get_text(strip=True) for elem in elements])
-                        if len(content) > 100:  # 確保內容有意義
-                            return content
-        
-        # 嘗試通用選擇器
-        for selector in generic_selectors:
-            elements = soup.select(selector)
-            if elements:
-                content = ' '.join([elem.get_text(strip=True) for elem in elements])
-                if len(content) > 100:
-                    return content
-        
-        # 最後嘗試：提取所有段落
-        paragraphs = soup.find_all('p')
-        if paragraphs:
-            content = ' '.join([p.get_text(strip=True) for p in paragraphs 
-                              if len(p.get_text(strip=True)) > 30])
-        
-        return content
+        return _extract_article_text(soup, url)
     
     def _clean_content(self, content: str) -> str:
         """清理文章內容"""
-        if not content:
-            return ""
-        
-        # 移除多餘的空白字符
-        content = ' '.join(content.split())
-        
-        # 移除常見的垃圾文字
-        garbage_phrases = [
-            'Subscribe to our newsletter',
-            'Sign up for our newsletter',
-            'Follow us on',
-            'Share this article',
-            'Related articles',
-            'Advertisement',
-            'Sponsored content',
-            'Cookie Policy',
-            'Privacy Policy',
-            'Terms of Service',
-            'Read more:',
-            'Continue reading',
-            'Click here',
-            'Learn more'
-        ]
-        
-        for phrase in garbage_phrases:
-            content = content.replace(phrase, '')
-        
-        # 移除過短的句子（可能是導航或垃圾文字）
-        sentences = content.split('.')
-        meaningful_sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
-        content = '. '.join(meaningful_sentences)
-        
-        return content.strip()
+        return _clean_article_text(content)
     
 
-
-    def analyze_news_sentiment(self, news_list: List[Dict], ticker: str) -> Dict[str, Any]:
-        """分析新聞情緒並生成綜合新聞面報告"""
-        if not news_list or not self.model:
-            return {
-                'sentiment': 'neutral', 
-                'confidence': 0, 
-                'news_intelligence_report': '無新聞數據或AI不可用',
-                'summary': '無新聞數據或AI不可用'
-            }
+    def _format_news_for_prompt(self, news_list: List[Dict]) -> Tuple[List[str], str, str]:
+        """整理前5條新聞為提示詞內容，回傳 (標題清單, 標題概覽文字, 詳細新聞內容)"""
+        # 準備所有新聞內容進行綜合分析
+        all_news_content = ""
+        news_titles = []
         
-        try:
-            # 準備所有新聞內容進行綜合分析
-            all_news_content = ""
-            news_titles = []
-            news_sources = []
-            
-            for i, news in enumerate(news_list[:5], 1):  # 分析前5條新聞
-                news_titles.append(news.get('title', ''))
-                news_sources.append(news.get('publisher', ''))
-                
-                # 建立完整的新聞信息
-                news_info = f"\n=== 新聞 {i} ===\n"
-                news_info += f"標題: {news.get('title', 'N/A')}\n"
-                news_info += f"來源: {news.get('publisher', 'N/A')}\n"
-                news_info += f"時間: {news.get('publish_time', 'N/A')}\n"
-                
-                if news.get('summary'):
-                    news_info += f"摘要: {news['summary']}\n"
-                
-                if news.get('content'):
-                    # 取前1000字符進行分析
-                    content_preview = news['content'][:1000]
-                    news_info += f"內容: {content_preview}\n"
-                
-                all_news_content += news_info
+        for i, news in enumerate(news_list[:5], 1):  # 分析前5條新聞
+            news_titles.append(news.get('title', ''))
             
-            # 生成綜合新聞情報分析
-            # 構建新聞標題列表
-            title_list = "\n".join([f"• {title}" for title in news_titles if title])
+            # 建立完整的新聞信息
+            news_info = f"\n=== 新聞 {i} ===\n"
+            news_info += f"標題: {news.get('title', 'N/A')}\n"
+            news_info += f"來源: {news.get('publisher', 'N/A')}\n"
+            news_info += f"時間: {news.get('publish_time', 'N/A')}\n"
             
-            prompt = f"""
-            請作為專業的短線投資分析師，對股票 {ticker} 的以下【一週內最新新聞】進行深度分析，並生成一份完整的短線投資新聞面情報報告：
+            if news.get('summary'):
+                news_info += f"摘要: {news['summary']}\n"
+            
+            if news.get('content'):
+                # 取前1000字符進行分析
+                content_preview = news['content'][:1000]
+                news_info += f"內容: {content_preview}\n"
+            
+            all_news_content += news_info
+        
+        # 生成綜合新聞情報分析
+        # 構建新聞標題列表
+        title_list = "\n".join([f"• {title}" for title in news_titles if title])
+        
+        return news_titles, title_list, all_news_content
+    
+    def _build_news_sentiment_prompt(self, news_list: List[Dict], ticker: str) -> str:
+        """建立單一股票的新聞情緒分析提示詞"""
+        news_titles, title_list, all_news_content = self._format_news_for_prompt(news_list)
+        
+        prompt = f"""
+        請作為專業的短線投資分析師，對股票 {ticker} 的以下【一週內最新新聞】進行深度分析，並生成一份完整的短線投資新聞面情報報告：
 
-            【本次分析的新聞標題概覽】
-            {title_list}
+        【本次分析的新聞標題概覽】
+        {title_list}
 
-            【詳細新聞內容】
-            {all_news_content}
+        【詳細新聞內容】
+        {all_news_content}
 
-            **重要說明：本分析專注於短線投資機會（1-4週內），請特別關注最新24小時內的新聞對股價的即時影響。**
+        **重要說明：本分析專注於短線投資機會（1-4週內），請特別關注最新24小時內的新聞對股價的即時影響。**
 
-            請提供一份專業的短線投資新聞面分析報告，**請務必在報告開頭顯示完整的新聞標題列表**，然後包含以下內容：
+        請提供一份專業的短線投資新聞面分析報告，**請務必在報告開頭顯示完整的新聞標題列表**，然後包含以下內容：
 
-            1. 【最新新聞標題一覽】
-            - 列出所有分析的新聞標題，特別標注24小時內的最新消息
-            - 快速識別短線投資的關鍵信息
+        1. 【最新新聞標題一覽】
+        - 列出所有分析的新聞標題，特別標注24小時內的最新消息
+        - 快速識別短線投資的關鍵信息
 
-            2. 【短線新聞面總體評估】
-            - 整體市場情緒傾向與強度（針對1-4週內）
-            - 新聞的即時影響力和市場關注度
-            - 消息面對短線交易的影響評估
+        2. 【短線新聞面總體評估】
+        - 整體市場情緒傾向與強度（針對1-4週內）
+        - 新聞的即時影響力和市場關注度
+        - 消息面對短線交易的影響評估
 
-            3. 【關鍵事件與短線機會分析】
-            - 識別最重要的3-5個短線投資相關事件
-            - 分析每個事件對股價的潛在即時影響
-            - 事件的時效性和緊急程度評估
+        3. 【關鍵事件與短線機會分析】
+        - 識別最重要的3-5個短線投資相關事件
+        - 分析每個事件對股價的潛在即時影響
+        - 事件的時效性和緊急程度評估
 
-            4. 【短線市場影響評估】
-            - **短期反應預期（1-7天）** - 重點分析
-            - 中短期影響（1-4週）
-            - 新聞催化劑對股價波動的預期
+        4. 【短線市場影響評估】
+        - **短期反應預期（1-7天）** - 重點分析
+        - 中短期影響（1-4週）
+        - 新聞催化劑對股價波動的預期
 
-            5. 【短線風險與機會識別】
-            - 短線潛在風險因素（1-4週內）
-            - 短線投資機會點和催化劑
-            - 需要密切關注的後續發展和時間點
+        5. 【短線風險與機會識別】
+        - 短線潛在風險因素（1-4週內）
+        - 短線投資機會點和催化劑
+        - 需要密切關注的後續發展和時間點
 
-            6. 【短線投資策略建議】
-            - 基於最新新聞面的短線投資建議
-            - **進場時機建議**（關鍵！）
-            - **出場策略和止損點**
-            - 短線風險控制要點
+        6. 【短線投資策略建議】
+        - 基於最新新聞面的短線投資建議
+        - **進場時機建議**（關鍵！）
+        - **出場策略和止損點**
+        - 短線風險控制要點
 
-            請用繁體中文撰寫，生成一份完整且專業的短線投資報告。同時提供JSON格式的結構化數據：
+        請用繁體中文撰寫，生成一份完整且專業的短線投資報告。同時提供JSON格式的結構化數據：
 
-            {{
-                "sentiment": "positive/negative/neutral",
-                "confidence": 信心度(1-10),
-                "sentiment_strength": 情緒強度(1-10),
-                "news_titles": {news_titles},
-                "key_themes": ["主要議題1", "主要議題2", "主要議題3"],
-                "market_impact": {{
-                    "immediate": "即時影響描述（1-3天）",
-                    "short_term": "短期影響描述（1-2週）",
-                    "medium_term": "中短期影響描述（2-4週）"
-                }},
-                "short_term_catalysts": ["短線催化劑1", "短線催化劑2"],
-                "risk_factors": ["短線風險1", "短線風險2"],
-                "opportunities": ["短線機會1", "短線機會2"],
-                "entry_timing": "進場時機建議",
-                "exit_strategy": "出場策略建議",
-                "investment_strategy": "短線投資策略建議",
-                "news_intelligence_report": "完整的短線投資新聞面情報分析報告（詳細文字版）",
-                "attention_points": ["短線關注要點1", "短線關注要點2"]
-            }}
-            """
+        {{
+            "sentiment": "positive/negative/neutral",
+            "confidence": 信心度(1-10),
+            "sentiment_strength": 情緒強度(1-10),
+            "news_titles": {news_titles},
+            "key_themes": ["主要議題1", "主要議題2", "主要議題3"],
+            "market_impact": {{
+                "immediate": "即時影響描述（1-3天）",
+                "short_term": "短期影響描述（1-2週）",
+                "medium_term": "中短期影響描述（2-4週）"
+            }},
+            "short_term_catalysts": ["短線催化劑1", "短線催化劑2"],
+            "risk_factors": ["短線風險1", "短線風險2"],
+            "opportunities": ["短線機會1", "短線機會2"],
+            "entry_timing": "進場時機建議",
+            "exit_strategy": "出場策略建議",
+            "investment_strategy": "短線投資策略建議",
+            "news_intelligence_report": "完整的短線投資新聞面情報分析報告（詳細文字版）",
+            "attention_points": ["短線關注要點1", "短線關注要點2"]
+        }}
+        """
+        return prompt
+    
+    def analyze_news_sentiment(self, news_list: List[Dict], ticker: str) -> Dict[str, Any]:
+        """分析新聞情緒並生成綜合新聞面報告"""
+        if not news_list or not self.model:
+            return {
+                'sentiment': 'neutral', 
+                'confidence': 0, 
+                'news_intelligence_report': '無新聞數據或AI不可用',
+                'summary': '無新聞數據或AI不可用'
+            }
+        
+        try:
+            prompt = self._build_news_sentiment_prompt(news_list, ticker)
             
-            # 添加延遲以避免配額限制
-            time.sleep(GEMINI_SETTINGS.get('rate_limit_delay', 3))
+            # 相同提示詞直接使用快取結果，不需呼叫 API 也不需等待配額延遲
+            cache_key = PersistentLRUCache.make_key(self.model.model_name, prompt)
+            cached_result = self._sentiment_cache.get(cache_key)
+            if cached_result is not None:
+                logging.info(f"使用快取的 {ticker} 新聞情緒分析結果")
+                return cached_result
             
-            response = self.model.generate_content(prompt)
+            response = self._generate_content(prompt)
             
             # 報告成功使用 API
             if report_gemini_success:
@@ -969,7 +2168,8 @@ class EnhancedStockAnalyzer:
             if response and response.text:
                 # 解析JSON回應
                 try:
-                    result = json.loads(response.text.strip())
+                    result = _loads_llm_json(response.text)
+                    self._sentiment_cache.set(cache_key, result)
                     return result
                 except json.JSONDecodeError:
                     # 如果無法解析JSON，返回文字分析
@@ -998,13 +2198,16 @@ class EnhancedStockAnalyzer:
                 self._setup_gemini()
                 logging.info("已切換到新的 API Key，重新嘗試新聞情緒分析")
                 if self.model:
-                    response = self.model.generate_content(prompt)
+                    response = self._generate_content(prompt)
                     if report_gemini_success:
                         report_gemini_success()
                     
                     if response and response.text:
                         try:
-                            result = json.loads(response.text.strip())
+                            result = _loads_llm_json(response.text)
+                            self._sentiment_cache.set(
+                                PersistentLRUCache.make_key(self.model.model_name, prompt), result
+                            )
                             return result
                         except json.JSONDecodeError:
                             return {
@@ -1024,42 +2227,126 @@ class EnhancedStockAnalyzer:
                 'summary': f'分析失敗: {str(e)}'
             }
 
+    def analyze_news_sentiment_batch(self, batches: List[Tuple[List[Dict], str]]) -> Dict[str, Dict]:
+        """將多檔股票的新聞合併為單一提示詞進行情緒分析，以分攤 API 配額延遲
+        
+        回傳 {股票代碼: 新聞情緒結果}；批次回應無法解析的股票會退回單檔分析。
+        """
+        results = {}
+        pending = []  # (新聞, 股票代碼, 單檔提示詞快取鍵)
+        
+        for news_list, ticker in batches:
+            if not news_list or not self.model:
+                results[ticker] = self.analyze_news_sentiment(news_list, ticker)
+                continue
+            
+            cache_key = PersistentLRUCache.make_key(
+                self.model.model_name, self._build_news_sentiment_prompt(news_list, ticker)
+            )
+            cached_result = self._sentiment_cache.get(cache_key)
+            if cached_result is not None:
+                logging.info(f"使用快取的 {ticker} 新聞情緒分析結果")
+                results[ticker] = cached_result
+            else:
+                pending.append((news_list, ticker, cache_key))
+        
+        if len(pending) == 1:
+            news_list, ticker, _ = pending[0]
+            results[ticker] = self.analyze_news_sentiment(news_list, ticker)
+            return results
+        
+        if pending:
+            ticker_sections = []
+            for news_list, ticker, _ in pending:
+                _, title_list, all_news_content = self._format_news_for_prompt(news_list)
+                ticker_sections.append(
+                    f"\n=== TICKER {ticker} ===\n【新聞標題概覽】\n{title_list}\n【詳細新聞內容】{all_news_content}"
+                )
+            ticker_symbols = ", ".join(ticker for _, ticker, _ in pending)
+            
+            prompt = f"""
+            請作為專業的短線投資分析師，分別對以下 {len(pending)} 檔股票（{ticker_symbols}）的【一週內最新新聞】進行深度分析。
+            每檔股票的新聞以「=== TICKER 股票代碼 ===」分隔：
+            {"".join(ticker_sections)}
+
+            **重要說明：本分析專注於短線投資機會（1-4週內），請特別關注最新24小時內的新聞對股價的即時影響。各股票請獨立分析，不要混用其他股票的新聞。**
+
+            每檔股票的 news_intelligence_report 請用繁體中文撰寫完整報告，依序包含：
+            1. 【最新新聞標題一覽】 2. 【短線新聞面總體評估】 3. 【關鍵事件與短線機會分析】
+            4. 【短線市場影響評估】 5. 【短線風險與機會識別】 6. 【短線投資策略建議】（含進場時機、出場策略和止損點）
+
+            請只回傳一個 JSON 物件，以股票代碼為鍵，每個值的格式如下：
+
+            {{
+                "股票代碼": {{
+                    "sentiment": "positive/negative/neutral",
+                    "confidence": 信心度(1-10),
+                    "sentiment_strength": 情緒強度(1-10),
+                    "news_titles": ["新聞標題1", "新聞標題2"],
+                    "key_themes": ["主要議題1", "主要議題2", "主要議題3"],
+                    "market_impact": {{
+                        "immediate": "即時影響描述（1-3天）",
+                        "short_term": "短期影響描述（1-2週）",
+                        "medium_term": "中短期影響描述（2-4週）"
+                    }},
+                    "short_term_catalysts": ["短線催化劑1", "短線催化劑2"],
+                    "risk_factors": ["短線風險1", "短線風險2"],
+                    "opportunities": ["短線機會1", "短線機會2"],
+                    "entry_timing": "進場時機建議",
+                    "exit_strategy": "出場策略建議",
+                    "investment_strategy": "短線投資策略建議",
+                    "news_intelligence_report": "完整的短線投資新聞面情報分析報告（詳細文字版）",
+                    "attention_points": ["短線關注要點1", "短線關注要點2"]
+                }}
+            }}
+            """
+            
+            batch_result = {}
+            try:
+                response = self._generate_content(prompt)
+                if report_gemini_success:
+                    report_gemini_success()
+                
+                if response and response.text:
+                    parsed = _loads_llm_json(response.text)
+                    if isinstance(parsed, dict):
+                        batch_result = parsed
+            except json.JSONDecodeError:
+                logging.warning(f"批次新聞情緒分析回應格式解析失敗（{ticker_symbols}），改為逐檔分析")
+            except Exception as e:
+                logging.error(f"批次新聞情緒分析失敗（{ticker_symbols}）: {e}")
+                if report_gemini_error:
+                    report_gemini_error(f"批次新聞情緒分析失敗: {e}")
+            
+            for news_list, ticker, cache_key in pending:
+                result = batch_result.get(ticker)
+                if isinstance(result, dict):
+                    self._sentiment_cache.set(cache_key, result)
+                    results[ticker] = result
+                else:
+                    results[ticker] = self.analyze_news_sentiment(news_list, ticker)
+        
+        return results
+    
     def get_market_sentiment(self, ticker: str) -> Dict[str, Any]:
         """分析市場情緒指標"""
         try:
-            stock = yf.Ticker(ticker)
-            
             # 獲取歷史數據和技術指標
-            hist = stock.history(period="3mo")  # 3個月數據
-            info = stock.info
+            hist = self._get_ticker_history(ticker, period="3mo")  # 3個月數據
+            info = self._get_ticker_info(ticker)
             
             if hist.empty:
                 return {'error': '無法獲取歷史數據'}
             
-            # 計算技術指標
-            current_price = hist['Close'].iloc[-1]
-            sma_20 = hist['Close'].rolling(window=20).mean().iloc[-1]
-            sma_50 = hist['Close'].rolling(window=50).mean().iloc[-1] if len(hist) >= 50 else None
+            # 計算技術指標（一次取出 numpy 陣列，單趟迴圈算完所有指標）
+            close = np.ascontiguousarray(hist['Close'].to_numpy(dtype=np.float64))
+            volume = np.ascontiguousarray(hist['Volume'].to_numpy(dtype=np.float64))
+            (sma_20, sma_50, rsi, volatility, price_change_1d, price_change_5d,
+             price_change_20d, volume_ratio) = _compute_indicators(close, volume)
             
-            # 成交量分析
-            avg_volume = hist['Volume'].mean()
-            recent_volume = hist['Volume'].iloc[-5:].mean()  # 最近5天平均成交量
-            volume_ratio = recent_volume / avg_volume if avg_volume > 0 else 1
-            
-            # 價格動能
-            price_change_1d = ((current_price - hist['Close'].iloc[-2]) / hist['Close'].iloc[-2]) * 100 if len(hist) >= 2 else 0
-            price_change_5d = ((current_price - hist['Close'].iloc[-6]) / hist['Close'].iloc[-6]) * 100 if len(hist) >= 6 else 0
-            price_change_20d = ((current_price - hist['Close'].iloc[-21]) / hist['Close'].iloc[-21]) * 100 if len(hist) >= 21 else 0
-            
-            # 波動率
-            volatility = hist['Close'].pct_change().std() * (252**0.5) * 100  # 年化波動率
-            
-            # RSI 簡化計算
-            delta = hist['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs)).iloc[-1] if not rs.empty else 50
+            current_price = float(close[-1])
+            if len(close) < 50:
+                sma_50 = None
             
             sentiment_data = {
                 'current_price': current_price,
@@ -1083,6 +2370,41 @@ class EnhancedStockAnalyzer:
             logging.error(f"獲取 {ticker} 市場情緒數據失敗: {e}")
             return {'error': str(e)}
 
+    def _store_analysis_record(self, ticker: str, record: Dict) -> None:
+        """將單一股票的完整分析結果寫入磁碟，只在記憶體保留檔案路徑"""
+        try:
+            reports_dir = os.path.join(OUTPUT_SETTINGS.get('output_directory', 'data/output'), 'reports')
+            os.makedirs(reports_dir, exist_ok=True)
+            safe_name = re.sub(r'[^\w.-]', '_', ticker)
+            filepath = os.path.join(reports_dir, f"{safe_name}.json")
+            _atomic_write(filepath, _dumps_json(record))
+            self._report_paths[ticker] = filepath
+        except Exception as e:
+            logging.warning(f"保存 {ticker} 完整分析結果失敗: {e}")
+    
+    def get_analysis_result(self, ticker: str) -> Optional[Dict]:
+        """讀取單一股票的完整分析結果（從磁碟延遲載入）"""
+        filepath = self._report_paths.get(ticker)
+        if not filepath:
+            return None
+        try:
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            return orjson.loads(data) if orjson is not None else json.loads(data)
+        except Exception as e:
+            logging.warning(f"讀取 {ticker} 完整分析結果失敗: {e}")
+            return None
+    
+    @property
+    def analysis_results(self) -> Dict[str, Dict]:
+        """所有已分析股票的完整結果（每次存取都會從磁碟載入）"""
+        return {ticker: self.get_analysis_result(ticker) for ticker in self._report_paths}
+    
+    @property
+    def stock_scores(self) -> Dict[str, StockScore]:
+        """所有已分析股票的評分"""
+        return dict(self._scores)
+    
     def analyze_stock_comprehensive(self, stock_data: Dict) -> Dict[str, Any]:
         """執行股票的綜合分析"""
         try:
@@ -1095,44 +2417,59 @@ class EnhancedStockAnalyzer:
             
             logging.info(f"開始綜合分析 {ticker}...")
             
+            # 批量分析時可能已預先取得新聞與新聞情緒
+            prefetched = self._prefetched_news.pop(ticker, None)
+            
             # 1. 獲取新聞數據
-            news_data = self.get_stock_news(ticker)
+            news_data = prefetched[0] if prefetched else self.get_stock_news(ticker)
             
             # 2. 獲取市場情緒數據
             sentiment_data = self.get_market_sentiment(ticker)
             
             # 3. 分析新聞情緒
-            news_sentiment = self.analyze_news_sentiment(news_data, ticker)
+            news_sentiment = prefetched[1] if prefetched else self.analyze_news_sentiment(news_data, ticker)
             
             # 4. 生成綜合報告
             comprehensive_report = self.generate_comprehensive_report(
                 stock_data, news_data, sentiment_data, news_sentiment
             )
             
-            # 5. 保存分析結果
-            self.analysis_results[ticker] = {
+            # 5. 保存分析結果（記憶體只保留評分，完整結果寫入磁碟）
+            analysis_timestamp = datetime.now().isoformat()
+            self._scores[ticker] = StockScore(
+                overall=comprehensive_report.get('overall_score', 0),
+                fundamental=comprehensive_report.get('fundamental_analysis', {}).get('score', 0),
+                technical=comprehensive_report.get('technical_analysis', {}).get('score', 0),
+                news=comprehensive_report.get('news_sentiment_analysis', {}).get('score', 0),
+                timestamp=analysis_timestamp
+            )
+            self._store_analysis_record(ticker, {
                 'stock_data': stock_data,
                 'news_data': news_data,
                 'sentiment_data': sentiment_data,
                 'news_sentiment': news_sentiment,
                 'comprehensive_report': comprehensive_report,
-                'analysis_timestamp': datetime.now().isoformat()
-            }
+                'analysis_timestamp': analysis_timestamp
+            })
             
             logging.info(f"完成 {ticker} 的綜合分析")
             
             # 將新聞數據添加到報告中
             comprehensive_report['news_data'] = news_data
             
-            # 自動儲存分析報告為MD檔
+            # 自動儲存分析報告為MD檔（背景寫入失敗時移除報告路徑，不留下指向不存在檔案的路徑）
             try:
-                md_filepath = self.save_analysis_report_as_markdown(
-                    comprehensive_report, 
-                    f"stock_analysis_{ticker}"
-                )
-                if md_filepath:
-                    comprehensive_report['markdown_report_path'] = md_filepath
-                    logging.info(f"已為 {ticker} 生成MD分析報告: {md_filepath}")
+                def drop_report_path(error: Exception, report: Dict = comprehensive_report) -> None:
+                    report.pop('markdown_report_path', None)
+                
+                md_filepath = self._markdown_report_path(f"stock_analysis_{ticker}")
+                comprehensive_report['markdown_report_path'] = md_filepath
+                try:
+                    self._queue_markdown_report(comprehensive_report, md_filepath, on_error=drop_report_path)
+                except Exception:
+                    comprehensive_report.pop('markdown_report_path', None)
+                    raise
+                logging.info(f"已為 {ticker} 生成MD分析報告: {md_filepath}")
             except Exception as md_error:
                 logging.warning(f"無法為 {ticker} 生成MD報告: {md_error}")
             
@@ -1251,54 +2588,18 @@ class EnhancedStockAnalyzer:
             logging.error(f"生成綜合報告失敗: {e}")
             return {'error': str(e), 'ticker': stock_data.get('symbol', 'Unknown')}
 
-    def _calculate_fundamental_score(self, stock_data: Dict) -> float:
-        """計算基本面評分 (0-100)"""
-        score = 50  # 基準分數
+    def _calculate_fundamental_score(self, stock_data):
+        """計算基本面評分 (0-100)；傳入 DataFrame 時回傳每列股票的評分陣列"""
+        if isinstance(stock_data, pd.DataFrame):
+            return _fundamental_scores_vectorized(stock_data)
         
-        # P/E評分
-        pe = stock_data.get('trailing_pe')
-        if pe and 0 < pe < 15:
-            score += 15
-        elif pe and 15 <= pe < 25:
-            score += 10
-        elif pe and pe >= 30:
-            score -= 10
-        
-        # P/B評分
-        pb = stock_data.get('price_to_book')
-        if pb and 0 < pb < 1.5:
-            score += 15
-        elif pb and 1.5 <= pb < 3:
-            score += 10
-        elif pb and pb >= 5:
-            score -= 10
-        
-        # ROE評分
-        roe = stock_data.get('return_on_equity')
-        if roe and roe > 0.15:
-            score += 10
-        elif roe and roe > 0.10:
-            score += 5
-        elif roe and roe < 0.05:
-            score -= 10
-        
-        # 債務比評分
-        debt_ratio = stock_data.get('debt_to_equity')
-        if debt_ratio and debt_ratio < 0.3:
-            score += 10
-        elif debt_ratio and debt_ratio < 0.6:
-            score += 5
-        elif debt_ratio and debt_ratio > 1.5:
-            score -= 15
+        score = 50  # 基準分數
         
-        # 毛利率評分
-        profit_margin = stock_data.get('profit_margins')
-        if profit_margin and profit_margin > 0.20:
-            score += 10
-        elif profit_margin and profit_margin > 0.10:
-            score += 5
-        elif profit_margin and profit_margin < 0.05:
-            score -= 10
+        # 依序套用 P/E、P/B、ROE、債務比、毛利率評分（缺值或 0 不加減分）
+        for key, edges, deltas, _ in _FUNDAMENTAL_RULES:
+            value = stock_data.get(key)
+            if value and value == value:
+                score += deltas[bisect_right(edges, value)]
         
         return max(0, min(100, score))
 
@@ -1467,6 +2768,21 @@ class EnhancedStockAnalyzer:
         else:
             return "低風險"
 
+    def _prefetch_news_sentiment(self, stock_list: List[Dict], batch_size: int) -> None:
+        """批量分析前並行抓取新聞，並每 batch_size 檔股票合併一次新聞情緒分析"""
+        news_lists = self.get_stock_news_many(stock_list)
+        
+        batches = [
+            (news_list, stock_data.get('symbol') or stock_data.get('ticker'))
+            for stock_data, news_list in zip(stock_list, news_lists)
+            if stock_data.get('symbol') or stock_data.get('ticker')
+        ]
+        for start in range(0, len(batches), batch_size):
+            chunk = batches[start:start + batch_size]
+            sentiments = self.analyze_news_sentiment_batch(chunk)
+            for news_list, ticker in chunk:
+                self._prefetched_news[ticker] = (news_list, sentiments[ticker])
+    
     def batch_analyze_stocks(self, stock_list: List[Dict], max_analysis: int = 10, include_debate: bool = None) -> Dict[str, Any]:
         """批量分析股票"""
         results = {}
@@ -1476,39 +2792,81 @@ class EnhancedStockAnalyzer:
         if include_debate is None:
             include_debate = getattr(self, 'enable_debate', False)
         
-        for i, stock_data in enumerate(stock_list[:max_analysis]):
+        targets = stock_list[:max_analysis]
+        total = len(targets)
+        
+        # 以執行緒池並行分析（主要耗時為網路 I/O），並以固定間隔錯開啟動時間以避免API限制
+        delay_time = 5 if include_debate else 3  # 多代理人分析需要更長延遲
+        max_workers = max(1, min(ANALYSIS_SETTINGS.get('max_concurrent_analysis', 3), total))
+        start_lock = threading.Lock()
+        next_start = [time.monotonic()]
+        
+        def analyze_one(i: int, stock_data: Dict) -> Dict:
             ticker = stock_data.get('symbol', f'Unknown_{i}')
             
+            # 等待啟動時段：相鄰兩檔股票的開始時間至少間隔 delay_time 秒
+            with start_lock:
+                wait_time = next_start[0] - time.monotonic()
+                next_start[0] = max(next_start[0], time.monotonic()) + delay_time
+            if wait_time > 0:
+                time.sleep(wait_time)
+            
+            if include_debate:
+                logging.info(f"多代理人辯論分析 {ticker} ({i+1}/{total})")
+            else:
+                logging.info(f"分析 {ticker} ({i+1}/{total})")
+            
+            # 調用綜合分析方法，傳遞 include_debate 參數
+            if hasattr(self, 'analyze_stock_comprehensive'):
+                # 如果是 EnhancedStockAnalyzerWithDebate 類別，使用新的方法簽名
+                if hasattr(self, 'conduct_multi_agent_debate'):
+                    return self.analyze_stock_comprehensive(stock_data, include_debate=include_debate)
+                # 如果是原始的 EnhancedStockAnalyzer，使用原有的方法簽名
+                return self.analyze_stock_comprehensive(stock_data)
+            return {'error': 'analyze_stock_comprehensive 方法不存在', 'ticker': ticker}
+        
+        # 預先並行抓取所有股票的 Yahoo Finance 基本資訊與新聞列表
+        if total > 1 and ANALYSIS_SETTINGS.get('prefetch_yahoo_data', True):
             try:
-                if include_debate:
-                    logging.info(f"多代理人辯論分析 {ticker} ({i+1}/{min(len(stock_list), max_analysis)})")
-                else:
-                    logging.info(f"分析 {ticker} ({i+1}/{min(len(stock_list), max_analysis)})")
-                
-                # 調用綜合分析方法，傳遞 include_debate 參數
-                if hasattr(self, 'analyze_stock_comprehensive'):
-                    # 如果是 EnhancedStockAnalyzerWithDebate 類別，使用新的方法簽名
-                    if hasattr(self, 'conduct_multi_agent_debate'):
-                        result = self.analyze_stock_comprehensive(stock_data, include_debate=include_debate)
-                    else:
-                        # 如果是原始的 EnhancedStockAnalyzer，使用原有的方法簽名
-                        result = self.analyze_stock_comprehensive(stock_data)
-                else:
-                    result = {'error': 'analyze_stock_comprehensive 方法不存在', 'ticker': ticker}
-                
-                results[ticker] = result
-                
-                if 'error' not in result:
-                    successful_analyses += 1
-                
-                # 添加延遲以避免API限制
-                if i < len(stock_list) - 1:  # 不是最後一個
-                    delay_time = 5 if include_debate else 3  # 多代理人分析需要更長延遲
-                    time.sleep(delay_time)
-                    
+                self.prefetch_yahoo_data(
+                    [stock_data.get('symbol') or stock_data.get('ticker') for stock_data in targets],
+                    ANALYSIS_SETTINGS.get('prefetch_workers', 8)
+                )
+            except Exception as e:
+                logging.warning(f"預取 Yahoo Finance 資料失敗，改為逐檔下載: {e}")
+        
+        # 預先抓取新聞並合併多檔股票的新聞情緒分析，減少 Gemini 呼叫與配額延遲
+        sentiment_batch_size = GEMINI_SETTINGS.get('sentiment_batch_size', 5)
+        if sentiment_batch_size > 1 and total > 1 and self.model:
+            try:
+                self._prefetch_news_sentiment(targets, sentiment_batch_size)
             except Exception as e:
-                logging.error(f"分析 {ticker} 時發生錯誤: {e}")
-                results[ticker] = {'error': str(e), 'ticker': ticker}
+                logging.warning(f"批次新聞情緒分析失敗，改為逐檔分析: {e}")
+        
+        ordered_results = [None] * total
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_index = {
+                executor.submit(analyze_one, i, stock_data): i
+                for i, stock_data in enumerate(targets)
+            }
+            for future in as_completed(future_to_index):
+                i = future_to_index[future]
+                ticker = targets[i].get('symbol', f'Unknown_{i}')
+                try:
+                    ordered_results[i] = future.result()
+                except Exception as e:
+                    logging.error(f"分析 {ticker} 時發生錯誤: {e}")
+                    ordered_results[i] = {'error': str(e), 'ticker': ticker}
+        
+        # 清除未被使用的預取資料
+        for stock_data in targets:
+            self._prefetched_news.pop(stock_data.get('symbol') or stock_data.get('ticker'), None)
+        
+        # 依原始順序整理結果
+        for i, result in enumerate(ordered_results):
+            results[targets[i].get('symbol', f'Unknown_{i}')] = result
+            if 'error' not in result:
+                successful_analyses += 1
         
         # 生成批量分析摘要
         summary = {
@@ -1523,13 +2881,35 @@ class EnhancedStockAnalyzer:
         
         return summary
     
+    def _enqueue_write(self, filepath: str, data: bytes, on_error=None) -> Future:
+        """排入背景寫檔並回傳 Future（寫入失敗時帶有例外，on_error 於失敗時先被呼叫）；
+        停用背景寫檔時直接同步寫入，失敗直接拋出例外
+        """
+        future = Future()
+        if not OUTPUT_SETTINGS.get('background_writes', True):
+            _atomic_write(filepath, data)
+            future.set_result(filepath)
+            return future
+        with self._pending_writes_lock:
+            self._pending_writes.append(future)
+        _get_writer_queue().put((filepath, data, future, on_error))
+        return future
+    
+    def flush(self):
+        """等待本實例排隊中的檔案寫入完成；有寫入失敗時於全部完成後拋出第一個例外"""
+        with self._pending_writes_lock:
+            pending, self._pending_writes = self._pending_writes, []
+        first_error = None
+        for future in pending:
+            error = future.exception()
+            if error is not None and first_error is None:
+                first_error = error
+        if first_error is not None:
+            raise first_error
+    
     def save_analysis_results(self, results: Dict, filename_prefix: str = "analysis"):
         """保存分析結果到文件"""
         try:
-            import os
-            import json
-            from src.utils import DateTimeEncoder
-            
             output_dir = "data/output"
             os.makedirs(output_dir, exist_ok=True)
             
@@ -1537,47 +2917,70 @@ class EnhancedStockAnalyzer:
             filename = f"{filename_prefix}_{timestamp}.json"
             filepath = os.path.join(output_dir, filename)
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
+            # 使用 orjson 一次序列化後交由背景執行緒寫入
+            self._enqueue_write(filepath, _dumps_json(results, indent=True))
             
-            logging.info(f"分析結果已保存到: {filepath}")
+            logging.info("分析結果已保存到: %s", filepath)
             return filepath
             
         except Exception as e:
-            logging.error(f"保存分析結果失敗: {e}")
+            logging.error("保存分析結果失敗: %s", e)
             return None
     
+    @staticmethod
+    def _markdown_report_path(filename_prefix: str) -> str:
+        """建立輸出目錄並回傳帶時間戳記的Markdown報告路徑"""
+        output_dir = "data/output"
+        os.makedirs(output_dir, exist_ok=True)
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"{filename_prefix}_{timestamp}.md"
+        return os.path.join(output_dir, filename)
+    
+    def _queue_markdown_report(self, analysis_result: Dict, filepath: str, on_error=None) -> Future:
+        """生成Markdown報告並排入背景寫檔，回傳寫檔 Future"""
+        # 生成Markdown內容
+        markdown_content = self._generate_markdown_report(analysis_result)
+        
+        # 一次編碼後交由背景執行緒寫入
+        return self._enqueue_write(filepath, markdown_content.encode('utf-8'), on_error)
+    
     def save_analysis_report_as_markdown(self, analysis_result: Dict, filename_prefix: str = "ai_analysis_report") -> str:
-        """將AI分析報告儲存為Markdown檔案"""
+        """將AI分析報告儲存為Markdown檔案（背景寫入，失敗時由 flush() 拋出）"""
         try:
-            import os
-            
-            output_dir = "data/output"
-            os.makedirs(output_dir, exist_ok=True)
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{filename_prefix}_{timestamp}.md"
-            filepath = os.path.join(output_dir, filename)
+            filepath = self._markdown_report_path(filename_prefix)
+            self._queue_markdown_report(analysis_result, filepath)
             
-            # 生成Markdown內容
-            markdown_content = self._generate_markdown_report(analysis_result)
-            
-            # 寫入檔案
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-            
-            logging.info(f"AI分析報告已保存為MD檔: {filepath}")
+            logging.info("AI分析報告已保存為MD檔: %s", filepath)
             return filepath
             
         except Exception as e:
-            logging.error(f"保存MD報告失敗: {e}")
+            logging.error("保存MD報告失敗: %s", e)
             return None
-    
+
+    def save_all_reports(self, results: List[Dict], filename_prefix: str = "stock_analysis") -> List[Optional[str]]:
+        """並行儲存多支股票的Markdown報告，回傳順序與輸入一致的檔案路徑列表"""
+        if not results:
+            return []
+
+        # 各股票以代碼區分檔名，避免同秒產生的報告互相覆蓋
+        prefixes = [
+            f"{filename_prefix}_{result.get('ticker', index)}" if isinstance(result, dict) else f"{filename_prefix}_{index}"
+            for index, result in enumerate(results)
+        ]
+        max_workers = min(32, (os.cpu_count() or 1) * 4, len(results))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.save_analysis_report_as_markdown, results, prefixes))
+
     def _generate_markdown_report(self, analysis_result: Dict) -> str:
         """生成Markdown格式的分析報告"""
         if not analysis_result or 'error' in analysis_result:
             return f"# 分析報告錯誤\n\n錯誤訊息: {analysis_result.get('error', '未知錯誤')}"
         
+        return _render_lines(self._iter_markdown_report_lines(analysis_result))
+    
+    def _iter_markdown_report_lines(self, analysis_result: Dict):
+        """逐行產生單一股票分析報告的Markdown內容"""
         # 基本資訊
         ticker = analysis_result.get('ticker', 'N/A')
         company_name = analysis_result.get('company_name', 'N/A')
@@ -1585,224 +2988,150 @@ class EnhancedStockAnalyzer:
         overall_score = analysis_result.get('overall_score', 0)
         investment_recommendation = analysis_result.get('investment_recommendation', 'N/A')
         
-        # 開始生成Markdown內容
-        md_content = []
-        
         # 標題和基本資訊
-        md_content.append(f"# 🤖 AI股票分析報告")
-        md_content.append("")
-        md_content.append(f"**股票代碼:** {ticker}")
-        md_content.append(f"**公司名稱:** {company_name}")
-        md_content.append(f"**分析時間:** {analysis_date}")
-        md_content.append(f"**綜合評分:** {overall_score}/100")
-        md_content.append(f"**投資建議:** {investment_recommendation}")
-        md_content.append("")
-        md_content.append("---")
-        md_content.append("")
+        yield _REPORT_HEADER_TPL.format(
+            ticker=ticker, company_name=company_name, analysis_date=analysis_date,
+            overall_score=overall_score, investment_recommendation=investment_recommendation
+        )
         
         # 關鍵指標摘要
-        if 'key_metrics' in analysis_result:
-            md_content.append("## 📊 關鍵指標摘要")
-            md_content.append("")
-            
-            metrics = analysis_result['key_metrics']
+        metrics = analysis_result.get('key_metrics')
+        if metrics:
+            yield "## 📊 關鍵指標摘要"
+            yield ""
             
             # 表格格式顯示關鍵指標
-            md_content.append("| 指標 | 數值 |")
-            md_content.append("|------|------|")
-            
-            if metrics.get('current_price'):
-                md_content.append(f"| 當前股價 | ${metrics['current_price']:.2f} |")
-            
-            if metrics.get('market_cap'):
-                market_cap_b = metrics['market_cap'] / 1e9
-                md_content.append(f"| 市值 | ${market_cap_b:.1f}B |")
-            
-            if metrics.get('pe_ratio'):
-                md_content.append(f"| 本益比 (P/E) | {metrics['pe_ratio']:.2f} |")
-            
-            if metrics.get('pb_ratio'):
-                md_content.append(f"| 股價淨值比 (P/B) | {metrics['pb_ratio']:.2f} |")
-            
-            if metrics.get('rsi'):
-                md_content.append(f"| RSI | {metrics['rsi']:.1f} |")
-            
-            if metrics.get('52w_position'):
-                md_content.append(f"| 52週高點位置 | {metrics['52w_position']:.1%} |")
-            
-            md_content.append("")
+            yield "| 指標 | 數值 |"
+            yield "|------|------|"
+            yield from _iter_metric_rows(metrics, _KEY_METRIC_ROWS)
+            yield ""
         
         # 基本面分析
-        if 'fundamental_analysis' in analysis_result:
-            md_content.append("## 📈 基本面分析")
-            md_content.append("")
+        fundamental = analysis_result.get('fundamental_analysis')
+        if fundamental is not None:
+            yield "## 📈 基本面分析"
+            yield ""
             
-            fundamental = analysis_result['fundamental_analysis']
-            md_content.append(f"**評分:** {fundamental.get('score', 0)}/100")
-            md_content.append("")
+            yield f"**評分:** {fundamental.get('score', 0)}/100"
+            yield ""
             
             # 基本面指標表格
-            md_content.append("| 財務指標 | 數值 |")
-            md_content.append("|----------|------|")
-            
-            if fundamental.get('pe_ratio'):
-                md_content.append(f"| 本益比 | {fundamental['pe_ratio']:.2f} |")
-            
-            if fundamental.get('pb_ratio'):
-                md_content.append(f"| 股價淨值比 | {fundamental['pb_ratio']:.2f} |")
-            
-            if fundamental.get('debt_ratio'):
-                md_content.append(f"| 負債比率 | {fundamental['debt_ratio']:.2f} |")
-            
-            if fundamental.get('roe'):
-                md_content.append(f"| 股東權益報酬率 (ROE) | {fundamental['roe']:.2%} |")
-            
-            if fundamental.get('profit_margin'):
-                md_content.append(f"| 利潤率 | {fundamental['profit_margin']:.2%} |")
-            
-            md_content.append("")
+            yield "| 財務指標 | 數值 |"
+            yield "|----------|------|"
+            yield from _iter_metric_rows(fundamental, _FUNDAMENTAL_METRIC_ROWS)
+            yield ""
         
         # 技術面分析
-        if 'technical_analysis' in analysis_result:
-            md_content.append("## 📊 技術面分析")
-            md_content.append("")
-            
-            technical = analysis_result['technical_analysis']
-            md_content.append(f"**評分:** {technical.get('score', 0)}/100")
-            md_content.append("")
-            
-            md_content.append("| 技術指標 | 狀態 |")
-            md_content.append("|----------|------|")
-            
-            if technical.get('trend'):
-                md_content.append(f"| 趨勢方向 | {technical['trend']} |")
-            
-            if technical.get('rsi'):
-                rsi_status = "超買" if technical['rsi'] > 70 else "超賣" if technical['rsi'] < 30 else "正常"
-                md_content.append(f"| RSI ({technical['rsi']:.1f}) | {rsi_status} |")
-            
-            if technical.get('volume_signal'):
-                md_content.append(f"| 成交量訊號 | {technical['volume_signal']} |")
-            
-            if technical.get('price_momentum'):
-                md_content.append(f"| 價格動能 (20日) | {technical['price_momentum']:.2%} |")
+        technical = analysis_result.get('technical_analysis')
+        if technical is not None:
+            yield "## 📊 技術面分析"
+            yield ""
             
-            if technical.get('volatility'):
-                md_content.append(f"| 波動度 | {technical['volatility']:.2%} |")
+            yield f"**評分:** {technical.get('score', 0)}/100"
+            yield ""
             
-            md_content.append("")
+            yield "| 技術指標 | 狀態 |"
+            yield "|----------|------|"
+            yield from _iter_metric_rows(technical, _TECHNICAL_METRIC_ROWS)
+            yield ""
         
         # 新聞情緒分析
-        if 'news_sentiment_analysis' in analysis_result:
-            md_content.append("## 📰 新聞情緒分析")
-            md_content.append("")
-            
-            news = analysis_result['news_sentiment_analysis']
-            md_content.append(f"**評分:** {news.get('score', 0)}/100")
-            md_content.append(f"**情緒傾向:** {news.get('sentiment', 'neutral')}")
-            md_content.append(f"**信心度:** {news.get('confidence', 0):.1%}")
-            md_content.append(f"**情緒強度:** {news.get('sentiment_strength', 0):.1f}")
-            md_content.append(f"**新聞數量:** {news.get('news_count', 0)} 則")
-            md_content.append("")
+        news = analysis_result.get('news_sentiment_analysis')
+        if news is not None:
+            yield "## 📰 新聞情緒分析"
+            yield ""
+            
+            yield f"**評分:** {news.get('score', 0)}/100"
+            yield f"**情緒傾向:** {news.get('sentiment', 'neutral')}"
+            yield f"**信心度:** {news.get('confidence', 0):.1%}"
+            yield f"**情緒強度:** {news.get('sentiment_strength', 0):.1f}"
+            yield f"**新聞數量:** {news.get('news_count', 0)} 則"
+            yield ""
             
             # 關鍵主題
             if news.get('key_themes'):
-                md_content.append("### 🔍 關鍵主題")
+                yield "### 🔍 關鍵主題"
                 for theme in news['key_themes']:
-                    md_content.append(f"- {theme}")
-                md_content.append("")
+                    yield f"- {theme}"
+                yield ""
             
             # 風險因素
             if news.get('risk_factors'):
-                md_content.append("### ⚠️ 風險因素")
+                yield "### ⚠️ 風險因素"
                 for risk in news['risk_factors']:
-                    md_content.append(f"- {risk}")
-                md_content.append("")
+                    yield f"- {risk}"
+                yield ""
             
             # 投資機會
             if news.get('opportunities'):
-                md_content.append("### 💡 投資機會")
+                yield "### 💡 投資機會"
                 for opportunity in news['opportunities']:
-                    md_content.append(f"- {opportunity}")
-                md_content.append("")
+                    yield f"- {opportunity}"
+                yield ""
             
             # 投資策略建議
             if news.get('investment_strategy'):
-                md_content.append("### 🎯 投資策略建議")
-                md_content.append(news['investment_strategy'])
-                md_content.append("")
+                yield "### 🎯 投資策略建議"
+                yield news['investment_strategy']
+                yield ""
             
             # 注意事項
             if news.get('attention_points'):
-                md_content.append("### 📌 注意事項")
+                yield "### 📌 注意事項"
                 for point in news['attention_points']:
-                    md_content.append(f"- {point}")
-                md_content.append("")
+                    yield f"- {point}"
+                yield ""
             
             # 新聞標題
             if news.get('news_titles'):
-                md_content.append("### 📑 相關新聞標題")
+                yield "### 📑 相關新聞標題"
                 for i, title in enumerate(news['news_titles'][:10], 1):  # 最多顯示10則
-                    md_content.append(f"{i}. {title}")
-                md_content.append("")
+                    yield f"{i}. {title}"
+                yield ""
             
             # 新聞智能報告
             if news.get('news_intelligence_report'):
-                md_content.append("### 🧠 新聞智能分析")
-                md_content.append(news['news_intelligence_report'])
-                md_content.append("")
+                yield "### 🧠 新聞智能分析"
+                yield news['news_intelligence_report']
+                yield ""
         
         # 風險評估
-        if 'risk_assessment' in analysis_result:
-            md_content.append("## ⚠️ 風險評估")
-            md_content.append("")
+        risk = analysis_result.get('risk_assessment')
+        if risk:
+            yield "## ⚠️ 風險評估"
+            yield ""
             
-            risk = analysis_result['risk_assessment']
-            
-            md_content.append("| 風險類型 | 等級 |")
-            md_content.append("|----------|------|")
-            
-            if risk.get('volatility_risk'):
-                md_content.append(f"| 波動風險 | {risk['volatility_risk']} |")
-            
-            if risk.get('valuation_risk'):
-                md_content.append(f"| 估值風險 | {risk['valuation_risk']} |")
-            
-            if risk.get('news_risk'):
-                md_content.append(f"| 新聞風險 | {risk['news_risk']} |")
-            
-            if risk.get('overall_risk'):
-                md_content.append(f"| **整體風險** | **{risk['overall_risk']}** |")
-            
-            md_content.append("")
+            yield "| 風險類型 | 等級 |"
+            yield "|----------|------|"
+            yield from _iter_metric_rows(risk, _RISK_METRIC_ROWS)
+            yield ""
         
         # 多代理人辯論結果 (如果有的話)
-        if 'multi_agent_debate' in analysis_result:
-            md_content.append("## 🗣️ 多代理人辯論結果")
-            md_content.append("")
-            
-            debate = analysis_result['multi_agent_debate']
-            
-            if 'voting_results' in debate:
-                voting = debate['voting_results']
-                
-                md_content.append("### 投票結果")
-                md_content.append("")
-                md_content.append("| 建議 | 票數 |")
-                md_content.append("|------|------|")
-                md_content.append(f"| 買入 | {voting.get('buy_votes', 0)} |")
-                md_content.append(f"| 持有 | {voting.get('hold_votes', 0)} |")
-                md_content.append(f"| 賣出 | {voting.get('sell_votes', 0)} |")
-                md_content.append("")
-                md_content.append(f"**專家共識度:** {voting.get('consensus_level', 0):.1%}")
-                md_content.append("")
+        debate = analysis_result.get('multi_agent_debate')
+        if debate is not None:
+            yield "## 🗣️ 多代理人辯論結果"
+            yield ""
+            
+            voting = debate.get('voting_results')
+            if voting is not None:
+                yield "### 投票結果"
+                yield ""
+                yield "| 建議 | 票數 |"
+                yield "|------|------|"
+                yield f"| 買入 | {voting.get('buy_votes', 0)} |"
+                yield f"| 持有 | {voting.get('hold_votes', 0)} |"
+                yield f"| 賣出 | {voting.get('sell_votes', 0)} |"
+                yield ""
+                yield f"**專家共識度:** {voting.get('consensus_level', 0):.1%}"
+                yield ""
                 
                 # 專家最終立場
-                if 'agent_final_positions' in voting:
-                    md_content.append("### 專家最終立場")
-                    md_content.append("")
+                final_positions = voting.get('agent_final_positions')
+                if final_positions is not None:
+                    yield "### 專家最終立場"
+                    yield ""
                     
-                    for agent_name, position in voting['agent_final_positions'].items():
+                    for agent_name, position in final_positions.items():
                         agent_display = agent_name.replace('派', '').replace('投資師', '').replace('分析師', '').replace('專家', '')
                         rec = position.get('recommendation', 'UNKNOWN')
                         confidence = position.get('confidence', 0)
@@ -1810,191 +3139,213 @@ class EnhancedStockAnalyzer:
                         
                         emoji = "🟢" if rec == "BUY" else "🟡" if rec == "HOLD" else "🔴" if rec == "SELL" else "❓"
                         
-                        md_content.append(f"#### {emoji} {agent_display}")
-                        md_content.append(f"**建議:** {rec}")
-                        md_content.append(f"**信心度:** {confidence}/10")
+                        yield f"#### {emoji} {agent_display}"
+                        yield f"**建議:** {rec}"
+                        yield f"**信心度:** {confidence}/10"
                         if reasoning:
-                            md_content.append(f"**理由:** {reasoning}")
-                        md_content.append("")
+                            yield f"**理由:** {reasoning}"
+                        yield ""
         
         # 結論
-        md_content.append("---")
-        md_content.append("")
-        md_content.append("## 📝 結論")
-        md_content.append("")
-        md_content.append(f"基於綜合分析，{company_name} ({ticker}) 獲得 **{overall_score}/100** 的評分，")
-        md_content.append(f"投資建議為：**{investment_recommendation}**")
-        md_content.append("")
-        md_content.append("⚠️ **免責聲明:** 本報告僅供參考，不構成投資建議。投資有風險，請謹慎決策。")
-        md_content.append("")
-        md_content.append(f"*報告生成時間: {analysis_date}*")
-        
-        return "\n".join(md_content)
+        yield _REPORT_CONCLUSION_TPL.format(
+            ticker=ticker, company_name=company_name, analysis_date=analysis_date,
+            overall_score=overall_score, investment_recommendation=investment_recommendation
+        )
     
     def save_portfolio_summary_as_markdown(self, portfolio_results: Dict, portfolio_name: str = "portfolio") -> str:
         """將投資組合分析摘要儲存為Markdown檔案"""
         try:
-            import os
+            output_dir = "data/output"
+            os.makedirs(output_dir, exist_ok=True)
+            
+            # 檔名與報告內文使用同一時間點
+            now = datetime.now()
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
+            filename = f"{portfolio_name}_summary_{timestamp}.md"
+            filepath = os.path.join(output_dir, filename)
+            
+            # 生成投資組合摘要Markdown內容
+            markdown_content = self._generate_portfolio_summary_markdown(portfolio_results, portfolio_name, now)
+            
+            # 一次編碼後交由背景執行緒寫入
+            self._enqueue_write(filepath, markdown_content.encode('utf-8'))
+            
+            logging.info("投資組合摘要報告已保存為MD檔: %s", filepath)
+            return filepath
             
+        except Exception as e:
+            logging.error("保存投資組合MD摘要失敗: %s", e)
+            return None
+    
+    def save_portfolio_bundle(self, portfolio_results: Dict, portfolio_name: str = "portfolio") -> Optional[str]:
+        """將投資組合摘要、各股MD報告與JSON結果打包為單一 tar 檔，以一個串流寫入"""
+        try:
             output_dir = "data/output"
             os.makedirs(output_dir, exist_ok=True)
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{portfolio_name}_summary_{timestamp}.md"
-            filepath = os.path.join(output_dir, filename)
-            
-            # 生成投資組合摘要Markdown內容
-            markdown_content = self._generate_portfolio_summary_markdown(portfolio_results, portfolio_name)
+            now = datetime.now()
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
+            filepath = os.path.join(output_dir, f"{portfolio_name}_{timestamp}.tar")
+            mtime = now.timestamp()
+            
+            # 先在記憶體中組成封存內容，再一次寫出
+            buf = io.BytesIO()
+            with tarfile.open(fileobj=buf, mode='w') as tar:
+                def add(name: str, data: bytes):
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    info.mtime = mtime
+                    tar.addfile(info, io.BytesIO(data))
+                
+                add(f"{portfolio_name}_summary.md",
+                    self._generate_portfolio_summary_markdown(portfolio_results, portfolio_name, now).encode('utf-8'))
+                for ticker, result in portfolio_results.items():
+                    analysis = result.get('analysis')
+                    if result.get('status') != 'success' or analysis is None:
+                        continue
+                    safe_name = re.sub(r'[^\w.-]', '_', str(ticker))
+                    add(f"stock_analysis_{safe_name}.md", self._generate_markdown_report(analysis).encode('utf-8'))
+                add(f"{portfolio_name}_results.json", _dumps_json(portfolio_results, indent=True))
             
-            # 寫入檔案
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
+            self._enqueue_write(filepath, buf.getvalue())
             
-            logging.info(f"投資組合摘要報告已保存為MD檔: {filepath}")
+            logging.info("投資組合報告已打包: %s", filepath)
             return filepath
             
         except Exception as e:
-            logging.error(f"保存投資組合MD摘要失敗: {e}")
+            logging.error("打包投資組合報告失敗: %s", e)
             return None
     
-    def _generate_portfolio_summary_markdown(self, portfolio_results: Dict, portfolio_name: str) -> str:
+    def _generate_portfolio_summary_markdown(self, portfolio_results: Dict, portfolio_name: str,
+                                             now: Optional[datetime] = None) -> str:
         """生成投資組合摘要Markdown格式報告"""
-        md_content = []
+        return _render_lines(self._iter_portfolio_summary_lines(portfolio_results, portfolio_name, now))
+    
+    def _iter_portfolio_summary_lines(self, portfolio_results: Dict, portfolio_name: str,
+                                      now: Optional[datetime] = None):
+        """逐行產生投資組合摘要報告的Markdown內容（now 為報告時間，預設為當下）"""
+        now_str = (now or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
         
         # 標題
-        md_content.append(f"# 📊 投資組合分析摘要報告")
-        md_content.append("")
-        md_content.append(f"**投資組合:** {portfolio_name}")
-        md_content.append(f"**分析時間:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        md_content.append("")
-        md_content.append("---")
-        md_content.append("")
-        
-        # 分析統計
-        total_stocks = len(portfolio_results)
-        successful_analyses = len([r for r in portfolio_results.values() if r.get('status') == 'success'])
-        failed_analyses = total_stocks - successful_analyses
+        yield _PORTFOLIO_HEADER_TPL.format(portfolio_name=portfolio_name, now_str=now_str)
         
-        md_content.append("## 📈 分析統計")
-        md_content.append("")
-        md_content.append("| 項目 | 數量 |")
-        md_content.append("|------|------|")
-        md_content.append(f"| 總股票數 | {total_stocks} |")
-        md_content.append(f"| 成功分析 | {successful_analyses} |")
-        md_content.append(f"| 分析失敗 | {failed_analyses} |")
-        md_content.append(f"| 成功率 | {(successful_analyses/total_stocks*100):.1f}% |")
-        md_content.append("")
-        
-        # 投資建議統計
+        # 單次走訪收集所有統計：成功數、投資建議、風險等級、評分與個股明細
+        total_stocks = len(portfolio_results)
+        successful_analyses = 0
         recommendations = {}
         risk_levels = {}
         scores = []
+        detail_rows = []
         
         for ticker, result in portfolio_results.items():
-            if result.get('status') == 'success' and 'analysis' in result:
-                analysis = result['analysis']
-                
-                # 投資建議統計
-                rec = analysis.get('investment_recommendation', 'Unknown')
-                recommendations[rec] = recommendations.get(rec, 0) + 1
-                
-                # 風險等級統計
-                if 'risk_assessment' in analysis:
-                    risk = analysis['risk_assessment'].get('overall_risk', 'Unknown')
-                    risk_levels[risk] = risk_levels.get(risk, 0) + 1
-                
-                # 評分收集
-                score = analysis.get('overall_score', 0)
-                if score > 0:
-                    scores.append((ticker, score))
+            if result.get('status') != 'success':
+                continue
+            successful_analyses += 1
+            
+            analysis = result.get('analysis')
+            if analysis is None:
+                continue
+            
+            # 投資建議統計
+            rec = analysis.get('investment_recommendation', 'Unknown')
+            recommendations[rec] = recommendations.get(rec, 0) + 1
+            
+            # 風險等級統計
+            if 'risk_assessment' in analysis:
+                risk = analysis['risk_assessment'].get('overall_risk', 'Unknown')
+                risk_levels[risk] = risk_levels.get(risk, 0) + 1
+            
+            # 評分收集
+            score = analysis.get('overall_score', 0)
+            if score > 0:
+                scores.append((ticker, score))
+            
+            # 個股詳細分析連結（檢查是否有個別的MD報告）
+            detail = f"- **{ticker}** (評分: {score:.1f}, 建議: {analysis.get('investment_recommendation', 'N/A')})"
+            if 'markdown_report_path' in analysis:
+                detail += f" - [詳細報告]({os.path.basename(analysis['markdown_report_path'])})"
+            detail_rows.append(detail)
+        
+        failed_analyses = total_stocks - successful_analyses
+        
+        yield _PORTFOLIO_STATS_TPL.format(
+            total_stocks=total_stocks, successful_analyses=successful_analyses,
+            failed_analyses=failed_analyses, success_rate=successful_analyses / total_stocks * 100 if total_stocks else 0.0
+        )
         
         # 投資建議分布
         if recommendations:
-            md_content.append("## 💡 投資建議分布")
-            md_content.append("")
-            md_content.append("| 建議 | 股票數 | 佔比 |")
-            md_content.append("|------|--------|------|")
+            yield "## 💡 投資建議分布"
+            yield ""
+            yield "| 建議 | 股票數 | 佔比 |"
+            yield "|------|--------|------|"
             
             for rec, count in sorted(recommendations.items(), key=lambda x: x[1], reverse=True):
                 percentage = (count / successful_analyses * 100)
-                md_content.append(f"| {rec} | {count} | {percentage:.1f}% |")
+                yield f"| {rec} | {count} | {percentage:.1f}% |"
             
-            md_content.append("")
+            yield ""
         
         # 風險等級分布
         if risk_levels:
-            md_content.append("## ⚠️ 風險等級分布")
-            md_content.append("")
-            md_content.append("| 風險等級 | 股票數 | 佔比 |")
-            md_content.append("|----------|--------|------|")
+            yield "## ⚠️ 風險等級分布"
+            yield ""
+            yield "| 風險等級 | 股票數 | 佔比 |"
+            yield "|----------|--------|------|"
             
             for risk, count in sorted(risk_levels.items(), key=lambda x: x[1], reverse=True):
                 percentage = (count / successful_analyses * 100)
-                md_content.append(f"| {risk} | {count} | {percentage:.1f}% |")
+                yield f"| {risk} | {count} | {percentage:.1f}% |"
             
-            md_content.append("")
+            yield ""
         
         # 排名前10的股票
         if scores:
-            scores.sort(key=lambda x: x[1], reverse=True)
-            top_10 = scores[:10]
+            top_10 = heapq.nlargest(10, scores, key=itemgetter(1))
             
-            md_content.append("## 🏆 評分排名前10")
-            md_content.append("")
-            md_content.append("| 排名 | 股票代碼 | 評分 | 建議 | 風險等級 |")
-            md_content.append("|------|----------|------|------|----------|")
+            yield "## 🏆 評分排名前10"
+            yield ""
+            yield "| 排名 | 股票代碼 | 評分 | 建議 | 風險等級 |"
+            yield "|------|----------|------|------|----------|"
             
             for i, (ticker, score) in enumerate(top_10, 1):
-                result = portfolio_results.get(ticker, {})
-                analysis = result.get('analysis', {})
+                analysis = portfolio_results.get(ticker, {}).get('analysis') or {}
                 rec = analysis.get('investment_recommendation', 'N/A')
-                risk = analysis.get('risk_assessment', {}).get('overall_risk', 'N/A')
+                risk = (analysis.get('risk_assessment') or {}).get('overall_risk', 'N/A')
                 
-                md_content.append(f"| {i} | {ticker} | {score:.1f} | {rec} | {risk} |")
+                yield _TOP_RANK_ROW_FMT % (i, ticker, score, rec, risk)
             
-            md_content.append("")
+            yield ""
         
         # 詳細分析連結
-        md_content.append("## 📋 個股詳細分析")
-        md_content.append("")
-        md_content.append("以下為各股票的詳細分析連結：")
-        md_content.append("")
+        yield "## 📋 個股詳細分析"
+        yield ""
+        yield "以下為各股票的詳細分析連結："
+        yield ""
         
-        for ticker, result in portfolio_results.items():
-            if result.get('status') == 'success' and 'analysis' in result:
-                analysis = result['analysis']
-                score = analysis.get('overall_score', 0)
-                rec = analysis.get('investment_recommendation', 'N/A')
-                
-                # 檢查是否有個別的MD報告
-                if 'markdown_report_path' in analysis:
-                    import os
-                    md_report_file = os.path.basename(analysis['markdown_report_path'])
-                    md_content.append(f"- **{ticker}** (評分: {score:.1f}, 建議: {rec}) - [詳細報告]({md_report_file})")
-                else:
-                    md_content.append(f"- **{ticker}** (評分: {score:.1f}, 建議: {rec})")
+        yield from detail_rows
         
-        md_content.append("")
+        yield ""
         
         # 總結建議
-        md_content.append("## 📝 總結建議")
-        md_content.append("")
+        yield "## 📝 總結建議"
+        yield ""
         
         if scores:
             avg_score = sum(score for _, score in scores) / len(scores)
-            md_content.append(f"**平均評分:** {avg_score:.1f}/100")
-            md_content.append("")
+            yield f"**平均評分:** {avg_score:.1f}/100"
+            yield ""
             
             # 根據評分給出總體建議
             if avg_score >= 75:
-                md_content.append("🟢 **整體評估:** 此投資組合表現優秀，大多數股票具有良好的投資價值。")
+                yield "🟢 **整體評估:** 此投資組合表現優秀，大多數股票具有良好的投資價值。"
             elif avg_score >= 60:
-                md_content.append("🟡 **整體評估:** 此投資組合表現中等，建議重點關注高評分股票。")
+                yield "🟡 **整體評估:** 此投資組合表現中等，建議重點關注高評分股票。"
             else:
-                md_content.append("🔴 **整體評估:** 此投資組合整體評分較低，建議謹慎投資或重新篩選。")
+                yield "🔴 **整體評估:** 此投資組合整體評分較低，建議謹慎投資或重新篩選。"
         
-        md_content.append("")
-        md_content.append("### 投資建議")
+        yield ""
+        yield "### 投資建議"
         
         # 根據建議分布給出策略建議
         if recommendations:
@@ -2002,156 +3353,21 @@ class EnhancedStockAnalyzer:
             buy_percentage = (buy_ratio / successful_analyses * 100) if successful_analyses > 0 else 0
             
             if buy_percentage >= 50:
-                md_content.append("- 💰 **積極配置策略:** 投資組合中多數股票獲得買入建議，可考慮積極配置")
+                yield "- 💰 **積極配置策略:** 投資組合中多數股票獲得買入建議，可考慮積極配置"
             elif buy_percentage >= 30:
-                md_content.append("- 📊 **平衡配置策略:** 投資組合中部分股票值得投資，建議均衡配置")
-            else:
-                md_content.append("- 🛡️ **保守配置策略:** 投資組合中買入機會較少，建議保守配置或等待更好時機")
-        
-        md_content.append("- 📈 **建議關注高評分股票，逐步建立倉位**")
-        md_content.append("- ⚠️ **注意風險控制，避免過度集中在單一股票**")
-        md_content.append("- 📊 **定期檢視投資組合表現，適時調整配置**")
-        md_content.append("")
-        
-        # 免責聲明
-        md_content.append("---")
-        md_content.append("")
-        md_content.append("⚠️ **免責聲明:** 本報告僅供參考，不構成投資建議。投資有風險，請根據個人風險承受能力謹慎決策。")
-        md_content.append("")
-        md_content.append(f"*報告生成時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*")
-        
-        return "\n".join(md_content)
-
-
-class ValueInvestmentAgent:
-    """價值投資代理人 - 整合到增強分析器中"""
-    
-    def __init__(self, name: str, role: str, expertise: str, investment_style: str):
-        self.name = name
-        self.role = role
-        self.expertise = expertise
-        self.investment_style = investment_style
-        self.env_vars = load_env_variables()
-        self.logger = logging.getLogger(__name__)
-        
-        # 設置 Gemini AI - 使用 Key 管理器
-        self._setup_agent_gemini()
-    
-    def _setup_agent_gemini(self):
-        """為 Agent 設置 Gemini AI"""
-        try:
-            if get_agent_gemini_key:
-                # 為此代理人獲取專用的 API Key
-                api_key = get_agent_gemini_key(self.name)
-                if not api_key:
-                    raise ValueError(f"{self.name} 無法獲取有效的 Gemini API Key")
+                yield "- 📊 **平衡配置策略:** 投資組合中部分股票值得投資，建議均衡配置"
             else:
-                # 回退到環境變數
-                api_key = self.env_vars['gemini_api_key']
-                
-            genai.configure(api_key=api_key)
-            self.llm = genai.GenerativeModel(GEMINI_SETTINGS['model'])
-            self.logger.info(f"{self.name} Gemini AI 初始化成功，使用專用 API Key")
-        except Exception as e:
-            self.logger.error(f"{self.name} 初始化 Gemini AI 失敗: {e}")
-            if report_gemini_error:
-                report_gemini_error(f"{self.name} 初始化失敗: {e}", self.name)
-            self.llm = None
-    
-    def analyze(self, stock_data: Dict, context: str = "", round_type: str = "initial") -> Dict[str, Any]:
-        """分析股票數據並提供觀點"""
-        if not self.llm:
-            return {
-                'agent': self.name,
-                'analysis': "AI 模型初始化失敗，無法進行分析",
-                'recommendation': "HOLD",
-                'confidence': 0,
-                'target_price': None,
-                'risk_level': "UNKNOWN"
-            }
-        
-        prompt = self._create_analysis_prompt(stock_data, context, round_type)
+                yield "- 🛡️ **保守配置策略:** 投資組合中買入機會較少，建議保守配置或等待更好時機"
         
-        try:
-            response = self.llm.generate_content(prompt)
-            analysis_text = response.text
-            
-            # 報告成功使用 API（代理人特定）
-            if report_gemini_success:
-                report_gemini_success(self.name)
-            
-            # 解析分析結果
-            parsed_result = self._parse_analysis_result(analysis_text)
-            parsed_result['agent'] = self.name
-            parsed_result['role'] = self.role
-            parsed_result['timestamp'] = datetime.now().isoformat()
-            
-            return parsed_result
-                
-        except Exception as e:
-            self.logger.error(f"{self.name} 分析失敗: {e}")
-            # 報告錯誤並嘗試切換 Key（代理人特定）
-            if report_gemini_error:
-                report_gemini_error(f"{self.name} 分析失敗: {e}", self.name)
-                
-            # 嘗試重新初始化 Gemini 以使用新的 Key
-            try:
-                self._setup_agent_gemini()
-                self.logger.info(f"{self.name} 已切換到新的 API Key，重新嘗試分析")
-                if self.llm:
-                    response = self.llm.generate_content(prompt)
-                    if report_gemini_success:
-                        report_gemini_success(self.name)
-                    analysis_text = response.text
-                    
-                    # 解析分析結果
-                    parsed_result = self._parse_analysis_result(analysis_text)
-                    parsed_result['agent'] = self.name
-                    parsed_result['role'] = self.role
-                    parsed_result['timestamp'] = datetime.now().isoformat()
-                    
-                    return parsed_result
-            except Exception as retry_error:
-                self.logger.error(f"{self.name} 重試分析失敗: {retry_error}")
-            
-            return {
-                'agent': self.name,
-                'analysis': f"分析過程中發生錯誤: {str(e)}",
-                'recommendation': "HOLD",
-                'confidence': 0,
-                'target_price': None,
-                'risk_level': "HIGH"
-            }
-    
-    def _create_analysis_prompt(self, stock_data: Dict, context: str, round_type: str) -> str:
-        """創建分析提示詞"""
-        base_prompt = f"""
-你是一位專業的{self.role}，專精於{self.expertise}，投資風格為{self.investment_style}。
+        # 通用建議與免責聲明
+        yield _PORTFOLIO_FOOTER_TPL.format(now_str=now_str)
 
-股票基本資訊：
-- 股票代碼: {stock_data.get('symbol', 'N/A')}
-- 公司名稱: {stock_data.get('company_name', 'N/A')}
 
-財務指標：
-- 本益比 (P/E): {stock_data.get('pe_ratio', 'N/A')}
-- 市淨率 (P/B): {stock_data.get('pb_ratio', 'N/A')}
-- 股息殖利率: {stock_data.get('dividend_yield', 'N/A')}%
-- 負債權益比: {stock_data.get('debt_to_equity', 'N/A')}
-- 自由現金流: {stock_data.get('free_cash_flow', 'N/A')}
-- ROE: {stock_data.get('roe', 'N/A')}%
-- ROA: {stock_data.get('roa', 'N/A')}%
+# 代理人提示詞固定區塊：依代理人名稱所含的風格標籤選用，模組載入時建立一次
+_AGENT_STYLE_TAGS = ("芒格", "巴菲特", "成長", "市場時機", "風險管理")
 
-價格資訊：
-- 當前股價: ${stock_data.get('current_price', 'N/A')}
-- 52週高點: ${stock_data.get('fifty_two_week_high', 'N/A')}
-- 52週低點: ${stock_data.get('fifty_two_week_low', 'N/A')}
 
-{context}
-"""
-        
-        # 根據不同分析師添加專業分析框架
-        if "芒格" in self.name:
-            base_prompt += f"""
+_MUNGER_FRAMEWORK = """
 
 【多學科心智模型分析框架】
 請運用以下心智模型和學科知識進行分析：
@@ -2186,8 +3402,9 @@ class ValueInvestmentAgent:
    - 化學：催化劑效應在商業中的應用
    - 數學：複利效應和指數成長模式
 """
-        elif "巴菲特" in self.name:
-            base_prompt += f"""
+
+
+_BUFFETT_FRAMEWORK = """
 
 【巴菲特價值投資分析框架】
 請運用經典價值投資原則進行深度分析：
@@ -2223,8 +3440,9 @@ class ValueInvestmentAgent:
    - 客戶關係：與客戶的長期合作關係
    - 創新能力：持續改進和適應市場變化的能力
 """
-        elif "成長" in self.name:
-            base_prompt += f"""
+
+
+_GROWTH_FRAMEWORK = """
 
 【成長價值投資分析框架】
 請聚焦於成長性與價值的平衡分析：
@@ -2260,8 +3478,9 @@ class ValueInvestmentAgent:
    - 競爭風險：新進者稀釋成長機會的可能性
    - 週期風險：成長受景氣週期影響的程度
 """
-        elif "市場時機" in self.name:
-            base_prompt += f"""
+
+
+_TIMING_FRAMEWORK = """
 
 【市場時機與技術分析框架】
 請結合總體環境與技術分析進行判斷：
@@ -2296,8 +3515,9 @@ class ValueInvestmentAgent:
    - 匯率影響：美元強弱對國際企業的影響
    - 商品價格：原物料價格對成本結構的影響
 """
-        elif "風險管理" in self.name:
-            base_prompt += f"""
+
+
+_RISK_FRAMEWORK = """
 
 【風險管理與投資組合分析框架】
 請從風險控制和資產配置角度進行評估：
@@ -2334,10 +3554,9 @@ class ValueInvestmentAgent:
    - 對沖方案：可用的風險對沖工具
    - 監控指標：需要持續關注的風險指標
 """
-        
-        if round_type == "initial":
-            if "芒格" in self.name:
-                task_prompt = f"""
+
+
+_MUNGER_INITIAL_TASK = """
 請從多學科心智模型的角度進行深度分析，特別關注：
 
 1. 心理偏誤識別（150字）：市場對該股票是否存在認知偏誤？
@@ -2347,7 +3566,7 @@ class ValueInvestmentAgent:
 5. 跨學科洞察（50字）：其他學科能提供什麼獨特視角？
 
 請以 JSON 格式回應：
-{{
+{
     "analysis": "整合多學科分析的詳細內容",
     "recommendation": "BUY/HOLD/SELL",
     "confidence": 7,
@@ -2360,10 +3579,11 @@ class ValueInvestmentAgent:
     "economic_moats": ["護城河類型1", "護城河類型2"],
     "systemic_risks": ["系統風險1", "系統風險2"],
     "mental_models_applied": ["模型1", "模型2", "模型3"]
-}}
+}
 """
-            elif "巴菲特" in self.name:
-                task_prompt = f"""
+
+
+_BUFFETT_INITIAL_TASK = """
 請從巴菲特價值投資哲學角度進行深度分析：
 
 1. 護城河分析（150字）：評估企業的競爭優勢和可持續性
@@ -2373,7 +3593,7 @@ class ValueInvestmentAgent:
 5. 長期前景（50字）：10年後企業的競爭地位預測
 
 請以 JSON 格式回應：
-{{
+{
     "analysis": "巴菲特風格的價值投資分析",
     "recommendation": "BUY/HOLD/SELL",
     "confidence": 7,
@@ -2386,10 +3606,11 @@ class ValueInvestmentAgent:
     "financial_strength": ["現金流穩定", "低負債", "高ROE"],
     "valuation_metrics": ["DCF估值", "相對估值", "安全邊際"],
     "competitive_position": ["市場地位", "定價能力", "客戶黏性"]
-}}
+}
 """
-            elif "成長" in self.name:
-                task_prompt = f"""
+
+
+_GROWTH_INITIAL_TASK = """
 請從成長價值投資角度進行分析：
 
 1. 成長性評估（150字）：分析營收和獲利成長的可持續性
@@ -2399,7 +3620,7 @@ class ValueInvestmentAgent:
 5. 風險評估（50字）：成長預期不達標的風險
 
 請以 JSON 格式回應：
-{{
+{
     "analysis": "成長價值投資深度分析",
     "recommendation": "BUY/HOLD/SELL",
     "confidence": 7,
@@ -2412,10 +3633,11 @@ class ValueInvestmentAgent:
     "valuation_metrics": ["PEG比率", "前瞻估值", "同業比較"],
     "competitive_advantages": ["技術領先", "市場地位", "品牌價值"],
     "risk_factors": ["成長放緩", "估值修正", "競爭加劇"]
-}}
+}
 """
-            elif "市場時機" in self.name:
-                task_prompt = f"""
+
+
+_TIMING_INITIAL_TASK = """
 請從市場時機和技術分析角度評估：
 
 1. 市場週期定位（150字）：當前市場環境和投資者情緒分析
@@ -2425,7 +3647,7 @@ class ValueInvestmentAgent:
 5. 總體因子（50字）：利率、通膨等總體因素影響
 
 請以 JSON 格式回應：
-{{
+{
     "analysis": "市場時機與技術面綜合分析",
     "recommendation": "BUY/HOLD/SELL",
     "confidence": 7,
@@ -2438,10 +3660,11 @@ class ValueInvestmentAgent:
     "relative_strength": ["相對大盤", "板塊表現", "同業比較"],
     "timing_strategy": ["進場點位", "停損設定", "獲利目標"],
     "macro_factors": ["利率環境", "政策影響", "匯率因素"]
-}}
+}
 """
-            elif "風險管理" in self.name:
-                task_prompt = f"""
+
+
+_RISK_INITIAL_TASK = """
 請從風險管理和投資組合角度評估：
 
 1. 風險識別（150字）：系統性和非系統性風險的全面評估
@@ -2451,7 +3674,7 @@ class ValueInvestmentAgent:
 5. 風險管控（50字）：停損策略和部位管理建議
 
 請以 JSON 格式回應：
-{{
+{
     "analysis": "風險管理與投資組合分析",
     "recommendation": "BUY/HOLD/SELL",
     "confidence": 7,
@@ -2464,11 +3687,13 @@ class ValueInvestmentAgent:
     "portfolio_impact": ["相關性", "分散效果", "配置比重"],
     "risk_adjusted_returns": ["夏普比率", "Treynor比率", "資訊比率"],
     "risk_management": ["停損策略", "部位控制", "對沖方案"]
-}}
+}
 """
-            else:
-                task_prompt = f"""
-請從{self.investment_style}的角度進行首次分析，提供：
+
+
+# 通用任務說明以 str.format 填入投資風格
+_GENERIC_INITIAL_TASK = """
+請從{investment_style}的角度進行首次分析，提供：
 
 1. 詳細分析（200-300字）
 2. 投資建議：BUY/HOLD/SELL
@@ -2488,9 +3713,9 @@ class ValueInvestmentAgent:
     "key_points": ["論點1", "論點2", "論點3"]
 }}
 """
-        else:
-            if "芒格" in self.name:
-                task_prompt = f"""
+
+
+_MUNGER_DEBATE_TASK = """
 基於其他專家的分析，請從多學科角度重新評估：
 
 1. 偏誤糾正：其他專家的分析中存在哪些認知偏誤？
@@ -2500,7 +3725,7 @@ class ValueInvestmentAgent:
 5. 心智模型應用：運用不同心智模型得出的結論
 
 請以 JSON 格式回應：
-{{
+{
     "analysis": "多學科辯論分析內容",
     "recommendation": "BUY/HOLD/SELL",
     "confidence": 7,
@@ -2513,10 +3738,11 @@ class ValueInvestmentAgent:
     "statistical_challenges": ["統計挑戰1", "統計挑戰2"],
     "economic_logic_tests": ["邏輯檢驗1", "邏輯檢驗2"],
     "mental_models_applied": ["反向思維", "機率思維", "系統思維"]
-}}
+}
 """
-            elif "巴菲特" in self.name:
-                task_prompt = f"""
+
+
+_BUFFETT_DEBATE_TASK = """
 基於其他專家的分析，請從價值投資大師角度重新評估：
 
 1. 長期價值質疑：其他專家是否過分關注短期波動？
@@ -2526,7 +3752,7 @@ class ValueInvestmentAgent:
 5. 安全邊際：重新評估風險和安全邊際的adequacy
 
 請以 JSON 格式回應：
-{{
+{
     "analysis": "巴菲特風格的辯論分析",
     "recommendation": "BUY/HOLD/SELL",
     "confidence": 7,
@@ -2538,10 +3764,11 @@ class ValueInvestmentAgent:
     "long_term_perspective": ["10年後展望", "持續競爭力"],
     "simplicity_test": ["商業模式簡單性", "可預測性"],
     "margin_of_safety": ["價值低估程度", "風險緩衝"]
-}}
+}
 """
-            elif "成長" in self.name:
-                task_prompt = f"""
+
+
+_GROWTH_DEBATE_TASK = """
 基於其他專家的分析，請從成長投資角度重新評估：
 
 1. 成長潛力重估：其他專家是否低估了成長機會？
@@ -2551,7 +3778,7 @@ class ValueInvestmentAgent:
 5. 時間價值：強調時間複利對成長股的重要性
 
 請以 JSON 格式回應：
-{{
+{
     "analysis": "成長投資角度的辯論分析",
     "recommendation": "BUY/HOLD/SELL",
     "confidence": 7,
@@ -2563,10 +3790,11 @@ class ValueInvestmentAgent:
     "growth_potential": ["未來成長空間", "新市場機會"],
     "innovation_value": ["技術突破價值", "商業模式創新"],
     "time_value": ["複利效應", "先發優勢價值"]
-}}
+}
 """
-            elif "市場時機" in self.name:
-                task_prompt = f"""
+
+
+_TIMING_DEBATE_TASK = """
 基於其他專家的分析，請從市場時機角度重新評估：
 
 1. 時機挑戰：其他專家是否忽略了市場時機的重要性？
@@ -2576,7 +3804,7 @@ class ValueInvestmentAgent:
 5. 流動性影響：評估市場流動性對價格的影響
 
 請以 JSON 格式回應：
-{{
+{
     "analysis": "市場時機分析師的辯論觀點",
     "recommendation": "BUY/HOLD/SELL",
     "confidence": 7,
@@ -2588,10 +3816,11 @@ class ValueInvestmentAgent:
     "timing_analysis": ["進場時機評估", "市場週期定位"],
     "technical_divergence": ["價量背離", "指標反轉信號"],
     "market_sentiment": ["情緒極端", "反向指標"]
-}}
+}
 """
-            elif "風險管理" in self.name:
-                task_prompt = f"""
+
+
+_RISK_DEBATE_TASK = """
 基於其他專家的分析，請從風險管理角度重新評估：
 
 1. 風險盲點：指出其他專家忽略的潛在風險
@@ -2601,7 +3830,7 @@ class ValueInvestmentAgent:
 5. 風險報酬失衡：挑戰風險與報酬的不對稱性
 
 請以 JSON 格式回應：
-{{
+{
     "analysis": "風險管理專家的辯論分析",
     "recommendation": "BUY/HOLD/SELL",
     "confidence": 7,
@@ -2614,10 +3843,11 @@ class ValueInvestmentAgent:
     "risk_quantification": ["VaR重估", "壓力測試"],
     "portfolio_impact": ["集中度風險", "相關性影響"],
     "extreme_scenarios": ["黑天鵝事件", "系統性崩潰"]
-}}
+}
 """
-            else:
-                task_prompt = f"""
+
+
+_GENERIC_DEBATE_TASK = """
 基於其他專家的分析，請重新評估並提供辯論觀點：
 
 1. 針對其他專家意見的反駁或支持
@@ -2625,122 +3855,612 @@ class ValueInvestmentAgent:
 3. 更新後的投資建議和理由
 4. 對爭議點的明確立場
 
-請以 JSON 格式回應：
-{{
-    "analysis": "辯論分析內容",
-    "recommendation": "BUY/HOLD/SELL",
-    "confidence": 7,
-    "target_price_low": 150.0,
-    "target_price_high": 180.0,
-    "risk_level": "MEDIUM",
-    "rebuttal_points": ["反駁點1", "反駁點2"],
-    "support_points": ["支持點1", "支持點2"]
-}}
-"""
+請以 JSON 格式回應：
+{
+    "analysis": "辯論分析內容",
+    "recommendation": "BUY/HOLD/SELL",
+    "confidence": 7,
+    "target_price_low": 150.0,
+    "target_price_high": 180.0,
+    "risk_level": "MEDIUM",
+    "rebuttal_points": ["反駁點1", "反駁點2"],
+    "support_points": ["支持點1", "支持點2"]
+}
+"""
+
+
+# 風格標籤 -> 專業分析框架
+_FRAMEWORK_BLOCKS = MappingProxyType({
+    "芒格": _MUNGER_FRAMEWORK,
+    "巴菲特": _BUFFETT_FRAMEWORK,
+    "成長": _GROWTH_FRAMEWORK,
+    "市場時機": _TIMING_FRAMEWORK,
+    "風險管理": _RISK_FRAMEWORK,
+})
+
+
+# 風格標籤 -> 首次分析任務說明
+_INITIAL_TASK_PROMPTS = MappingProxyType({
+    "芒格": _MUNGER_INITIAL_TASK,
+    "巴菲特": _BUFFETT_INITIAL_TASK,
+    "成長": _GROWTH_INITIAL_TASK,
+    "市場時機": _TIMING_INITIAL_TASK,
+    "風險管理": _RISK_INITIAL_TASK,
+})
+
+
+# 風格標籤 -> 辯論回應任務說明
+_DEBATE_TASK_PROMPTS = MappingProxyType({
+    "芒格": _MUNGER_DEBATE_TASK,
+    "巴菲特": _BUFFETT_DEBATE_TASK,
+    "成長": _GROWTH_DEBATE_TASK,
+    "市場時機": _TIMING_DEBATE_TASK,
+    "風險管理": _RISK_DEBATE_TASK,
+})
+
+
+# 提示詞中依股票而變的區段
+_STOCK_PROMPT_TPL = """
+股票基本資訊：
+- 股票代碼: {symbol}
+- 公司名稱: {company_name}
+
+財務指標：
+- 本益比 (P/E): {pe_ratio}
+- 市淨率 (P/B): {pb_ratio}
+- 股息殖利率: {dividend_yield}%
+- 負債權益比: {debt_to_equity}
+- 自由現金流: {free_cash_flow}
+- ROE: {roe}%
+- ROA: {roa}%
+
+價格資訊：
+- 當前股價: ${current_price}
+- 52週高點: ${fifty_two_week_high}
+- 52週低點: ${fifty_two_week_low}
+
+"""
+
+# 多檔股票批量分析時附加於提示詞結尾的回覆格式要求
+_BATCH_RESPONSE_INSTRUCTION = """
+【批量回覆格式】
+請將上述每一檔股票的分析結果依相同 JSON 格式輸出，並在每個物件中加入 "symbol" 欄位（股票代碼），
+最後以 JSON 陣列回傳，共 {count} 個元素，順序與上方股票相同。
+"""
+
+# 辯論開始前預先格式化的股票區段存放於 stock_data 副本的此鍵，供所有代理人與輪次共用
+_PROMPT_SECTION_KEY = '_prompt_section'
+
+
+def _format_stock_prompt_section(stock_data: Dict) -> str:
+    """格式化提示詞中的股票資訊區段"""
+    get = stock_data.get
+    return _STOCK_PROMPT_TPL.format(
+        symbol=get('symbol', 'N/A'),
+        company_name=get('company_name', 'N/A'),
+        pe_ratio=get('pe_ratio', 'N/A'),
+        pb_ratio=get('pb_ratio', 'N/A'),
+        dividend_yield=get('dividend_yield', 'N/A'),
+        debt_to_equity=get('debt_to_equity', 'N/A'),
+        free_cash_flow=get('free_cash_flow', 'N/A'),
+        roe=get('roe', 'N/A'),
+        roa=get('roa', 'N/A'),
+        current_price=get('current_price', 'N/A'),
+        fifty_two_week_high=get('fifty_two_week_high', 'N/A'),
+        fifty_two_week_low=get('fifty_two_week_low', 'N/A')
+    )
+
+
+@lru_cache(maxsize=64)
+def _agent_header(role: str, expertise: str, investment_style: str) -> str:
+    """代理人身分開場白，同一代理人在所有股票與輪次間共用"""
+    return f"\n你是一位專業的{role}，專精於{expertise}，投資風格為{investment_style}。\n"
+
+
+# 無法解析 JSON 時的關鍵字判讀：英文不分大小寫（限 ASCII，避免 İ 等字元經 upper() 後查不到標籤）；以前瞻比對讓重疊的關鍵字都能被找到
+_KEY_INFO_RE = re.compile(r'(?=(BUY|SELL|HIGH|LOW|買入|賣出|高風險|低風險))', re.ASCII | re.IGNORECASE)
+_KEY_INFO_TAGS = MappingProxyType({
+    'BUY': 'BUY', '買入': 'BUY',
+    'SELL': 'SELL', '賣出': 'SELL',
+    'HIGH': 'HIGH', '高風險': 'HIGH',
+    'LOW': 'LOW', '低風險': 'LOW',
+})
+
+# 關鍵字判讀結果的內部標記（寫入快取前移除；帶此標記的結果不寫入快取，避免重播無法解析的回應）
+_KEYWORD_FALLBACK_MARK = '_keyword_fallback'
+
+
+# 各風格代理人回應中必備的專業分析欄位（缺少時補上空列表；保持順序以固定輸出欄位次序）
+_EXTRA_FIELDS = MappingProxyType({
+    # 芒格多學科分析字段
+    "芒格": (
+        'cognitive_biases_detected', 'statistical_anomalies', 'economic_moats',
+        'systemic_risks', 'mental_models_applied', 'bias_corrections',
+        'statistical_challenges', 'economic_logic_tests',
+    ),
+    # 巴菲特價值投資分析字段
+    "巴菲特": (
+        'economic_moats', 'management_quality', 'financial_strength',
+        'valuation_metrics', 'competitive_position', 'long_term_perspective',
+        'simplicity_test', 'margin_of_safety',
+    ),
+    # 成長價值投資分析字段
+    "成長": (
+        'growth_drivers', 'growth_quality', 'valuation_metrics',
+        'competitive_advantages', 'risk_factors', 'growth_potential',
+        'innovation_value', 'time_value',
+    ),
+    # 市場時機分析字段
+    "市場時機": (
+        'market_cycle', 'technical_signals', 'relative_strength',
+        'timing_strategy', 'macro_factors', 'timing_analysis',
+        'technical_divergence', 'market_sentiment',
+    ),
+    # 風險管理分析字段
+    "風險管理": (
+        'risk_factors', 'risk_metrics', 'portfolio_impact',
+        'risk_adjusted_returns', 'risk_management', 'hidden_risks',
+        'risk_quantification', 'extreme_scenarios',
+    ),
+})
+
+
+def _agent_style_tag(name: str) -> Optional[str]:
+    """回傳代理人名稱中第一個符合的風格標籤，皆不符合時回傳 None"""
+    return next((tag for tag in _AGENT_STYLE_TAGS if tag in name), None)
+
+
+# 代理人 Gemini 呼叫重試設定
+_AGENT_MAX_ATTEMPTS = 2
+_RATE_LIMIT_MARKERS = ('429', 'quota', 'rate limit', 'resource exhausted', 'resource_exhausted')
+_AUTH_ERROR_MARKERS = ('401', '403', 'api key', 'api_key', 'permission', 'unauthenticated')
+
+
+class _RequestPacer:
+    """以每分鐘請求上限（QPM）平均分散請求的節流器（token bucket），執行緒與協程皆可共用
+    
+    burst 為閒置後可立即送出的請求數，之後依 60/qpm 秒的間隔放行。
+    """
+    
+    def __init__(self, qpm: float, burst: int = 1):
+        self.interval = 60.0 / qpm if qpm and qpm > 0 else 0.0
+        self._burst_window = max(0, burst - 1) * self.interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+    
+    def reserve(self) -> float:
+        """預約下一個可用時段，回傳呼叫前需等待的秒數"""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return max(0.0, slot - now - self._burst_window)
+    
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+    
+    async def async_wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# 分析器本身（翻譯、新聞情緒、Gemini 新聞搜尋）共用的 Gemini 節流器，切換 API Key 後仍沿用同一配額節奏
+_GEMINI_PACER = _RequestPacer(
+    GEMINI_SETTINGS.get('requests_per_minute', 20),
+    burst=GEMINI_SETTINGS.get('request_burst', 3)
+)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in _RATE_LIMIT_MARKERS)
+
+
+# 代理人非同步呼叫共用的事件迴圈（於背景執行緒持續運行，跨辯論輪次重用連線）
+_agent_loop: Optional[asyncio.AbstractEventLoop] = None
+_agent_loop_lock = threading.Lock()
+
+
+def _get_agent_loop() -> asyncio.AbstractEventLoop:
+    global _agent_loop
+    if _agent_loop is None:
+        with _agent_loop_lock:
+            if _agent_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='agent-loop', daemon=True).start()
+                atexit.register(loop.call_soon_threadsafe, loop.stop)
+                _agent_loop = loop
+    return _agent_loop
+
+
+class ValueInvestmentAgent:
+    """價值投資代理人 - 整合到增強分析器中"""
+
+    __slots__ = (
+        'name', 'role', 'expertise', 'investment_style', 'env_vars', 'logger', 'llm',
+        '_style_tag', '_prompt_suffixes',
+    )
+
+    # 所有代理人共用的 Gemini 呼叫執行緒池（延遲建立）
+    _pool: Optional[ThreadPoolExecutor] = None
+    _pool_lock = threading.Lock()
+    # 所有代理人與辯論輪次共用的 QPM 節流器，避免觸發 429 後的退避等待
+    _pacer = _RequestPacer(MULTI_AGENT_SETTINGS.get('gemini_qpm', 60))
+
+    # 跨次執行共用的代理人回應磁碟快取（延遲建立，停用時為 None）
+    _response_cache: Optional[PersistentLRUCache] = None
+    _response_cache_lock = threading.Lock()
+
+    @classmethod
+    def _get_response_cache(cls) -> Optional[PersistentLRUCache]:
+        """取得代理人回應磁碟快取；設定停用時回傳 None"""
+        if not MULTI_AGENT_SETTINGS.get('persist_agent_cache', True):
+            return None
+        if cls._response_cache is None:
+            with cls._response_cache_lock:
+                if cls._response_cache is None:
+                    cls._response_cache = PersistentLRUCache(
+                        max_size=MULTI_AGENT_SETTINGS.get('agent_cache_size', 500),
+                        db_path=get_cache_path('agent_responses.db'),
+                        ttl=MULTI_AGENT_SETTINGS.get('agent_cache_ttl', 24 * 3600)
+                    )
+        return cls._response_cache
+
+    @classmethod
+    def _get_pool(cls) -> ThreadPoolExecutor:
+        """取得共用執行緒池，跨辯論輪次與股票重複使用"""
+        if cls._pool is None:
+            with cls._pool_lock:
+                if cls._pool is None:
+                    max_workers = max(1, MULTI_AGENT_SETTINGS.get('max_concurrent_analysis', 3))
+                    cls._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='agent-llm')
+                    atexit.register(cls._pool.shutdown, wait=False)
+        return cls._pool
+
+    def __init__(self, name: str, role: str, expertise: str, investment_style: str):
+        self.name = name
+        self.role = role
+        self.expertise = expertise
+        self.investment_style = investment_style
+        self.env_vars = load_env_variables()
+        self.logger = logging.getLogger(__name__)
+        
+        # 固定提示詞區塊只依代理人風格決定，直接取用模組層級常數
+        self._style_tag = style_tag = _agent_style_tag(name)
+        framework_block = _FRAMEWORK_BLOCKS.get(style_tag, "")
+        initial_task = (_INITIAL_TASK_PROMPTS[style_tag] if style_tag
+                        else _GENERIC_INITIAL_TASK.format(investment_style=investment_style))
+        debate_task = _DEBATE_TASK_PROMPTS[style_tag] if style_tag else _GENERIC_DEBATE_TASK
+        # 分析框架與任務說明合併為各輪次固定的提示詞結尾
+        self._prompt_suffixes = {
+            'initial': framework_block + initial_task,
+            'debate': framework_block + debate_task,
+        }
+        
+        # 設置 Gemini AI - 使用 Key 管理器
+        self._setup_agent_gemini()
+    
+    def _setup_agent_gemini(self):
+        """為 Agent 設置 Gemini AI"""
+        try:
+            if get_agent_gemini_key:
+                # 為此代理人獲取專用的 API Key
+                api_key = get_agent_gemini_key(self.name)
+                if not api_key:
+                    raise ValueError(f"{self.name} 無法獲取有效的 Gemini API Key")
+            else:
+                # 回退到環境變數
+                api_key = self.env_vars['gemini_api_key']
+                
+            genai.configure(api_key=api_key)
+            self.llm = genai.GenerativeModel(GEMINI_SETTINGS['model'])
+            self.logger.info(f"{self.name} Gemini AI 初始化成功，使用專用 API Key")
+        except Exception as e:
+            self.logger.error(f"{self.name} 初始化 Gemini AI 失敗: {e}")
+            if report_gemini_error:
+                report_gemini_error(f"{self.name} 初始化失敗: {e}", self.name)
+            self.llm = None
+    
+    def analyze_async(self, stock_data: Dict, context: str = "", round_type: str = "initial") -> Future:
+        """於共用執行緒池中非同步執行 analyze，回傳 Future"""
+        return self._get_pool().submit(self.analyze, stock_data, context, round_type)
+
+    def analyze(self, stock_data: Dict, context: str = "", round_type: str = "initial",
+                prompt_cache: Optional[Dict[bytes, Dict]] = None) -> Dict[str, Any]:
+        """分析股票數據並提供觀點（prompt_cache 為本次分析共用的提示詞回應快取）"""
+        if not self.llm:
+            return self._unavailable_result()
+        
+        prompt = self._create_analysis_prompt(stock_data, context, round_type)
+        cache_key, cached = self._lookup_prompt_cache(prompt_cache, prompt)
+        if cached is not None:
+            return cached
+        
+        first_error = None
+        for attempt in range(_AGENT_MAX_ATTEMPTS):
+            if attempt:
+                if not self.llm:
+                    break
+                self.logger.info(f"{self.name} 重新嘗試分析 (第 {attempt + 1} 次)")
+            try:
+                return self._store_prompt_cache(prompt_cache, cache_key, prompt, self._do_call(prompt))
+            except Exception as e:
+                if first_error is None:
+                    first_error = e
+                wait = self._on_call_error(e, attempt)
+                if wait is None:
+                    break
+                time.sleep(wait)
+                self._maybe_switch_key(e)
+        
+        return self._error_result(first_error)
+    
+    async def aanalyze(self, stock_data: Dict, context: str = "", round_type: str = "initial",
+                       prompt_cache: Optional[Dict[bytes, Dict]] = None) -> Dict[str, Any]:
+        """analyze 的協程版本，供單一事件迴圈同時驅動多位代理人"""
+        if not self.llm:
+            return self._unavailable_result()
+        
+        prompt = self._create_analysis_prompt(stock_data, context, round_type)
+        cache_key, cached = self._lookup_prompt_cache(prompt_cache, prompt)
+        if cached is not None:
+            return cached
+        
+        first_error = None
+        for attempt in range(_AGENT_MAX_ATTEMPTS):
+            if attempt:
+                if not self.llm:
+                    break
+                self.logger.info(f"{self.name} 重新嘗試分析 (第 {attempt + 1} 次)")
+            try:
+                return self._store_prompt_cache(prompt_cache, cache_key, prompt, await self._acall_gemini(prompt))
+            except Exception as e:
+                if first_error is None:
+                    first_error = e
+                wait = self._on_call_error(e, attempt)
+                if wait is None:
+                    break
+                await asyncio.sleep(wait)
+                self._maybe_switch_key(e)
+        
+        return self._error_result(first_error)
+    
+    def _lookup_prompt_cache(self, prompt_cache: Optional[Dict[bytes, Dict]],
+                             prompt: str) -> Tuple[Optional[bytes], Optional[Dict[str, Any]]]:
+        """查詢相同提示詞的既有回應（本次分析快取優先，其次為磁碟快取），回傳 (快取鍵, 快取結果副本)"""
+        cache_key = None
+        if prompt_cache is not None:
+            cache_key = hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).digest()
+            cached = prompt_cache.get(cache_key)
+            if cached is not None:
+                self.logger.info(f"{self.name} 提示詞與先前相同，沿用既有回應")
+                return cache_key, copy.deepcopy(cached)
+        
+        response_cache = self._get_response_cache()
+        if response_cache is not None:
+            cached = response_cache.get(self._response_cache_key(prompt))
+            if cached is not None:
+                self.logger.info(f"{self.name} 使用當日快取的分析結果")
+                # 時間戳記以本次取用時間為準，而非當初呼叫模型的時間
+                cached['timestamp'] = datetime.now().isoformat()
+                if cache_key is not None:
+                    prompt_cache[cache_key] = copy.deepcopy(cached)
+                return cache_key, cached
+        return cache_key, None
+    
+    def _response_cache_key(self, prompt: str) -> str:
+        """磁碟快取鍵：代理人 + 日期 + 提示詞（提示詞已含股票數據與股價，數據變動即失效）"""
+        return PersistentLRUCache.make_key(self.name, datetime.now().strftime('%Y-%m-%d'), prompt)
+    
+    def _store_prompt_cache(self, prompt_cache: Optional[Dict[bytes, Dict]], cache_key: Optional[bytes],
+                            prompt: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """記錄成功的回應供相同提示詞重用（同時寫入磁碟快取），回傳原結果；
+        無法解析 JSON、以關鍵字判讀的結果不快取，下次重新呼叫模型
+        """
+        if result.pop(_KEYWORD_FALLBACK_MARK, False):
+            return result
+        if prompt_cache is not None and cache_key is not None:
+            prompt_cache[cache_key] = copy.deepcopy(result)
+        response_cache = self._get_response_cache()
+        if response_cache is not None:
+            response_cache.set(self._response_cache_key(prompt), result)
+        return result
+    
+    def _on_call_error(self, error: Exception, attempt: int) -> Optional[float]:
+        """記錄並回報呼叫失敗；回傳重試前的退避秒數，不再重試時回傳 None"""
+        self.logger.error(f"{self.name} 分析失敗: {error}")
+        # 報告錯誤並嘗試切換 Key（代理人特定）
+        if report_gemini_error:
+            report_gemini_error(f"{self.name} 分析失敗: {error}", self.name)
+        if attempt + 1 >= _AGENT_MAX_ATTEMPTS:
+            return None
         
-        return base_prompt + task_prompt
+        # 退避等待；速率限制時立即重試必然再次失敗，等待時間加倍
+        wait = min(2 ** attempt * 0.5, 4)
+        return wait * 2 if _is_rate_limited(error) else wait
+    
+    def _maybe_switch_key(self, error: Exception):
+        """認證或配額錯誤才重新初始化 Gemini 以使用新的 Key"""
+        if _is_rate_limited(error) or any(marker in str(error).lower() for marker in _AUTH_ERROR_MARKERS):
+            self._setup_agent_gemini()
+    
+    def _unavailable_result(self) -> Dict[str, Any]:
+        return {
+            'agent': self.name,
+            'analysis': "AI 模型初始化失敗，無法進行分析",
+            'recommendation': "HOLD",
+            'confidence': 0,
+            'target_price': None,
+            'risk_level': "UNKNOWN"
+        }
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        return {
+            'agent': self.name,
+            'analysis': f"分析過程中發生錯誤: {str(error)}",
+            'recommendation': "HOLD",
+            'confidence': 0,
+            'target_price': None,
+            'risk_level': "HIGH"
+        }
+    
+    def _do_call(self, prompt: str) -> Dict[str, Any]:
+        """呼叫 Gemini 並解析結果，失敗時拋出例外"""
+        self._pacer.wait()
+        if not MULTI_AGENT_SETTINGS.get('stream_responses', True):
+            response = self.llm.generate_content(prompt)
+            return self._finish_call(response.text)
+        
+        # 串流接收回應，一旦收到完整的分析 JSON 即停止等待
+        parts = []
+        result = None
+        for chunk in self.llm.generate_content(prompt, stream=True):
+            result = _feed_stream_chunk(parts, chunk)
+            if result is not None:
+                break
+        return self._finish_call(_joined_stream_text(parts), result)
     
-    def _parse_analysis_result(self, analysis_text: str) -> Dict[str, Any]:
-        """解析 AI 分析結果"""
+    async def _acall_gemini(self, prompt: str) -> Dict[str, Any]:
+        """以非同步方式呼叫 Gemini；模型不支援時改在共用執行緒池中執行"""
+        generate_async = getattr(self.llm, 'generate_content_async', None)
+        if generate_async is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), self._do_call, prompt)
+        await self._pacer.async_wait()
+        if not MULTI_AGENT_SETTINGS.get('stream_responses', True):
+            response = await generate_async(prompt)
+            return self._finish_call(response.text)
+        
+        parts = []
+        result = None
+        async for chunk in await generate_async(prompt, stream=True):
+            result = _feed_stream_chunk(parts, chunk)
+            if result is not None:
+                break
+        return self._finish_call(_joined_stream_text(parts), result)
+    
+    def _finish_call(self, analysis_text: str, parsed_json: Optional[Dict] = None) -> Dict[str, Any]:
+        """回報成功並解析模型回應（parsed_json 為串流時已解析出的 JSON）"""
+        # 報告成功使用 API（代理人特定）
+        if report_gemini_success:
+            report_gemini_success(self.name)
+        
+        # 解析分析結果
+        parsed_result = self._parse_analysis_result(analysis_text, parsed_json)
+        parsed_result['agent'] = self.name
+        parsed_result['role'] = self.role
+        parsed_result['timestamp'] = datetime.now().isoformat()
+        
+        return parsed_result
+    
+    def _create_analysis_prompt(self, stock_data: Dict, context: str, round_type: str) -> str:
+        """創建分析提示詞"""
+        header = _agent_header(self.role, self.expertise, self.investment_style)
+        stock_section = stock_data.get(_PROMPT_SECTION_KEY) or _format_stock_prompt_section(stock_data)
+        suffix = self._prompt_suffixes['initial' if round_type == "initial" else 'debate']
+        return f"{header}{stock_section}{context}\n{suffix}"
+
+    def analyze_batch(self, stocks: List[Dict]) -> List[Dict[str, Any]]:
+        """以單次 Gemini 呼叫完成多檔股票的首輪分析，回傳順序與輸入一致；缺漏的股票改為逐檔分析"""
+        if len(stocks) <= 1 or not self.llm:
+            return [self.analyze(stock_data) for stock_data in stocks]
+        
+        items = []
         try:
-            # 嘗試從文本中提取 JSON
-            start_idx = analysis_text.find('{')
-            end_idx = analysis_text.rfind('}') + 1
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = analysis_text[start_idx:end_idx]
-                result = json.loads(json_str)
-                
-                # 確保必要欄位存在
-                if 'analysis' not in result:
-                    result['analysis'] = analysis_text
-                if 'recommendation' not in result:
-                    result['recommendation'] = 'HOLD'
-                if 'confidence' not in result:
-                    result['confidence'] = 5
-                if 'risk_level' not in result:
-                    result['risk_level'] = 'MEDIUM'
-                
-                # 對於不同分析師，保留特殊的專業分析字段
-                if "芒格" in self.name:
-                    # 芒格多學科分析字段
-                    munger_fields = [
-                        'cognitive_biases_detected', 'statistical_anomalies', 'economic_moats',
-                        'systemic_risks', 'mental_models_applied', 'bias_corrections',
-                        'statistical_challenges', 'economic_logic_tests'
-                    ]
-                    for field in munger_fields:
-                        if field not in result:
-                            result[field] = []
-                
-                elif "巴菲特" in self.name:
-                    # 巴菲特價值投資分析字段
-                    buffett_fields = [
-                        'economic_moats', 'management_quality', 'financial_strength',
-                        'valuation_metrics', 'competitive_position', 'long_term_perspective',
-                        'simplicity_test', 'margin_of_safety'
-                    ]
-                    for field in buffett_fields:
-                        if field not in result:
-                            result[field] = []
-                
-                elif "成長" in self.name:
-                    # 成長價值投資分析字段
-                    growth_fields = [
-                        'growth_drivers', 'growth_quality', 'valuation_metrics',
-                        'competitive_advantages', 'risk_factors', 'growth_potential',
-                        'innovation_value', 'time_value'
-                    ]
-                    for field in growth_fields:
-                        if field not in result:
-                            result[field] = []
-                
-                elif "市場時機" in self.name:
-                    # 市場時機分析字段
-                    timing_fields = [
-                        'market_cycle', 'technical_signals', 'relative_strength',
-                        'timing_strategy', 'macro_factors', 'timing_analysis',
-                        'technical_divergence', 'market_sentiment'
-                    ]
-                    for field in timing_fields:
-                        if field not in result:
-                            result[field] = []
-                
-                elif "風險管理" in self.name:
-                    # 風險管理分析字段
-                    risk_fields = [
-                        'risk_factors', 'risk_metrics', 'portfolio_impact',
-                        'risk_adjusted_returns', 'risk_management', 'hidden_risks',
-                        'risk_quantification', 'extreme_scenarios'
-                    ]
-                    for field in risk_fields:
-                        if field not in result:
-                            result[field] = []
-                
-                return result
-            else:
-                # 如果無法解析 JSON，則手動提取關鍵資訊
-                return self._extract_key_info(analysis_text)
-                
-        except json.JSONDecodeError:
+            self._pacer.wait()
+            response = self.llm.generate_content(self._create_batch_prompt(stocks))
+            items = _loads_llm_json_array(response.text)
+            if report_gemini_success:
+                report_gemini_success(self.name)
+        except Exception as e:
+            self.logger.warning(f"{self.name} 批量分析失敗，改為逐檔分析: {e}")
+        
+        # 優先依 symbol 對應回各股票；模型未回傳 symbol 但數量相符時依順序對應
+        by_symbol = {}
+        for item in items:
+            symbol = str(item.get('symbol') or '').upper()
+            if symbol:
+                by_symbol[symbol] = item
+        use_order = len(items) == len(stocks)
+        results = []
+        for index, stock_data in enumerate(stocks):
+            item = by_symbol.get(str(stock_data.get('symbol', '')).upper())
+            if item is None and use_order and not items[index].get('symbol'):
+                item = items[index]
+            if item is None:
+                results.append(self.analyze(stock_data))
+                continue
+            parsed_result = self._parse_analysis_result(json.dumps(item, ensure_ascii=False), item)
+            parsed_result['agent'] = self.name
+            parsed_result['role'] = self.role
+            parsed_result['timestamp'] = datetime.now().isoformat()
+            results.append(parsed_result)
+        return results
+    
+    def _create_batch_prompt(self, stocks: List[Dict]) -> str:
+        """創建多檔股票首輪分析的提示詞"""
+        parts = [
+            _agent_header(self.role, self.expertise, self.investment_style),
+            f"\n請對以下 {len(stocks)} 檔股票逐一進行獨立分析：\n"
+        ]
+        for index, stock_data in enumerate(stocks, 1):
+            parts.append(f"\n=== 第 {index} 檔 ===")
+            parts.append(stock_data.get(_PROMPT_SECTION_KEY) or _format_stock_prompt_section(stock_data))
+        parts.append(self._prompt_suffixes['initial'])
+        parts.append(_BATCH_RESPONSE_INSTRUCTION.format(count=len(stocks)))
+        return "".join(parts)
+    
+    def _parse_analysis_result(self, analysis_text: str, result: Optional[Dict] = None) -> Dict[str, Any]:
+        """解析 AI 分析結果（已解析出 JSON 時直接傳入 result）"""
+        # 嘗試從文本中提取 JSON（回應含多個物件時取最大的一個）
+        if result is None:
+            result = _largest_json_object(analysis_text)
+        if result is not None:
+            # 確保必要欄位存在
+            if 'analysis' not in result:
+                result['analysis'] = analysis_text
+            if 'recommendation' not in result:
+                result['recommendation'] = 'HOLD'
+            if 'confidence' not in result:
+                result['confidence'] = 5
+            if 'risk_level' not in result:
+                result['risk_level'] = 'MEDIUM'
+            
+            # 對於不同分析師，保留特殊的專業分析字段
+            for field in _EXTRA_FIELDS.get(self._style_tag, ()):
+                result.setdefault(field, [])
+            
+            return result
+        else:
+            # 如果無法解析 JSON，則手動提取關鍵資訊
             return self._extract_key_info(analysis_text)
     
     def _extract_key_info(self, text: str) -> Dict[str, Any]:
         """從文本中提取關鍵資訊"""
-        text_upper = text.upper()
+        # 單次掃描收集出現過的標籤；BUY 與 HIGH 優先權最高，兩者皆出現即可提前結束
+        found = set()
+        for match in _KEY_INFO_RE.finditer(text):
+            found.add(_KEY_INFO_TAGS[match.group(1).upper()])
+            if 'BUY' in found and 'HIGH' in found:
+                break
         
         # 提取投資建議
-        if 'BUY' in text_upper or '買入' in text:
+        if 'BUY' in found:
             recommendation = 'BUY'
-        elif 'SELL' in text_upper or '賣出' in text:
+        elif 'SELL' in found:
             recommendation = 'SELL'
         else:
             recommendation = 'HOLD'
         
         # 提取風險等級
-        if 'HIGH' in text_upper or '高風險' in text:
+        if 'HIGH' in found:
             risk_level = 'HIGH'
-        elif 'LOW' in text_upper or '低風險' in text:
+        elif 'LOW' in found:
             risk_level = 'LOW'
         else:
             risk_level = 'MEDIUM'
@@ -2752,14 +4472,209 @@ class ValueInvestmentAgent:
             'target_price_low': None,
             'target_price_high': None,
             'risk_level': risk_level,
-            'key_points': []
+            'key_points': [],
+            _KEYWORD_FALLBACK_MARK: True
+        }
+
+
+class Rec(IntEnum):
+    """投票建議編碼：數值即計票陣列索引（BUY < HOLD < SELL 亦為同票時的決勝順序），OTHER 為非標準建議，不計票"""
+    BUY = 0
+    HOLD = 1
+    SELL = 2
+    OTHER = 3
+
+
+# 計票的建議類別（依顯示順序）
+_VOTE_RECS = (Rec.BUY, Rec.HOLD, Rec.SELL)
+
+# 投票建議類別名稱與風險等級對應分數
+_VOTE_KEYS = tuple(rec.name for rec in _VOTE_RECS)
+_RISK_SCORES = MappingProxyType({'LOW': 1, 'MEDIUM': 2, 'HIGH': 3})
+
+# 加權共識評分向量的各維度：方向（BUY=1, HOLD=0, SELL=-1）、信心度（0-1）、風險分數（1-3）
+_RUBRIC_FIELDS = ('direction', 'confidence', 'risk')
+_REC_DIRECTION = MappingProxyType({'BUY': 1.0, 'HOLD': 0.0, 'SELL': -1.0})
+
+# 代理人數達到此門檻才改用陣列計票（Numba 或 np.bincount），小型專家團隊時 Counter 開銷較低
+_PANEL_JIT_MIN_AGENTS = 32
+# 建議文字 -> Rec、風險等級的整數編碼（未知風險視為 MEDIUM）
+_REC_BY_NAME = MappingProxyType({rec.name: rec for rec in _VOTE_RECS})
+_RISK_CODES = MappingProxyType({'LOW': 0, 'MEDIUM': 1, 'HIGH': 2})
+
+
+def _count_codes_loop(codes, size):
+    """統計各整數編碼出現次數"""
+    counts = np.zeros(size, dtype=np.int64)
+    for i in range(codes.shape[0]):
+        counts[codes[i]] += 1
+    return counts
+
+
+_count_codes_jit = njit(cache=True)(_count_codes_loop) if njit else None
+
+
+def _count_codes(codes: np.ndarray, size: int) -> np.ndarray:
+    """統計編碼次數：有 Numba 時使用編譯迴圈，否則交給 np.bincount"""
+    if _count_codes_jit is not None:
+        return _count_codes_jit(codes, size)
+    return np.bincount(codes, minlength=size)
+
+
+def _parse_rec(recommendation: str) -> Rec:
+    """將標準化後的建議文字轉為 Rec（非 BUY/HOLD/SELL 為 Rec.OTHER）"""
+    return _REC_BY_NAME.get(recommendation, Rec.OTHER)
+
+
+def _votes_from_codes(codes: np.ndarray) -> Dict[str, int]:
+    """由 Rec 編碼陣列統計 BUY/HOLD/SELL 票數（Rec.OTHER 不計入）"""
+    counts = _count_codes(codes, len(Rec))
+    return {rec.name: int(counts[rec]) for rec in _VOTE_RECS}
+
+
+def _tally_votes(recommendations: List[str]) -> Dict[str, int]:
+    """統計 BUY/HOLD/SELL 票數（其他建議不計入）"""
+    if len(recommendations) >= _PANEL_JIT_MIN_AGENTS:
+        codes = np.fromiter((_parse_rec(rec) for rec in recommendations),
+                            dtype=np.int8, count=len(recommendations))
+        return _votes_from_codes(codes)
+    
+    counter = Counter(recommendations)
+    return {vote: counter[vote] for vote in _VOTE_KEYS}
+
+
+def _average_risk_score(risk_levels: List[str]) -> float:
+    """計算風險等級平均分數（LOW=1, MEDIUM=2, HIGH=3），risk_levels 不可為空"""
+    if len(risk_levels) >= _PANEL_JIT_MIN_AGENTS:
+        codes = np.fromiter((_RISK_CODES.get(level, 1) for level in risk_levels),
+                            dtype=np.int8, count=len(risk_levels))
+        counts = _count_codes(codes, 3)
+        return float(counts[0] + 2 * counts[1] + 3 * counts[2]) / len(risk_levels)
+    
+    return sum(_RISK_SCORES.get(level, 2) for level in risk_levels) / len(risk_levels)
+
+# 立場變化描述（初始建議, 最終建議）-> 說明
+_CHANGE_MAP = MappingProxyType({
+    ('BUY', 'HOLD'): "從看好轉為保守",
+    ('BUY', 'SELL'): "從看好轉為看空",
+    ('HOLD', 'BUY'): "從保守轉為看好",
+    ('HOLD', 'SELL'): "從保守轉為看空",
+    ('SELL', 'HOLD'): "從看空轉為保守",
+    ('SELL', 'BUY'): "從看空轉為看好"
+})
+
+# 用於推測立場變化原因的關鍵詞（依輸出優先順序排列）
+_REASONING_KEYWORDS = (
+    ('風險', '風險考量'),
+    ('估值', '估值重新評估'),
+    ('財務', '財務狀況變化'),
+    ('市場', '市場環境變化'),
+    ('競爭', '競爭格局考量'),
+    ('成長', '成長前景重評'),
+)
+
+
+
+@lru_cache(maxsize=512)
+def _describe_position_change(initial_rec: str, final_rec: str,
+                              initial_reasoning: str, final_reasoning: str) -> str:
+    """描述立場變化與推測原因（純函式，多輪辯論中相同論述直接沿用結果）"""
+    change_desc = _CHANGE_MAP.get((initial_rec, final_rec)) or f"從{initial_rec}改為{final_rec}"
+    
+    # 簡單的關鍵詞分析來推測變化原因：取最終論述新出現的前兩個關鍵詞（只有最終論述命中時才掃描初始論述）
+    reasons = []
+    for keyword, reason in _REASONING_KEYWORDS:
+        if keyword in final_reasoning and keyword not in initial_reasoning:
+            reasons.append(reason)
+            if len(reasons) >= 2:
+                break
+    
+    if reasons:
+        return f"{change_desc}，主要因為：{', '.join(reasons)}"
+    else:
+        return f"{change_desc}，基於辯論中的新觀點"
+
+
+def _as_confidence(value) -> float:
+    """將代理人回傳的信心度轉為浮點數，無法轉換時視為預設值 5"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 5.0
+
+
+def _number_or(value, default: float):
+    """數值欄位防呆：非數字（含 None、bool）時回傳預設值"""
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else default
+
+
+def _confidence_value(value: float):
+    """輸出用信心度：整數值以 int 呈現，與模型原始回傳格式一致"""
+    return int(value) if value.is_integer() else value
+
+
+@dataclass
+class AgentPositions:
+    """代理人最終立場（以代理人索引對齊的平行陣列），JSON 輸出時才轉回字典"""
+    names: List[str]
+    rec: np.ndarray        # int8 建議編碼（Rec）
+    conf: np.ndarray       # float64 信心度
+    labels: List[str]      # 標準化後的建議文字（非標準建議保留大寫原文）
+    
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """代理人 -> {'recommendation', 'confidence'}（API/報告輸出格式）"""
+        return {
+            name: {'recommendation': label, 'confidence': _confidence_value(conf)}
+            for name, label, conf in zip(self.names, self.labels, self.conf.tolist())
         }
+    
+    def confidence_scores(self) -> Dict[str, Any]:
+        """代理人 -> 信心度（API/報告輸出格式）"""
+        return {name: _confidence_value(conf) for name, conf in zip(self.names, self.conf.tolist())}
+
 
+@dataclass
+class DebateFeatures:
+    """單趟彙整代理人回應的欄位，供計票、共識論點與風險評估共用"""
+    positions: AgentPositions
+    risk_levels: List[str]
+    key_points: List[Tuple[Any, Any]]      # (原始建議, 論點列表)，依代理人順序
+
+
+def _collect_debate_features(responses: Dict[str, Dict]) -> DebateFeatures:
+    """一次走訪代理人回應，取出下游計票、共識與風險評估所需的欄位"""
+    n = len(responses)
+    names = []
+    labels = []
+    rec = np.empty(n, dtype=np.int8)
+    conf = np.empty(n, dtype=np.float64)
+    risk_levels = []
+    key_points = []
+    for i, (agent_name, response) in enumerate(responses.items()):
+        raw_recommendation = response.get('recommendation', 'HOLD')
+        # 模型通常已回傳標準大寫建議，只有不在 _VOTE_KEYS 中時才轉大寫
+        recommendation = raw_recommendation if raw_recommendation in _VOTE_KEYS else raw_recommendation.upper()
+        names.append(agent_name)
+        labels.append(recommendation)
+        rec[i] = _parse_rec(recommendation)
+        conf[i] = _as_confidence(response.get('confidence', 5))
+        risk_levels.append(response.get('risk_level', 'MEDIUM'))
+        key_points.append((response.get('recommendation'), response.get('key_points', ())))
+    return DebateFeatures(AgentPositions(names, rec, conf, labels), risk_levels, key_points)
 
 # 新增多代理人辯論功能到增強分析器
 class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
     """增強版股票分析器 - 包含多代理人辯論功能"""
     
+    # 代理人名稱 -> 狀態管理器鍵值
+    _AGENT_KEY_MAP = MappingProxyType({
+        '巴菲特派價值投資師': 'fundamentals_analyst',
+        '芒格多學科分析師': 'munger_analyst',
+        '成長價值投資師': 'bull_researcher',
+        '市場時機分析師': 'market_analyst',
+        '風險管理專家': 'risk_manager'
+    })
+    
     def __init__(self, enable_debate: bool = None, status_manager=None):
         super().__init__()
         
@@ -2782,6 +4697,27 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
                 self.enable_debate = False
         else:
             self.agents = []
+        # 專家人數於初始化後固定，計票時直接使用
+        self._n_agents = len(self.agents)
+        
+        # 常用的辯論設定於初始化時讀取一次
+        self._enable_concurrent = MULTI_AGENT_SETTINGS.get('enable_concurrent', True)
+        self._use_asyncio = MULTI_AGENT_SETTINGS.get('use_asyncio', True)
+        self._max_workers = MULTI_AGENT_SETTINGS.get('max_concurrent_analysis', 3)
+        self._debate_rounds = MULTI_AGENT_SETTINGS.get('debate_rounds', 2)
+        self._early_stop = MULTI_AGENT_SETTINGS.get('early_stop', True)
+        self._consensus_tau = MULTI_AGENT_SETTINGS.get('consensus_threshold', 0.7)
+        self._enable_prompt_cache = MULTI_AGENT_SETTINGS.get('enable_prompt_cache', True)
+        self._agent_batch_size = max(1, MULTI_AGENT_SETTINGS.get('agent_batch_size', 5))
+    
+    def _new_prompt_cache(self) -> Optional[Dict[bytes, Dict]]:
+        """建立單次股票分析專用的提示詞回應快取（相同提示詞不重複呼叫 Gemini），未啟用時回傳 None
+        
+        快取隨每次分析建立並逐層傳遞，多執行緒同時分析不同股票時互不干擾
+        """
+        if self._enable_prompt_cache:
+            return {}
+        return None
     
     def _initialize_agents(self) -> List[ValueInvestmentAgent]:
         """初始化代理人團隊"""
@@ -2819,7 +4755,8 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
         ]
         return agents
     
-    def _analyze_agent_concurrent(self, agent, stock_data, context, round_type, agent_index, total_agents, stock_symbol):
+    def _analyze_agent_concurrent(self, agent, stock_data, context, round_type, agent_index, total_agents, stock_symbol,
+                                  prompt_cache=None):
         """並發執行單個 Agent 分析的輔助方法"""
         try:
             # 更新當前分析的專家（線程安全）
@@ -2832,7 +4769,7 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
                 )
             
             # 執行分析
-            analysis_result = agent.analyze(stock_data, context, round_type)
+            analysis_result = agent.analyze(stock_data, context, round_type, prompt_cache)
             
             # 添加 agent 名稱到結果中
             analysis_result['agent_name'] = agent.name
@@ -2852,63 +4789,114 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
                 'error': str(e)
             }
     
-    def _analyze_agents_concurrently(self, stock_data, context="", round_type="initial", max_workers=None):
-        """並發執行多個 Agent 分析"""
+    async def _analyze_agents_async(self, stock_data, context="", round_type="initial", max_concurrency=None,
+                                    prompt_cache=None):
+        """於事件迴圈中同時執行所有 Agent 分析，回傳 {代理人名稱: 結果}"""
+        semaphore = asyncio.Semaphore(max_concurrency or len(self.agents))
+        stock_symbol = stock_data.get('symbol', 'Unknown')
+        total_agents = self._n_agents
+        
+        async def run(agent, agent_index):
+            async with semaphore:
+                # 更新當前分析的專家
+                if self.status_manager:
+                    self.status_manager.update_status(
+                        agent=self._map_agent_to_key(agent.name),
+                        step=f'專家分析 ({agent_index+1}/{total_agents})',
+                        message=f'{agent.name} 正在分析 {stock_symbol}...',
+                        progress=55 + (agent_index * 5)
+                    )
+                return await agent.aanalyze(stock_data, context, round_type, prompt_cache)
+        
+        outcomes = await asyncio.gather(
+            *(run(agent, i) for i, agent in enumerate(self.agents)),
+            return_exceptions=True
+        )
+        
+        results = {}
+        for agent, outcome in zip(self.agents, outcomes):
+            if isinstance(outcome, BaseException):
+                logging.error(f"{agent.name} 並發分析失敗: {outcome}")
+                results[agent.name] = {
+                    'recommendation': 'HOLD',
+                    'confidence': 0,
+                    'analysis': f'分析失敗: {outcome}',
+                    'risk_level': 'UNKNOWN',
+                    'error': str(outcome)
+                }
+            else:
+                results[agent.name] = outcome
+        
+        logging.info(f"完成 {total_agents} 位專家的非同步分析")
+        return results
+    
+    def _analyze_agents_concurrently(self, stock_data, context="", round_type="initial", max_workers=None,
+                                     prompt_cache=None):
+        """並發執行多個 Agent 分析（prompt_cache 為本次股票分析的提示詞回應快取）"""
         if not self.agents:
             return {}
         
         # 檢查是否啟用並發模式
-        if not MULTI_AGENT_SETTINGS.get('enable_concurrent', True):
+        if not self._enable_concurrent:
             logging.info("並發模式未啟用，使用順序執行")
-            return self._analyze_agents_sequentially(stock_data, context, round_type)
+            return self._analyze_agents_sequentially(stock_data, context, round_type, prompt_cache)
         
         # 設定最大執行緒數，預設為 Agent 數量但不超過設定值
         if max_workers is None:
-            max_workers = min(len(self.agents), MULTI_AGENT_SETTINGS.get('max_concurrent_analysis', 3))
+            max_workers = min(len(self.agents), self._max_workers)
+        
+        # 以單一事件迴圈同時驅動所有代理人的 Gemini 請求
+        if self._use_asyncio:
+            logging.info(f"使用非同步模式分析，最大並發數: {max_workers}")
+            future = asyncio.run_coroutine_threadsafe(
+                self._analyze_agents_async(stock_data, context, round_type, max_workers, prompt_cache),
+                _get_agent_loop()
+            )
+            return future.result()
         
         stock_symbol = stock_data.get('symbol', 'Unknown')
         results = {}
         
         logging.info(f"使用並發模式分析，最大執行緒數: {max_workers}")
         
-        # 使用 ThreadPoolExecutor 進行並發分析
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交所有 Agent 分析任務
-            future_to_agent = {
-                executor.submit(
-                    self._analyze_agent_concurrent,
-                    agent, stock_data, context, round_type,
-                    i, len(self.agents), stock_symbol
-                ): agent for i, agent in enumerate(self.agents)
-            }
+        # 使用代理人共用的執行緒池進行並發分析，避免每輪重建執行緒
+        executor = ValueInvestmentAgent._get_pool()
+        # 提交所有 Agent 分析任務
+        future_to_agent = {
+            executor.submit(
+                self._analyze_agent_concurrent,
+                agent, stock_data, context, round_type,
+                i, len(self.agents), stock_symbol, prompt_cache
+            ): agent for i, agent in enumerate(self.agents)
+        }
+        
+        # 收集結果
+        completed_count = 0
+        for future in as_completed(future_to_agent):
+            agent = future_to_agent[future]
+            completed_count += 1
             
-            # 收集結果
-            completed_count = 0
-            for future in as_completed(future_to_agent):
-                agent = future_to_agent[future]
-                completed_count += 1
+            try:
+                result = future.result()
+                agent_name = result.pop('agent_name')
+                agent_index = result.pop('agent_index', 0)
+                results[agent_name] = result
                 
-                try:
-                    result = future.result()
-                    agent_name = result.pop('agent_name')
-                    agent_index = result.pop('agent_index', 0)
-                    results[agent_name] = result
-                    
-                    logging.info(f"完成 {agent_name} 分析 ({completed_count}/{len(self.agents)})")
-                    
-                except Exception as e:
-                    logging.error(f"{agent.name} 並發分析任務失敗: {e}")
-                    results[agent.name] = {
-                        'recommendation': 'HOLD',
-                        'confidence': 0,
-                        'analysis': f'任務失敗: {e}',
-                        'risk_level': 'UNKNOWN',
-                        'error': str(e)
-                    }
+                logging.info(f"完成 {agent_name} 分析 ({completed_count}/{len(self.agents)})")
+                
+            except Exception as e:
+                logging.error(f"{agent.name} 並發分析任務失敗: {e}")
+                results[agent.name] = {
+                    'recommendation': 'HOLD',
+                    'confidence': 0,
+                    'analysis': f'任務失敗: {e}',
+                    'risk_level': 'UNKNOWN',
+                    'error': str(e)
+                }
         
         return results
     
-    def _analyze_agents_sequentially(self, stock_data, context="", round_type="initial"):
+    def _analyze_agents_sequentially(self, stock_data, context="", round_type="initial", prompt_cache=None):
         """順序執行多個 Agent 分析（備用方法）"""
         if not self.agents:
             return {}
@@ -2929,14 +4917,11 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
                         progress=55 + (i * 5)
                     )
                 
-                analysis_result = agent.analyze(stock_data, context, round_type)
+                analysis_result = agent.analyze(stock_data, context, round_type, prompt_cache)
                 results[agent.name] = analysis_result
                 
                 logging.info(f"完成 {agent.name} 分析 ({i+1}/{len(self.agents)})")
                 
-                # API 限制延遲
-                time.sleep(GEMINI_SETTINGS.get('rate_limit_delay', 3))
-                
             except Exception as e:
                 logging.error(f"{agent.name} 分析失敗: {e}")
                 results[agent.name] = {
@@ -2951,17 +4936,46 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
     
     def _map_agent_to_key(self, agent_name: str) -> str:
         """將代理人名稱映射到狀態管理器的鍵值"""
-        agent_mapping = {
-            '巴菲特派價值投資師': 'fundamentals_analyst',
-            '芒格多學科分析師': 'munger_analyst',
-            '成長價值投資師': 'bull_researcher',
-            '市場時機分析師': 'market_analyst',
-            '風險管理專家': 'risk_manager'
-        }
-        return agent_mapping.get(agent_name, 'research_manager')
+        return self._AGENT_KEY_MAP.get(agent_name, 'research_manager')
+    
+    def analyze_stocks_batch(self, stocks: List[Dict], include_debate: bool = None) -> List[Dict[str, Any]]:
+        """批量綜合分析多檔股票：各代理人以合併提示詞一次完成多檔的首輪分析，再逐檔辯論"""
+        if include_debate is None:
+            include_debate = self.enable_debate
+        if not (include_debate and self.enable_debate and self.agents) or len(stocks) <= 1:
+            return [self.analyze_stock_comprehensive(stock_data, include_debate) for stock_data in stocks]
+        
+        batch_size = self._agent_batch_size
+        results = []
+        for offset in range(0, len(stocks), batch_size):
+            chunk = stocks[offset:offset + batch_size]
+            
+            # 各代理人並行處理整批股票
+            pool = ValueInvestmentAgent._get_pool()
+            futures = [(agent, pool.submit(agent.analyze_batch, chunk)) for agent in self.agents]
+            initial_by_stock = [{} for _ in chunk]
+            for agent, future in futures:
+                try:
+                    agent_results = future.result()
+                except Exception as e:
+                    # 批量失敗時改為逐檔分析，確保每檔股票的首輪分析都包含全部代理人
+                    logging.error(f"{agent.name} 批量分析失敗，改為逐檔分析: {e}")
+                    agent_results = [agent.analyze(stock_data) for stock_data in chunk]
+                for index, agent_result in enumerate(agent_results):
+                    initial_by_stock[index][agent.name] = agent_result
+            
+            for stock_data, initial_analyses in zip(chunk, initial_by_stock):
+                results.append(self.analyze_stock_comprehensive(
+                    stock_data, include_debate, initial_analyses=initial_analyses
+                ))
+        return results
     
-    def analyze_stock_comprehensive(self, stock_data: Dict, include_debate: bool = None) -> Dict[str, Any]:
-        """執行股票的綜合分析，包含多代理人辯論（如果啟用）"""
+    def analyze_stock_comprehensive(self, stock_data: Dict, include_debate: bool = None,
+                                    initial_analyses: Optional[Dict[str, Dict]] = None) -> Dict[str, Any]:
+        """執行股票的綜合分析，包含多代理人辯論（如果啟用）
+
+        initial_analyses 為已完成的首輪專家分析 {代理人名稱: 結果}，提供時辯論不再重新執行首輪。
+        """
         stock_symbol = stock_data.get('symbol', 'Unknown')
         
         # 更新狀態：開始綜合分析
@@ -2993,13 +5007,20 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
                         progress=50
                     )
                 
-                debate_result = self.conduct_multi_agent_debate(stock_data)
+                debate_result = self.conduct_multi_agent_debate(
+                    stock_data, initial_analyses=initial_analyses, prompt_cache=self._new_prompt_cache()
+                )
                 
                 # 整合辯論結果到基礎分析中
                 base_analysis['multi_agent_debate'] = debate_result
-                base_analysis['integrated_recommendation'] = self._integrate_analyses(
-                    base_analysis, debate_result
-                )
+                # 辯論共識剛完成，沿用其時間戳記；整合失敗時保留已完成的辯論結果
+                try:
+                    base_analysis['integrated_recommendation'] = self._integrate_analyses(
+                        base_analysis, debate_result, debate_result['final_consensus'].get('timestamp')
+                    )
+                except Exception as integrate_error:
+                    logging.error(f"整合分析失敗: {integrate_error}")
+                    base_analysis['integrated_recommendation'] = {'error': str(integrate_error)}
                 
                 # 更新狀態：完成分析
                 if self.status_manager:
@@ -3016,12 +5037,23 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
         
         return base_analysis
     
-    def conduct_multi_agent_debate(self, stock_data: Dict, rounds: int = None) -> Dict[str, Any]:
-        """進行多代理人辯論分析"""
+    def conduct_multi_agent_debate(self, stock_data: Dict, rounds: int = None,
+                                   initial_analyses: Optional[Dict[str, Dict]] = None,
+                                   prompt_cache: Optional[Dict[bytes, Dict]] = None) -> Dict[str, Any]:
+        """進行多代理人辯論分析（initial_analyses 為已完成的首輪分析；
+        prompt_cache 為本次分析的提示詞回應快取，未提供時自行建立）
+        """
         if rounds is None:
-            rounds = MULTI_AGENT_SETTINGS.get('debate_rounds', 2)
+            rounds = self._debate_rounds
+        if prompt_cache is None:
+            prompt_cache = self._new_prompt_cache()
+        
+        # 股票資訊區段對所有代理人與輪次相同，於副本中只格式化一次
+        stock_data = {**stock_data, _PROMPT_SECTION_KEY: _format_stock_prompt_section(stock_data)}
         
         stock_symbol = stock_data.get('symbol', 'Unknown')
+        # 本次辯論只讀取一次時間，供辯論結果與最終共識共用
+        now_iso = datetime.now().isoformat()
         
         debate_result = {
             'symbol': stock_data.get('symbol'),
@@ -3031,7 +5063,7 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
             'final_consensus': {},
             'voting_results': {},
             'debate_summary': "",
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_iso
         }
         
         # 第一輪：各代理人獨立分析（並發執行）
@@ -3045,12 +5077,16 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
                 progress=55
             )
         
-        # 使用並發分析方法
-        start_time = time.time()
-        concurrent_results = self._analyze_agents_concurrently(stock_data, "", "initial")
-        end_time = time.time()
-        
-        logging.info(f"並發分析完成，耗時: {end_time - start_time:.2f} 秒")
+        if initial_analyses:
+            # 首輪分析已由批量呼叫完成
+            concurrent_results = initial_analyses
+        else:
+            # 使用並發分析方法
+            start_time = time.time()
+            concurrent_results = self._analyze_agents_concurrently(stock_data, "", "initial", prompt_cache=prompt_cache)
+            end_time = time.time()
+            
+            logging.info(f"並發分析完成，耗時: {end_time - start_time:.2f} 秒")
         
         # 處理並發分析結果
         for agent_name, analysis_result in concurrent_results.items():
@@ -3085,6 +5121,11 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
         
         # 進行辯論輪次
         context = self._build_context_from_analyses(debate_result['agents_analysis'])
+        early_stop = self._early_stop
+        previous_positions = {
+            agent_name: (data.get('initial_recommendation'), data.get('initial_confidence'))
+            for agent_name, data in debate_result['agents_analysis'].items()
+        }
         
         for round_num in range(1, rounds + 1):
             logging.info(f"第{round_num + 1}輪：辯論與反駁")
@@ -3097,27 +5138,45 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
                     progress=70 + (round_num * 5)
                 )
             
-            round_result = self._conduct_debate_round(stock_data, context, round_num)
+            round_result = self._conduct_debate_round(stock_data, context, round_num, prompt_cache)
             debate_result['debate_rounds'].append(round_result)
+            
+            # 記錄本輪一致程度（最多票建議的票數 / 專家總數）
+            round_result['agreement'] = agreement = self._round_agreement(round_result)
+            logging.info(
+                f"第{round_num}輪一致程度 {agreement:.2f}"
+                f"（{'已' if agreement >= self._consensus_tau else '未'}達共識門檻 {self._consensus_tau:.2f}）"
+            )
+            
+            # 所有專家意見一致且信心度幾乎未變動時，後續輪次不會再改變結論
+            if early_stop and round_num < rounds and self._round_converged(previous_positions, round_result):
+                logging.info(f"第{round_num}輪後專家意見已收斂，略過剩餘 {rounds - round_num} 輪辯論")
+                break
+            previous_positions = {
+                agent_name: (response.get('recommendation'), response.get('confidence'))
+                for agent_name, response in round_result['agent_responses'].items()
+            }
             context = self._update_context(context, round_result)
         
         # 更新每個agent的最終立場
         if debate_result['debate_rounds']:
             final_round = debate_result['debate_rounds'][-1]
+            agents_analysis = debate_result['agents_analysis']
             for agent_name, final_response in final_round.get('agent_responses', {}).items():
-                if agent_name in debate_result['agents_analysis']:
-                    agent_data = debate_result['agents_analysis'][agent_name]
-                    
+                agent_data = agents_analysis.get(agent_name)
+                if agent_data is not None:
                     # 保存最終立場
                     initial_rec = agent_data.get('initial_recommendation', 'HOLD')
                     final_rec = final_response.get('recommendation', 'HOLD')
                     
-                    agent_data['recommendation'] = final_rec
-                    agent_data['confidence'] = final_response.get('confidence', 5)
-                    agent_data['reasoning'] = final_response.get('analysis', '')
-                    agent_data['risk_level'] = final_response.get('risk_level', 'MEDIUM')
+                    agent_data.update(
+                        recommendation=final_rec,
+                        confidence=final_response.get('confidence', 5),
+                        reasoning=final_response.get('analysis', ''),
+                        risk_level=final_response.get('risk_level', 'MEDIUM')
+                    )
                     
-                    # 分析立場變化原因
+                    # 分析立場變化原因（本地關鍵詞比對，不需呼叫 Gemini）
                     if initial_rec != final_rec:
                         change_analysis = self._analyze_position_change(
                             agent_name, initial_rec, final_rec,
@@ -3135,14 +5194,17 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
                 progress=85
             )
         
+        # 最後一輪回應只走訪一次，計票、共識論點與風險評估共用彙整結果
+        debate_rounds = debate_result['debate_rounds']
+        features = _collect_debate_features(debate_rounds[-1]['agent_responses']) if debate_rounds else None
         debate_result['voting_results'] = self._calculate_voting_results(
-            debate_result['agents_analysis'], debate_result['debate_rounds']
+            debate_result['agents_analysis'], debate_rounds, features
         )
         
         # 生成最終共識
         debate_result['final_consensus'] = self._generate_final_consensus(
             stock_data, debate_result['agents_analysis'], 
-            debate_result['debate_rounds'], debate_result['voting_results']
+            debate_rounds, debate_result['voting_results'], now_iso, features
         )
         
         # 生成辯論摘要
@@ -3152,17 +5214,20 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
     
     def _build_context_from_analyses(self, analyses: Dict) -> str:
         """從各代理人分析中建構背景資訊"""
-        context = "=== 各專家的初步分析觀點 ===\n\n"
-        for agent_name, analysis_data in analyses.items():
-            context += f"【{agent_name}】({analysis_data.get('role', 'N/A')}):\n"
-            context += f"投資建議: {analysis_data.get('recommendation', 'N/A')}\n"
-            context += f"信心程度: {analysis_data.get('confidence', 'N/A')}/10\n"
-            context += f"風險等級: {analysis_data.get('risk_level', 'N/A')}\n"
-            context += f"分析要點: {analysis_data.get('analysis', 'N/A')[:200]}...\n\n"
-        return context
-    
-    def _conduct_debate_round(self, stock_data: Dict, context: str, round_num: int) -> Dict:
-        """進行一輪辯論"""
+        parts = ["=== 各專家的初步分析觀點 ===\n\n"]
+        parts.extend(
+            f"【{agent_name}】({analysis_data.get('role', 'N/A')}):\n"
+            f"投資建議: {analysis_data.get('recommendation', 'N/A')}\n"
+            f"信心程度: {analysis_data.get('confidence', 'N/A')}/10\n"
+            f"風險等級: {analysis_data.get('risk_level', 'N/A')}\n"
+            f"分析要點: {analysis_data.get('analysis', 'N/A')[:200]}...\n\n"
+            for agent_name, analysis_data in analyses.items()
+        )
+        return "".join(parts)
+    
+    def _conduct_debate_round(self, stock_data: Dict, context: str, round_num: int,
+                              prompt_cache: Optional[Dict[bytes, Dict]] = None) -> Dict:
+        """進行一輪辯論（prompt_cache 為本次分析的提示詞回應快取）"""
         round_result = {
             'round': round_num,
             'timestamp': datetime.now().isoformat(),
@@ -3186,7 +5251,8 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
         
         # 使用並發分析進行辯論輪次
         start_time = time.time()
-        concurrent_responses = self._analyze_agents_concurrently(stock_data, debate_context, "debate")
+        concurrent_responses = self._analyze_agents_concurrently(stock_data, debate_context, "debate",
+                                                                 prompt_cache=prompt_cache)
         end_time = time.time()
         
         logging.info(f"第{round_num}輪辯論並發執行完成，耗時: {end_time - start_time:.2f} 秒")
@@ -3200,182 +5266,153 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
         
         return round_result
     
+    def _round_agreement(self, round_result: Dict) -> float:
+        """計算單輪辯論的一致程度：最多票建議的票數佔全體專家的比例"""
+        total_agents = self._n_agents
+        if not total_agents:
+            return 0.0
+        votes = _tally_votes([
+            str(response.get('recommendation', 'HOLD')).upper()
+            for response in round_result.get('agent_responses', {}).values()
+        ])
+        return max(votes.values()) / total_agents
+    
+    @staticmethod
+    def _round_converged(previous_positions: Dict[str, Tuple], round_result: Dict) -> bool:
+        """判斷本輪是否已收斂：所有專家皆有回應、建議一致，且信心度變動不超過 1"""
+        responses = round_result.get('agent_responses', {})
+        if not responses or responses.keys() != previous_positions.keys():
+            return False
+        if len({response.get('recommendation') for response in responses.values()}) != 1:
+            return False
+        for agent_name, response in responses.items():
+            try:
+                if abs(float(response.get('confidence')) - float(previous_positions[agent_name][1])) > 1:
+                    return False
+            except (TypeError, ValueError):
+                return False
+        return True
+    
     def _update_context(self, current_context: str, round_result: Dict) -> str:
         """更新辯論背景資訊"""
-        new_context = current_context + f"\n\n=== 第{round_result['round']}輪辯論結果 ===\n"
-        for agent_name, response in round_result['agent_responses'].items():
-            recommendation = response.get('recommendation', 'N/A')
-            confidence = response.get('confidence', 'N/A')
-            new_context += f"\n【{agent_name}】更新觀點：{recommendation} (信心度: {confidence}/10)\n"
-            new_context += f"主要論點: {response.get('analysis', 'N/A')[:150]}...\n"
-        return new_context
+        parts = [current_context, f"\n\n=== 第{round_result['round']}輪辯論結果 ===\n"]
+        parts.extend(
+            f"\n【{agent_name}】更新觀點：{response.get('recommendation', 'N/A')} "
+            f"(信心度: {response.get('confidence', 'N/A')}/10)\n"
+            f"主要論點: {response.get('analysis', 'N/A')[:150]}...\n"
+            for agent_name, response in round_result['agent_responses'].items()
+        )
+        return "".join(parts)
     
     def _analyze_position_change(self, agent_name: str, initial_rec: str, final_rec: str, 
                                 initial_reasoning: str, final_reasoning: str) -> str:
         """分析專家立場變化的原因"""
         if initial_rec == final_rec:
             return "立場保持一致"
-        
-        change_map = {
-            ('BUY', 'HOLD'): "從看好轉為保守",
-            ('BUY', 'SELL'): "從看好轉為看空", 
-            ('HOLD', 'BUY'): "從保守轉為看好",
-            ('HOLD', 'SELL'): "從保守轉為看空",
-            ('SELL', 'HOLD'): "從看空轉為保守", 
-            ('SELL', 'BUY'): "從看空轉為看好"
-        }
-        
-        change_desc = change_map.get((initial_rec, final_rec), f"從{initial_rec}改為{final_rec}")
-        
-        # 簡單的關鍵詞分析來推測變化原因
-        reasoning_keywords = {
-            '風險': '風險考量',
-            '估值': '估值重新評估', 
-            '財務': '財務狀況變化',
-            '市場': '市場環境變化',
-            '競爭': '競爭格局考量',
-            '成長': '成長前景重評'
-        }
-        
-        reasons = []
-        for keyword, reason in reasoning_keywords.items():
-            if keyword in final_reasoning and keyword not in initial_reasoning:
-                reasons.append(reason)
-        
-        if reasons:
-            return f"{change_desc}，主要因為：{', '.join(reasons[:2])}"
-        else:
-            return f"{change_desc}，基於辯論中的新觀點"
+        if isinstance(initial_reasoning, str) and isinstance(final_reasoning, str):
+            return _describe_position_change(initial_rec, final_rec, initial_reasoning, final_reasoning)
+        return _describe_position_change.__wrapped__(initial_rec, final_rec, initial_reasoning, final_reasoning)
     
-    def _calculate_voting_results(self, initial_analyses: Dict, debate_rounds: List) -> Dict:
-        """計算投票結果"""
+    def _calculate_voting_results(self, initial_analyses: Dict, debate_rounds: List,
+                                  features: Optional[DebateFeatures] = None) -> Dict:
+        """計算投票結果（features 為最後一輪回應的彙整結果，未提供時自行彙整）"""
         voting_data = {
             'buy_votes': 0,
             'hold_votes': 0,
             'sell_votes': 0,
-            'initial_votes': {'BUY': 0, 'HOLD': 0, 'SELL': 0},
-            'final_votes': {'BUY': 0, 'HOLD': 0, 'SELL': 0},
+            'initial_votes': dict.fromkeys(_VOTE_KEYS, 0),
+            'final_votes': dict.fromkeys(_VOTE_KEYS, 0),
             'confidence_scores': {},
             'consensus_level': 0,
             'agent_final_positions': {}
         }
         
         # 統計初始投票
-        for agent_name, analysis in initial_analyses.items():
-            recommendation = analysis.get('recommendation', 'HOLD').upper()
-            if recommendation in voting_data['initial_votes']:
-                voting_data['initial_votes'][recommendation] += 1
-        
-        # 統計最終投票（取最後一輪的結果或初始分析）
-        final_positions = {}
-        
-        if debate_rounds:
-            # 使用最後一輪辯論結果
-            final_round = debate_rounds[-1]
-            for agent_name, response in final_round.get('agent_responses', {}).items():
-                recommendation = response.get('recommendation', 'HOLD').upper()
-                confidence = response.get('confidence', 5)
-                
-                final_positions[agent_name] = {
-                    'recommendation': recommendation,
-                    'confidence': confidence
-                }
-        else:
-            # 如果沒有辯論輪次，使用初始分析
-            for agent_name, analysis in initial_analyses.items():
-                recommendation = analysis.get('recommendation', 'HOLD').upper()
-                confidence = analysis.get('confidence', 5)
-                
-                final_positions[agent_name] = {
-                    'recommendation': recommendation,
-                    'confidence': confidence
-                }
-        
-        # 統計最終票數
-        for agent_name, position in final_positions.items():
-            recommendation = position['recommendation']
-            confidence = position['confidence']
-            
-            if recommendation in voting_data['final_votes']:
-                voting_data['final_votes'][recommendation] += 1
-                
-            # 設置標準化的票數欄位（用於前端顯示）
-            if recommendation == 'BUY':
-                voting_data['buy_votes'] += 1
-            elif recommendation == 'HOLD':
-                voting_data['hold_votes'] += 1
-            elif recommendation == 'SELL':
-                voting_data['sell_votes'] += 1
-                
-            voting_data['confidence_scores'][agent_name] = confidence
-            voting_data['agent_final_positions'][agent_name] = position
-        
-        # 計算共識程度
-        total_agents = len(self.agents)
-        max_votes = max(voting_data['final_votes'].values()) if voting_data['final_votes'] else 0
+        # 模型通常已回傳標準大寫建議，只有不在 _VOTE_KEYS 中時才轉大寫
+        voting_data['initial_votes'] = _tally_votes([
+            recommendation if recommendation in _VOTE_KEYS else recommendation.upper()
+            for recommendation in (analysis.get('recommendation', 'HOLD') for analysis in initial_analyses.values())
+        ])
+        
+        # 統計最終投票（取最後一輪的結果，沒有辯論輪次時使用初始分析）
+        if features is None:
+            features = _collect_debate_features(
+                debate_rounds[-1].get('agent_responses', {}) if debate_rounds else initial_analyses
+            )
+        positions = features.positions
+        voting_data['agent_final_positions'] = positions.to_dict()
+        voting_data['confidence_scores'] = positions.confidence_scores()
+        
+        final_votes = _votes_from_codes(positions.rec)
+        voting_data['final_votes'] = final_votes
+        # 設置標準化的票數欄位（用於前端顯示）
+        voting_data['buy_votes'] = final_votes['BUY']
+        voting_data['hold_votes'] = final_votes['HOLD']
+        voting_data['sell_votes'] = final_votes['SELL']
+        
+        # 計算共識程度（只計入 BUY/HOLD/SELL 三種標準建議）
+        total_agents = self._n_agents
+        max_votes = max(final_votes.values())
         voting_data['consensus_level'] = max_votes / total_agents if total_agents > 0 else 0
+        voting_data['consensus_reached'] = voting_data['consensus_level'] >= self._consensus_tau
         
         return voting_data
     
     def _generate_final_consensus(self, stock_data: Dict, analyses: Dict, 
-                                debate_rounds: List, voting_results: Dict) -> Dict:
-        """生成最終投資共識"""
-        # 找出最多票的建議
+                                debate_rounds: List, voting_results: Dict,
+                                now_iso: Optional[str] = None,
+                                features: Optional[DebateFeatures] = None) -> Dict:
+        """生成最終投資共識（now_iso 為呼叫端已取得的時間戳記，features 為最後一輪回應的彙整結果）"""
+        # 找出最多票的建議；依 _VOTE_KEYS 固定順序比較，同票時取字典序最小者（BUY < HOLD < SELL）
         final_votes = voting_results['final_votes']
-        consensus_recommendation = max(final_votes, key=final_votes.get)
+        consensus_recommendation = max(_VOTE_KEYS, key=final_votes.__getitem__)
         
         # 計算平均信心度
         confidence_scores = voting_results['confidence_scores']
         avg_confidence = sum(confidence_scores.values()) / len(confidence_scores) if confidence_scores else 5
         
-        # 收集支持共識的主要論點
+        # 收集支持共識的主要論點（取前5個支持、前3個反對論點，額滿後不再複製）
         supporting_points = []
         opposing_points = []
         
         if debate_rounds:
-            final_round = debate_rounds[-1]
-            for agent_name, response in final_round['agent_responses'].items():
-                if response.get('recommendation') == consensus_recommendation:
-                    key_points = response.get('key_points', [])
-                    supporting_points.extend(key_points)
-                else:
-                    key_points = response.get('key_points', [])
-                    opposing_points.extend(key_points)
+            if features is None:
+                features = _collect_debate_features(debate_rounds[-1]['agent_responses'])
+            supporting_points = list(islice(chain.from_iterable(
+                points for recommendation, points in features.key_points
+                if recommendation == consensus_recommendation
+            ), 5))
+            opposing_points = list(islice(chain.from_iterable(
+                points for recommendation, points in features.key_points
+                if recommendation != consensus_recommendation
+            ), 3))
         
         return {
             'final_recommendation': consensus_recommendation,
             'consensus_level': voting_results['consensus_level'],
+            'consensus_reached': voting_results['consensus_reached'],
             'average_confidence': round(avg_confidence, 1),
             'vote_distribution': final_votes,
-            'supporting_points': supporting_points[:5],  # 取前5個支持論點
-            'opposing_points': opposing_points[:3],      # 取前3個反對論點
-            'risk_assessment': self._assess_overall_risk_from_debate(analyses, debate_rounds),
-            'timestamp': datetime.now().isoformat()
+            'supporting_points': supporting_points,
+            'opposing_points': opposing_points,
+            'risk_assessment': self._assess_overall_risk_from_debate(analyses, debate_rounds, features),
+            'timestamp': now_iso or datetime.now().isoformat()
         }
     
-    def _assess_overall_risk_from_debate(self, analyses: Dict, debate_rounds: List) -> str:
-        """評估整體風險等級"""
-        risk_scores = {'LOW': 1, 'MEDIUM': 2, 'HIGH': 3}
-        total_risk = 0
-        count = 0
-        
-        # 收集所有風險評估
-        for analysis in analyses.values():
-            risk_level = analysis.get('risk_level', 'MEDIUM')
-            total_risk += risk_scores.get(risk_level, 2)
-            count += 1
-        
+    def _assess_overall_risk_from_debate(self, analyses: Dict, debate_rounds: List,
+                                         features: Optional[DebateFeatures] = None) -> str:
+        """評估整體風險等級（features 為最後一輪回應的彙整結果）"""
+        # 收集所有風險評估（初始分析 + 最後一輪辯論）
+        risk_levels = [analysis.get('risk_level', 'MEDIUM') for analysis in analyses.values()]
         if debate_rounds:
-            final_round = debate_rounds[-1]
-            for response in final_round['agent_responses'].values():
-                risk_level = response.get('risk_level', 'MEDIUM')
-                total_risk += risk_scores.get(risk_level, 2)
-                count += 1
+            if features is None:
+                features = _collect_debate_features(debate_rounds[-1]['agent_responses'])
+            risk_levels.extend(features.risk_levels)
         
-        if count == 0:
+        if not risk_levels:
             return 'MEDIUM'
         
-        avg_risk = total_risk / count
+        avg_risk = _average_risk_score(risk_levels)
         if avg_risk <= 1.5:
             return 'LOW'
         elif avg_risk <= 2.5:
@@ -3413,8 +5450,12 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
         
         return "\n".join(summary_parts)
     
-    def _integrate_analyses(self, base_analysis: Dict, debate_analysis: Dict) -> Dict[str, Any]:
-        """整合基礎分析和多代理人辯論結果"""
+    def _integrate_analyses(self, base_analysis: Dict, debate_analysis: Dict,
+                            now_iso: Optional[str] = None) -> Dict[str, Any]:
+        """整合基礎分析和多代理人辯論結果（now_iso 為呼叫端已取得的時間戳記）
+        
+        輸入欄位先以型別防呆取預設值，不再以 try/except 包住整個流程；非預期錯誤交由呼叫端處理
+        """
         integrated_result = {
             'final_recommendation': 'HOLD',
             'confidence_level': 5,
@@ -3423,67 +5464,98 @@ class EnhancedStockAnalyzerWithDebate(EnhancedStockAnalyzer):
             'reasoning': [],
             'target_price_range': {},
             'investment_horizon': 'MEDIUM_TERM',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_iso or datetime.now().isoformat()
         }
         
-        try:
-            # 從基礎分析提取建議
-            base_rec = base_analysis.get('investment_recommendation', 'HOLD')
-            base_score = base_analysis.get('overall_score', 50)
-            
-            # 從辯論分析提取建議
-            final_consensus = debate_analysis.get('final_consensus', {})
-            debate_rec = final_consensus.get('final_recommendation', 'HOLD')
-            consensus_level = final_consensus.get('consensus_level', 0.5)
-            avg_confidence = final_consensus.get('average_confidence', 5)
-            
-            # 權重設定：如果多代理人共識度高，給予更高權重
-            debate_weight = 0.6 + (consensus_level * 0.3)  # 0.6-0.9
-            base_weight = 1 - debate_weight
-            
-            # 決定最終建議
-            if base_rec == debate_rec:
-                # 如果兩者一致，直接採用
+        # 從基礎分析提取建議
+        base_rec = base_analysis.get('investment_recommendation', 'HOLD')
+        base_score = _number_or(base_analysis.get('overall_score', 50), 50)
+        
+        # 從辯論分析提取建議
+        final_consensus = debate_analysis.get('final_consensus')
+        if not isinstance(final_consensus, dict):
+            final_consensus = {}
+        debate_rec = final_consensus.get('final_recommendation', 'HOLD')
+        consensus_level = _number_or(final_consensus.get('consensus_level', 0.5), 0.5)
+        avg_confidence = _number_or(final_consensus.get('average_confidence', 5), 5)
+        
+        # 權重設定：如果多代理人共識度高，給予更高權重
+        debate_weight = 0.6 + (consensus_level * 0.3)  # 0.6-0.9
+        base_weight = 1 - debate_weight
+        
+        # 決定最終建議
+        if base_rec == debate_rec:
+            # 如果兩者一致，直接採用
+            integrated_result['final_recommendation'] = debate_rec
+            integrated_result['confidence_level'] = min(10, avg_confidence * 1.2)  # 提高信心度
+            integrated_result['reasoning'] = ['基礎分析與多代理人辯論結果一致']
+        else:
+            # 如果不一致，基於信心度和共識度決定
+            if avg_confidence * consensus_level > base_score * 0.08:  # 標準化比較
                 integrated_result['final_recommendation'] = debate_rec
-                integrated_result['confidence_level'] = min(10, avg_confidence * 1.2)  # 提高信心度
-                integrated_result['reasoning'] = ['基礎分析與多代理人辯論結果一致']
-            else:
-                # 如果不一致，基於信心度和共識度決定
-                if avg_confidence * consensus_level > base_score * 0.08:  # 標準化比較
-                    integrated_result['final_recommendation'] = debate_rec
-                    integrated_result['reasoning'] = ['多代理人辯論具有較高共識，採用辯論結果']
-                else:
-                    integrated_result['final_recommendation'] = base_rec
-                    integrated_result['reasoning'] = ['基礎分析信心度較高，採用傳統分析結果']
-                
-                integrated_result['confidence_level'] = max(avg_confidence, base_score/10) * 0.9
-            
-            # 風險評估整合
-            base_risk = base_analysis.get('risk_assessment', {}).get('overall_risk', 'MEDIUM')
-            debate_risk = final_consensus.get('risk_assessment', 'MEDIUM')
-            
-            risk_levels = {'LOW': 1, 'MEDIUM': 2, 'HIGH': 3}
-            avg_risk = (risk_levels.get(base_risk, 2) + risk_levels.get(debate_risk, 2)) / 2
-            
-            if avg_risk <= 1.5:
-                integrated_result['risk_assessment'] = 'LOW'
-            elif avg_risk <= 2.5:
-                integrated_result['risk_assessment'] = 'MEDIUM'
+                integrated_result['reasoning'] = ['多代理人辯論具有較高共識，採用辯論結果']
             else:
-                integrated_result['risk_assessment'] = 'HIGH'
-            
-            # 合併理由
-            supporting_points = final_consensus.get('supporting_points', [])
-            integrated_result['reasoning'].extend(supporting_points[:3])  # 取前3個辯論理由
+                integrated_result['final_recommendation'] = base_rec
+                integrated_result['reasoning'] = ['基礎分析信心度較高，採用傳統分析結果']
             
-            # 添加額外資訊
-            integrated_result['consensus_level'] = consensus_level
-            integrated_result['vote_distribution'] = final_consensus.get('vote_distribution', {})
-            integrated_result['base_analysis_score'] = base_score
-            integrated_result['debate_confidence'] = avg_confidence
-            
-        except Exception as e:
+            integrated_result['confidence_level'] = max(avg_confidence, base_score/10) * 0.9
+        
+        # 風險評估整合
+        base_risk_info = base_analysis.get('risk_assessment')
+        base_risk = base_risk_info.get('overall_risk', 'MEDIUM') if isinstance(base_risk_info, dict) else 'MEDIUM'
+        debate_risk = final_consensus.get('risk_assessment', 'MEDIUM')
+        
+        avg_risk = (_RISK_SCORES.get(base_risk, 2) + _RISK_SCORES.get(debate_risk, 2)) / 2
+        
+        if avg_risk <= 1.5:
+            integrated_result['risk_assessment'] = 'LOW'
+        elif avg_risk <= 2.5:
+            integrated_result['risk_assessment'] = 'MEDIUM'
+        else:
+            integrated_result['risk_assessment'] = 'HIGH'
+        
+        # 合併理由
+        supporting_points = final_consensus.get('supporting_points') or []
+        integrated_result['reasoning'].extend(supporting_points[:3])  # 取前3個辯論理由
+        
+        # 添加額外資訊
+        integrated_result['consensus_level'] = consensus_level
+        integrated_result['vote_distribution'] = final_consensus.get('vote_distribution', {})
+        integrated_result['base_analysis_score'] = base_score
+        integrated_result['debate_confidence'] = avg_confidence
+        
+        # 代理人分析內容來自模型回應，格式無法保證，只在此處捕捉錯誤
+        try:
+            integrated_result['consensus_rubric'] = self._weighted_consensus_rubric(
+                base_score, base_risk, debate_analysis.get('agents_analysis', {}), base_weight, debate_weight
+            )
+        except (AttributeError, TypeError, ValueError) as e:
             logging.error(f"整合分析失敗: {e}")
             integrated_result['error'] = str(e)
         
         return integrated_result
+    
+    @staticmethod
+    def _weighted_consensus_rubric(base_score: float, base_risk: str, agents_analysis: Dict,
+                                   base_weight: float, debate_weight: float) -> Dict[str, float]:
+        """以權重向量與評分矩陣的內積計算加權共識評分（基礎分析一列，辯論權重由各代理人平分）"""
+        rows = [((base_score - 50) / 50, base_score / 100, _RISK_SCORES.get(base_risk, 2))]
+        for analysis in agents_analysis.values():
+            try:
+                confidence = float(analysis.get('confidence', 5)) / 10
+            except (TypeError, ValueError):
+                confidence = 0.5
+            rows.append((
+                _REC_DIRECTION.get(analysis.get('recommendation'), 0.0),
+                confidence,
+                _RISK_SCORES.get(analysis.get('risk_level'), 2)
+            ))
+        
+        agent_count = len(rows) - 1
+        if agent_count:
+            weights = np.full(len(rows), debate_weight / agent_count)
+            weights[0] = base_weight
+        else:
+            weights = np.ones(1)
+        rubric = weights @ np.asarray(rows, dtype=np.float64)
+        return {field: round(float(value), 3) for field, value in zip(_RUBRIC_FIELDS, rubric)}
@@ -1036,7 +1036,7 @@ class ValueScreener:
         }
         
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
+            f.write(json.dumps(export_data, ensure_ascii=False, indent=2, cls=DateTimeEncoder))
         
         logging.info(f"篩選標準已匯出到: {filepath}")
     
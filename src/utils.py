@@ -3,7 +3,14 @@
 """
 
 import os
+import copy
+import time
+import hashlib
+import sqlite3
 import logging
+import threading
+from contextlib import closing
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 from datetime import datetime
@@ -209,3 +216,129 @@ def progress_bar(current: int, total: int, prefix: str = "進度", length: int =
     
     if current == total:
         print()  # 完成時換行
+
+
+def get_cache_path(filename: str) -> str:
+    """取得專案 data/cache 目錄下的快取檔案路徑"""
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, "data", "cache", filename)
+
+
+class PersistentLRUCache:
+    """記憶體 LRU 快取，可選擇以 SQLite 持久化以便跨次執行重複使用
+    
+    只做完全相符的鍵查詢；值必須可序列化為 JSON。
+    磁碟上的資料列會在開啟時及每寫入 PRUNE_INTERVAL 筆後清理：
+    刪除過期項目，並只保留最新的 max_size 筆。
+    """
+    
+    PRUNE_INTERVAL = 100  # 每寫入多少筆清理一次磁碟快取
+    
+    def __init__(self, max_size: int = 1000, db_path: Optional[str] = None,
+                 ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.db_path = db_path
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (建立時間, 值)
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        
+        if self.db_path:
+            try:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                with closing(self._connect()) as conn, conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS cache ("
+                        "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                    )
+                    self._prune(conn)
+            except Exception as e:
+                logging.warning(f"無法建立快取資料庫 {self.db_path}，僅使用記憶體快取: {e}")
+                self.db_path = None
+    
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """以 SHA-256 雜湊產生快取鍵"""
+        return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+    
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """刪除過期資料列，並只保留最新的 max_size 筆（呼叫端負責提交）"""
+        if self.ttl is not None:
+            conn.execute("DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl,))
+        conn.execute(
+            "DELETE FROM cache WHERE key NOT IN ("
+            "SELECT key FROM cache ORDER BY created_at DESC LIMIT ?)",
+            (self.max_size,)
+        )
+    
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+    
+    def _remember(self, key: str, created_at: float, value: Any) -> None:
+        """放入記憶體快取並淘汰最久未使用的項目（呼叫端需持有鎖）"""
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def get(self, key: str) -> Optional[Any]:
+        """查詢快取，未命中或已過期時回傳 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._is_expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    return copy.deepcopy(entry[1])
+                del self._entries[key]
+        
+        if not self.db_path:
+            return None
+        
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+            finally:
+                conn.close()
+        except Exception as e:
+            logging.warning(f"讀取快取失敗: {e}")
+            return None
+        
+        if row is None or self._is_expired(row[1]):
+            return None
+        
+        value = json.loads(row[0])
+        with self._lock:
+            self._remember(key, row[1], value)
+        return copy.deepcopy(value)
+    
+    def set(self, key: str, value: Any) -> None:
+        """寫入快取（同時寫入記憶體與磁碟）"""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, copy.deepcopy(value))
+            if self.db_path:
+                self._writes_since_prune += 1
+                should_prune = self._writes_since_prune >= self.PRUNE_INTERVAL
+                if should_prune:
+                    self._writes_since_prune = 0
+        
+        if not self.db_path:
+            return
+        
+        try:
+            serialized = json.dumps(value, ensure_ascii=False, cls=DateTimeEncoder)
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, serialized, created_at)
+                )
+                if should_prune:
+                    self._prune(conn)
+        except Exception as e:
+            logging.warning(f"寫入快取失敗: {e}")
@@ -922,7 +922,12 @@ def analyze_selected_portfolio(tickers, enable_debate=True, save_results=True):
         # 生成投資組合摘要MD報告
         try:
             portfolio_md_path = analyzer.save_portfolio_summary_as_markdown(results, "portfolio_analysis")
-            if portfolio_md_path:
+            # 確保所有報告已寫入磁碟，供頁面隨後讀取（個別報告寫入失敗不影響摘要）
+            try:
+                analyzer.flush()
+            except Exception as write_error:
+                logging.warning(f"部分MD報告寫入失敗: {write_error}")
+            if portfolio_md_path and os.path.exists(portfolio_md_path):
                 st.session_state['portfolio_md_report_path'] = portfolio_md_path
                 logging.info(f"已生成投資組合摘要MD報告: {portfolio_md_path}")
         except Exception as md_error:
@@ -947,7 +952,7 @@ def generate_portfolio_ai_summary(results):
         return {}
     
     total_stocks = len(results)
-    successful_analyses = len([r for r in results.values() if r.get('status') == 'success'])
+    successful_analyses = sum(1 for r in results.values() if r.get('status') == 'success')
     failed_analyses = total_stocks - successful_analyses
     
     # 統計建議分布
@@ -1949,6 +1954,10 @@ def run_ai_analysis():
         
         # 完成所有分析
         analysis_status_manager.finish_analysis(True)
+        try:
+            analyzer.flush()  # 確保各股MD報告已寫入磁碟
+        except Exception as write_error:
+            logging.warning(f"部分MD報告寫入失敗: {write_error}")
         
         # 儲存結果到session state
         st.session_state['ai_analysis_results'] = results
@@ -1975,7 +1984,7 @@ def generate_ai_analysis_summary(results):
         return {}
     
     total_stocks = len(results)
-    successful_analyses = len([r for r in results.values() if r.get('status') == 'success'])
+    successful_analyses = sum(1 for r in results.values() if r.get('status') == 'success')
     failed_analyses = total_stocks - successful_analyses
     
     return {
@@ -2685,10 +2694,14 @@ def analyze_my_portfolio(tickers: list, enable_debate: bool = False):
             
             progress_bar.progress((i + 1) / len(stock_list))
         
+        try:
+            analyzer.flush()  # 確保各股MD報告已寫入磁碟
+        except Exception as write_error:
+            logging.warning(f"部分MD報告寫入失敗: {write_error}")
         st.session_state['portfolio_analysis_results'] = analysis_results
         
         status_text.text("持股分析完成！")
-        success_count = len([r for r in analysis_results if 'error' not in r])
+        success_count = sum(1 for r in analysis_results if 'error' not in r)
         st.success(f"成功完成 {success_count}/{len(tickers)} 支股票的分析")
         
         # 生成持股摘要